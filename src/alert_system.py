@@ -1,88 +1,224 @@
-import yfinance as yf
 import pandas as pd
-import joblib
+import numpy as np
 import os
+import json
 from datetime import datetime
 from pathlib import Path
+from feature_store import read_frame
+from predictor import load_model
+from forecasting import predict_intervals
+from instrumentation import stage, record, record_error
 
-def generate_alerts(data_file, model_file, threshold=0.03):
+DEFAULT_FEATURES = ["Open", "High", "Low", "Volume"]
+
+
+def _series_name(data_file):
+    """
+    Nombre '{ticker}_{intervalo}' a partir de la ruta (ej. descaled_BAP_1d.csv -> BAP_1d).
+    """
+    name = os.path.basename(os.path.normpath(str(data_file))).replace('.csv', '')
+    return name[len('descaled_'):] if name.startswith('descaled_') else name
+
+
+def _change_alerts(name, dates, changes, threshold, kind):
+    """
+    Convierte en registros las filas cuyo cambio supera el umbral (máscara vectorizada).
+    """
+    mask = np.abs(changes) > threshold  # NaN da False
+    records = []
+    for date, change in zip(dates[mask], changes[mask]):
+        direction = "subida" if change > 0 else "bajada"
+        if kind == "real":
+            message = f'Alerta: {date.date()} - {direction.capitalize()} significativa del {abs(change)*100:.2f}% en el valor real.'
+        else:
+            message = f'Alerta (Predicción): {date.date()} - {direction.capitalize()} significativa del {abs(change)*100:.2f}% en el valor predicho.'
+        records.append({
+            'series': name,
+            'date': date,
+            'kind': kind,
+            'direction': direction,
+            'change': float(change),
+            'message': message,
+        })
+    return records
+
+
+def _interval_alerts(name, dates, lower, upper, threshold):
+    """
+    Alertas de pronóstico: el intervalo completo de un horizonte queda por encima de +threshold (subida)
+    o por debajo de -threshold (bajada). lower y upper son retornos (filas, horizontes).
+    """
+    rises = lower > threshold
+    falls = upper < -threshold
+    records = []
+    for row, h in zip(*np.nonzero(rises | falls)):
+        direction = "subida" if rises[row, h] else "bajada"
+        change = lower[row, h] if rises[row, h] else upper[row, h]
+        records.append({
+            'series': name,
+            'date': dates[row],
+            'kind': "pronostico",
+            'horizon': int(h + 1),
+            'direction': direction,
+            'change': float(change),
+            'lower': float(lower[row, h]),
+            'upper': float(upper[row, h]),
+            'message': f'Alerta (Pronóstico): {dates[row].date()} - {direction.capitalize()} de al menos {abs(change)*100:.2f}% '
+                       f'en {h + 1} vela(s) (intervalo {lower[row, h]*100:+.2f}% a {upper[row, h]*100:+.2f}%).',
+        })
+    return records
+
+
+def evaluate_alerts(series, threshold=0.03, since=None, on_date=None, state_file=None):
+    """
+    Evalúa alertas para varias series a la vez, con máscaras vectorizadas sobre el cambio real y el predicho.
+
+    Args:
+        series (list): Pares (data_file, model_file). data_file puede ser un CSV desescalado o una serie del almacén.
+        threshold (float): Porcentaje de cambio para considerar una alerta (e.g., 0.03 para 3%).
+        since (dict): Última fecha evaluada por serie ('BAP_1d' -> fecha). Solo se evalúan las velas posteriores.
+        on_date (date): Si se indica, solo se evalúan las velas de ese día.
+        state_file (str): JSON donde se leen y guardan las últimas fechas evaluadas (modo programado). Si since
+            indica una fecha para la misma serie, tiene prioridad sobre la del archivo.
+
+    Returns:
+        list: Registros de alerta (dict con series, date, kind, direction, change, message).
+    """
+    saved = {}
+    if state_file is not None and os.path.exists(state_file):
+        with open(state_file) as f:
+            saved = json.load(f)
+    since = {**saved, **(since or {})}
+
+    records = []
+    for data_file, model_file in series:
+        name = _series_name(data_file)
+        with stage("alerts", series=name):
+            try:
+                # Los modelos quedan en la caché del proceso entre llamadas
+                model = load_model(model_file)
+                features = list(getattr(model, 'feature_names_in_', DEFAULT_FEATURES))
+
+                # La vela de 'since' se incluye solo como referencia para el cambio porcentual
+                start = since.get(name)
+                data = read_frame(data_file, columns=list(dict.fromkeys(features + ["Close"])), start=start, view="descaled")
+                if len(data) == 0:
+                    continue
+
+                dates = data.index
+                evaluate = np.ones(len(data), dtype=bool)
+                if start is not None:
+                    evaluate &= dates > pd.Timestamp(start)
+                if on_date is not None:
+                    evaluate &= dates.date == on_date
+                # Solo se predicen las filas evaluadas y la anterior de cada una
+                needed = evaluate | np.append(evaluate[1:], False)
+                if not needed.any():
+                    continue
+
+                close = data["Close"].to_numpy(dtype=float)
+                predicted = np.full(len(data), np.nan)
+                predicted[needed] = model.predict(data.loc[needed, features])
+
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    daily_change = np.append(np.nan, close[1:] / close[:-1] - 1)
+                    predicted_change = np.append(np.nan, predicted[1:] / predicted[:-1] - 1)
+
+                series_records = _change_alerts(name, dates[evaluate], daily_change[evaluate], threshold, "real") + \
+                    _change_alerts(name, dates[evaluate], predicted_change[evaluate], threshold, "prediccion")
+                record(rows=int(evaluate.sum()), features=len(features), alerts=len(series_records))
+                records += series_records
+                since[name] = str(dates[-1])
+            except FileNotFoundError as e:
+                print(f"Archivo no encontrado: {e}")
+                record_error(e)
+            except Exception as e:
+                print(f"Error al generar alertas para {data_file}: {e}")
+                record_error(e)
+
+    if state_file is not None:
+        with open(state_file, 'w') as f:
+            json.dump(since, f)
+    return sorted(records, key=lambda record: (record['date'], record['series'], record['kind']))
+
+
+def evaluate_forecast_alerts(series, threshold=0.03, quantiles=(0.1, 0.9), since=None, on_date=None):
+    """
+    Alertas desde los intervalos de predicción de un modelo de forecasting.train_forecaster: se dispara cuando
+    todo el intervalo entre los cuantiles de un horizonte supera el umbral, no solo la predicción puntual.
+
+    Args:
+        series (list): Pares (data_file, forecast_model_file). data_file en precios reales (CSV desescalado o almacén).
+        threshold (float): Porcentaje de cambio respecto al cierre de la vela (e.g., 0.03 para 3%).
+        quantiles (tuple): Cuantiles inferior y superior del intervalo.
+        since (dict): Última fecha evaluada por serie. Solo se evalúan las velas posteriores.
+        on_date (date): Si se indica, solo se evalúan las velas de ese día.
+
+    Returns:
+        list: Registros de alerta (con horizon, lower y upper además de los campos de evaluate_alerts).
+    """
+    since = dict(since or {})
+    records = []
+    for data_file, model_file in series:
+        name = _series_name(data_file)
+        with stage("forecast_alerts", series=name):
+            try:
+                model = load_model(model_file)
+                features = list(getattr(model, 'feature_names_in_', DEFAULT_FEATURES))
+                data = read_frame(data_file, columns=features, start=since.get(name), view="descaled")
+
+                evaluate = np.ones(len(data), dtype=bool)
+                if since.get(name) is not None:
+                    evaluate &= data.index > pd.Timestamp(since[name])
+                if on_date is not None:
+                    evaluate &= data.index.date == on_date
+                if not evaluate.any():
+                    continue
+
+                _, (lower, upper) = predict_intervals(model, data.loc[evaluate, features], quantiles)
+                series_records = _interval_alerts(name, data.index[evaluate], lower, upper, threshold)
+                record(rows=int(evaluate.sum()), alerts=len(series_records))
+                records += series_records
+            except Exception as e:
+                print(f"Error al generar alertas de pronóstico para {data_file}: {e}")
+                record_error(e)
+    return sorted(records, key=lambda record: (record['date'], record['series'], record['horizon']))
+
+
+def generate_alerts(data_file, model_file, threshold=0.03, forecast_model_file=None):
     """
     Carga los datos y el modelo, realiza predicciones y genera alertas
     basadas en cambios significativos del precio de las acciones en tiempo real.
 
     Args:
-        data_file (str): Ruta al archivo CSV de datos preprocesados.
+        data_file (str): Ruta al archivo CSV de datos preprocesados o a una serie del almacén binario
+            (en ese caso se usa la vista desescalada).
         model_file (str): Ruta al archivo del modelo entrenado.
         threshold (float): Porcentaje de cambio para considerar una alerta (e.g., 0.03 para 3%).
+        forecast_model_file (str): Modelo de forecasting.train_forecaster; si se indica, también se alerta
+            cuando el intervalo de pronóstico supera el umbral.
     """
-    try:
-        # Cargar los datos preprocesados (últimos datos disponibles)
-        data = pd.read_csv(data_file, index_col=0, parse_dates=True)
-
-        # Verificar los últimos registros de los datos para depuración
-        print("\nÚltimos registros de los datos:")
-        print(data.tail())  # Imprimir las últimas filas para ver cómo está el formato de los datos
-
-        # Cargar el modelo entrenado
-        model = joblib.load(model_file)
-
-        # Realizar predicciones
-        features = ["Open", "High", "Low", "Volume"]
-        X = data[features]
-        data["Predicted_Close"] = model.predict(X)
-
-        # Calcular el cambio porcentual entre precios consecutivos
-        data["Daily_Change"] = data["Close"].pct_change()
-        data["Predicted_Change"] = data["Predicted_Close"].pct_change()
-
-        # Obtener la fecha actual para compararla con los datos
-        current_date = datetime.now().date()  # Solo la fecha, sin hora
-
-        print(f"\n--- Alertas para {os.path.basename(data_file)} ---")
-        last_alert = None  # Variable para evitar alertas duplicadas
-        alert_found = False  # Variable para verificar si se ha encontrado una alerta
-
-        for index, row in data.iterrows():
-            alert_message = ""
-
-            # Solo generar alertas para el día actual
-            if index.date() == current_date:  # Comparar solo con la fecha actual
-                if pd.notna(row["Daily_Change"]):  # Solo si hay un cambio calculado
-                    # Verificar si el cambio en el precio real es significativo
-                    if abs(row["Daily_Change"]) > threshold:
-                        alert_found = True
-                        if row["Daily_Change"] > 0:
-                            alert_message = f'Alerta: {index.date()} - Subida significativa del {row["Daily_Change"]*100:.2f}% en el valor real.'
-                        else:
-                            alert_message = f'Alerta: {index.date()} - Bajada significativa del {abs(row["Daily_Change"])*100:.2f}% en el valor real.'
-                
-                # Alerta sobre el cambio en el precio predicho por el modelo
-                if pd.notna(row["Predicted_Change"]):
-                    if abs(row["Predicted_Change"]) > threshold:
-                        alert_found = True
-                        if row["Predicted_Change"] > 0:
-                            alert_message = f'Alerta (Predicción): {index.date()} - Subida significativa del {row["Predicted_Change"]*100:.2f}% en el valor predicho.'
-                        else:
-                            alert_message = f'Alerta (Predicción): {index.date()} - Bajada significativa del {abs(row["Predicted_Change"])*100:.2f}% en el valor predicho.'
-
-            # Solo imprimir alerta si no ha sido generada antes para el mismo día
-            if alert_message and alert_message != last_alert:
-                print(alert_message)
-                last_alert = alert_message  # Actualizar la última alerta generada
-
-        # Si no se encontró ninguna alerta, mostrar el mensaje correspondiente
-        if not alert_found:
-            last_real_price = data["Close"].iloc[-1]  # Último valor de la columna 'Close'
-            print(f"\nNo hubo subida o bajada significativa hoy. El valor actual de la acción es: {last_real_price:.2f}")
+    # Obtener la fecha actual para compararla con los datos
+    current_date = datetime.now().date()  # Solo la fecha, sin hora
 
-    except FileNotFoundError as e:
-        print(f"Archivo no encontrado: {e}")
-    except Exception as e:
-        print(f"Error al generar alertas para {data_file}: {e}")
+    print(f"\n--- Alertas para {os.path.basename(data_file)} ---")
+    records = evaluate_alerts([(data_file, model_file)], threshold, on_date=current_date)
+    if forecast_model_file is not None:
+        records += evaluate_forecast_alerts([(data_file, forecast_model_file)], threshold, on_date=current_date)
+    for record in records:
+        print(record['message'])
+
+    # Si no se encontró ninguna alerta, mostrar el mensaje correspondiente
+    if not records:
+        try:
+            last_real_price = read_frame(data_file, columns=["Close"], view="descaled")["Close"].iloc[-1]
+            print(f"\nNo hubo subida o bajada significativa hoy. El valor actual de la acción es: {last_real_price:.2f}")
+        except Exception as e:
+            print(f"Error al leer {data_file}: {e}")
 
 if __name__ == '__main__':
     # Definir las rutas correctas para los archivos de datos preprocesados y el modelo entrenado
-    data_file = Path("c:/Users/PC/Desktop/EJERCICIOS_PROGRA/python/ProyectoIA/data/preprocessed/descaled_BAP_1d.csv")  
+    data_file = Path("c:/Users/PC/Desktop/EJERCICIOS_PROGRA/python/ProyectoIA/data/preprocessed/descaled_BAP_1d.csv")
     model_file = Path("c:/Users/PC/Desktop/EJERCICIOS_PROGRA/python/ProyectoIA/data/models/BAP_1d_linear_regression_model.joblib")  # Ruta al archivo del modelo entrenado (ajusta según el modelo que quieras usar)
     threshold = 0.03  # Umbral de cambio para generar alerta (3% en este caso)
 
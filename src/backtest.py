@@ -0,0 +1,150 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
+from joblib import Parallel, delayed
+from feature_store import list_columns, read_frame
+from indicators import select_features
+from experiment_store import hash_data, open_store
+from ramdomF1 import FIXED_PARAMS
+
+
+def _walk_forward_steps(n_rows, retrain_every, window, window_size, min_train):
+    """
+    Ventanas (inicio de entrenamiento, fin de entrenamiento / inicio de prueba, fin de prueba) del walk-forward.
+    """
+    steps = []
+    for split in range(min_train, n_rows, retrain_every):
+        start = 0 if window == 'expanding' else max(0, split - window_size)
+        steps.append((start, split, min(split + retrain_every, n_rows)))
+    return steps
+
+
+def _fit_predict(params, X_train, y_train, X_test):
+    model = RandomForestRegressor(**params)
+    model.fit(X_train, y_train)
+    return model.predict(X_test)
+
+
+def walk_forward(input_file, params=None, retrain_every=20, window='expanding', window_size=250, min_train=None,
+                 n_jobs=-1, store=None):
+    """
+    Backtest walk-forward: reentrena el modelo cada retrain_every filas y predice el bloque siguiente.
+
+    Args:
+        input_file (str): CSV preprocesado o serie del almacén.
+        params (dict): Parámetros del RandomForestRegressor (por defecto los de ramdomF1).
+        retrain_every (int): Filas de prueba por paso (cada cuántas velas se reentrena).
+        window (str): 'expanding' (todo el histórico previo) o 'sliding' (las últimas window_size filas).
+        window_size (int): Tamaño de la ventana deslizante.
+        min_train (int): Filas mínimas antes del primer paso. Por defecto, la mitad de los datos.
+        n_jobs (int): Procesos para entrenar las ventanas (son independientes entre sí).
+        store (str o ExperimentStore): Registro de experimentos; los pasos ya evaluados sobre las mismas
+            filas se reutilizan, así que al agregar velas solo se calculan los pasos nuevos.
+
+    Returns:
+        tuple: (predicciones por fila, métricas por paso, métricas globales).
+    """
+    params = dict(params or FIXED_PARAMS)
+    features = select_features(list_columns(input_file))
+    target = "Close"
+    data = read_frame(input_file, columns=features + [target])
+    X = data[features].to_numpy(dtype=np.float32)
+    y = data[target].to_numpy(dtype=float)
+
+    min_train = min_train or len(data) // 2
+    steps = _walk_forward_steps(len(data), retrain_every, window, window_size, min_train)
+
+    store = open_store(store)
+    predictions = [None] * len(steps)
+    keys = [None] * len(steps)
+    if store is not None:
+        for i, (start, split, end) in enumerate(steps):
+            # La clave depende solo de las filas del paso, no del resto del histórico
+            keys[i] = hash_data(data.iloc[start:end][features], y[start:end])
+            cached = store.get(keys[i], features, params, f"walk_forward:{split - start}:{end - split}")
+            if cached is not None:
+                predictions[i] = np.array(cached['predictions'])
+
+    pending = [i for i in range(len(steps)) if predictions[i] is None]
+    outputs = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_predict)(params, X[steps[i][0]:steps[i][1]], y[steps[i][0]:steps[i][1]], X[steps[i][1]:steps[i][2]])
+        for i in pending
+    )
+    for i, output in zip(pending, outputs):
+        predictions[i] = output
+        if store is not None:
+            start, split, end = steps[i]
+            store.put(keys[i], features, params, f"walk_forward:{split - start}:{end - split}",
+                      {'predictions': output.tolist()})
+
+    rows = []
+    for step, ((start, split, end), y_pred) in enumerate(zip(steps, predictions)):
+        rows.append(pd.DataFrame({
+            'step': step,
+            'train_rows': split - start,
+            'y_true': y[split:end],
+            'y_pred': y_pred,
+            'prev_close': y[split - 1:end - 1],
+        }, index=data.index[split:end]))
+    result = pd.concat(rows)
+
+    # Acierto de dirección: el modelo anticipa si el cierre sube o baja respecto al anterior
+    result['direction_hit'] = np.sign(result['y_pred'] - result['prev_close']) == np.sign(result['y_true'] - result['prev_close'])
+
+    per_step = result.groupby('step').apply(lambda g: pd.Series({
+        'start': g.index[0],
+        'end': g.index[-1],
+        'train_rows': g['train_rows'].iloc[0],
+        'MAE': mean_absolute_error(g['y_true'], g['y_pred']),
+        'RMSE': np.sqrt(mean_squared_error(g['y_true'], g['y_pred'])),
+        'direction_hit_rate': g['direction_hit'].mean(),
+    }), include_groups=False)
+    summary = {
+        'steps': len(steps),
+        'rows': len(result),
+        'MAE': mean_absolute_error(result['y_true'], result['y_pred']),
+        'RMSE': float(np.sqrt(mean_squared_error(result['y_true'], result['y_pred']))),
+        'R2': r2_score(result['y_true'], result['y_pred']),
+        'direction_hit_rate': float(result['direction_hit'].mean()),
+    }
+    return result, per_step, summary
+
+
+def run_backtests(input_files, results_dir, store=None, **kwargs):
+    """
+    Ejecuta walk_forward para varias series y guarda predicciones y métricas en results_dir.
+
+    Returns:
+        DataFrame: Una fila de métricas globales por serie.
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    store = open_store(store)
+    summaries = []
+    for input_file in input_files:
+        name = os.path.basename(os.path.normpath(input_file)).replace('.csv', '')
+        try:
+            result, per_step, summary = walk_forward(input_file, store=store, **kwargs)
+            result.to_csv(os.path.join(results_dir, f"backtest_{name}.csv"))
+            per_step.to_csv(os.path.join(results_dir, f"backtest_steps_{name}.csv"))
+            print(f"Backtest {name}: {json.dumps({k: round(v, 4) for k, v in summary.items()})}")
+            summaries.append({'series': name, **summary})
+        except Exception as e:
+            print(f"Error en el backtest de {input_file}: {e}")
+    summary_df = pd.DataFrame(summaries)
+    summary_df.to_csv(os.path.join(results_dir, "backtest_summary.csv"), index=False)
+    return summary_df
+
+
+if __name__ == "__main__":
+    preprocessed_data_dir = r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data\preprocesed_normalizada"
+    results_dir = r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\results_backtest"
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    absolute_preprocessed_data_dir = os.path.join(script_dir, preprocessed_data_dir)
+    absolute_results_dir = os.path.join(script_dir, results_dir)
+
+    input_files = [os.path.join(absolute_preprocessed_data_dir, f"BAP_{interval}.csv") for interval in ["1d", "1wk", "1mo"]]
+    run_backtests([f for f in input_files if os.path.exists(f)], absolute_results_dir,
+                  store=os.path.join(absolute_results_dir, "experiments.sqlite"), retrain_every=20)
@@ -0,0 +1,278 @@
+import pandas as pd
+import numpy as np
+import os
+import sys
+import json
+import time
+import zlib
+import platform
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PRICE_COLUMNS = ["Close", "High", "Low", "Open", "Volume"]
+
+# Frecuencia de pandas y fracción de año de cada intervalo de yfinance (para escalar la volatilidad)
+INTERVALS = {
+    '1m': ('min', 1 / (252 * 390)),
+    '5m': ('5min', 5 / (252 * 390)),
+    '1h': ('h', 1 / (252 * 7)),
+    '1d': ('B', 1 / 252),
+    '1wk': ('W-MON', 1 / 52),
+    '1mo': ('MS', 1 / 12),
+}
+
+
+def _rng(ticker, seed):
+    # crc32 en lugar de hash(): es estable entre procesos y corridas
+    return np.random.default_rng([seed, zlib.crc32(ticker.encode())])
+
+
+def _ohlcv_chunk(rng, dates, last_log_close, mu, sigma, dt):
+    """
+    Genera un bloque de velas con un movimiento browniano geométrico que continúa desde last_log_close.
+
+    Todos los aleatorios de una vela salen de una misma fila de normales y el log-precio se acumula
+    desde el valor anterior, así que el resultado no depende del tamaño de bloque.
+    """
+    n = len(dates)
+    z = rng.standard_normal((n, 5))
+    returns = (mu - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * z[:, 0]
+    log_close = np.cumsum(np.append(last_log_close, returns))
+    close = np.exp(log_close[1:])
+    open_ = np.exp(log_close[:-1]) * np.exp(0.1 * sigma * np.sqrt(dt) * z[:, 1])
+    high = np.maximum(open_, close) * (1 + np.abs(z[:, 2]) * sigma * np.sqrt(dt) * 0.5)
+    low = np.minimum(open_, close) * (1 - np.abs(z[:, 3]) * sigma * np.sqrt(dt) * 0.5)
+    volume = np.exp(12 + 0.5 * z[:, 4]).astype(np.int64)
+    frame = pd.DataFrame({"Close": close, "High": high, "Low": low, "Open": open_, "Volume": volume},
+                         index=pd.DatetimeIndex(dates, name="Date"))
+    return frame, log_close[-1]
+
+
+def write_synthetic_csv(output_file, ticker, n_rows, interval='1d', start='2000-01-03', seed=0,
+                        mu=0.05, sigma=0.3, s0=100.0, chunk_rows=500_000):
+    """
+    Escribe una serie OHLCV sintética con la misma cabecera de tres filas (Price / Ticker / Date) que yfinance.
+
+    La serie se genera y escribe por bloques, así que la memoria no depende de n_rows. Con la misma semilla,
+    el ticker y los parámetros, el archivo es idéntico entre corridas.
+
+    Args:
+        output_file (str): Ruta del CSV.
+        ticker (str): Ticker (también define la semilla de la serie junto con seed).
+        n_rows (int): Número de velas.
+        interval (str): Intervalo al estilo yfinance ('1m', '5m', '1h', '1d', '1wk', '1mo').
+        start (str): Fecha de la primera vela.
+        seed (int): Semilla global del benchmark.
+        mu, sigma (float): Deriva y volatilidad anuales del precio.
+        s0 (float): Precio inicial.
+        chunk_rows (int): Filas por bloque de escritura.
+    """
+    freq, dt = INTERVALS[interval]
+    rng = _rng(ticker, seed)
+    dates = pd.date_range(start=start, periods=n_rows, freq=freq)
+    last_log_close = np.log(s0)
+    with open(output_file, 'w', newline='') as f:
+        f.write("Price," + ",".join(PRICE_COLUMNS) + "\n")
+        f.write("Ticker," + ",".join([ticker] * len(PRICE_COLUMNS)) + "\n")
+        f.write("Date" + "," * len(PRICE_COLUMNS) + "\n")
+        for begin in range(0, n_rows, chunk_rows):
+            chunk, last_log_close = _ohlcv_chunk(rng, dates[begin:begin + chunk_rows], last_log_close, mu, sigma, dt)
+            chunk.to_csv(f, header=False)
+    return output_file
+
+
+def generate_universe(output_dir, n_tickers, n_rows, interval='1d', seed=0, **kwargs):
+    """
+    Genera n_tickers series sintéticas (SYN0000_{interval}.csv, ...) en output_dir.
+
+    Returns:
+        list: Rutas de los CSV generados.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    files = []
+    for i in range(n_tickers):
+        ticker = f"SYN{i:04d}"
+        files.append(write_synthetic_csv(os.path.join(output_dir, f"{ticker}_{interval}.csv"), ticker, n_rows,
+                                         interval=interval, seed=seed, **kwargs))
+    return files
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _max_rss_mb():
+    """
+    Pico de memoria residente del proceso (incluye lo que reservan sklearn y NumPy fuera de tracemalloc).
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10
+
+
+def _measure(function, memory=True):
+    """
+    Ejecuta function() y devuelve (segundos, pico de memoria de tracemalloc en MB o None).
+    tracemalloc agrega sobrecosto al tiempo, por eso se puede desactivar con memory=False.
+    """
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        function()
+    finally:
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20 if memory else None
+        if memory:
+            tracemalloc.stop()
+    return seconds, peak
+
+
+def run_benchmarks(work_dir, results_file, n_tickers=1, n_rows=10_000, interval='1d', n=4, seed=0,
+                   stages=("generate", "preprocess", "train", "search", "alerts", "predict"),
+                   search="halving", memory=True, label=None):
+    """
+    Mide tiempo y pico de memoria de cada etapa del pipeline sobre datos sintéticos.
+
+    Cada etapa se ejecuta sobre todos los tickers y agrega una línea JSON a results_file con el commit,
+    el escenario y las medidas, para comparar regresiones entre commits fuera de línea.
+
+    Args:
+        work_dir (str): Directorio de trabajo (datos sintéticos, features, modelos).
+        results_file (str): Archivo JSON-lines donde se agregan los resultados.
+        n_tickers (int): Número de tickers sintéticos.
+        n_rows (int): Velas por ticker.
+        interval (str): Intervalo de las series.
+        n (int): Lags / ventana SMA del preprocesamiento.
+        seed (int): Semilla del generador.
+        stages (tuple): Etapas a medir: generate, preprocess, train, search, alerts, predict.
+            alerts y predict usan los modelos de train; si no existen se entrenan sin medir.
+        search (str): 'grid' o 'halving' para find_best_parameters.
+        memory (bool): Medir el pico de memoria con tracemalloc.
+        label (str): Nombre libre del escenario.
+
+    Returns:
+        list: Un dict por etapa con stage, seconds, peak_mb (tracemalloc), max_rss_mb (pico acumulado del
+            proceso hasta esa etapa), rows_per_second y los datos del escenario.
+    """
+    from data_preprocessor import preprocess_data
+    from ramdomF1 import train_and_save_model
+    from ramdom_forestR import find_best_parameters
+    from alert_system import evaluate_alerts
+    from predictor import PredictionService, ModelCache
+
+    raw_dir = os.path.join(work_dir, "raw")
+    scaled_dir = os.path.join(work_dir, "preprocesed_normalizada")
+    descaled_dir = os.path.join(work_dir, "preprocessed")
+    rf_dir = os.path.join(work_dir, "results_rf_fijos")
+    results_dir = os.path.join(work_dir, "results")
+    names = [f"SYN{i:04d}_{interval}" for i in range(n_tickers)]
+    raw_files = [os.path.join(raw_dir, f"{name}.csv") for name in names]
+    scaled_files = [os.path.join(scaled_dir, f"{name}.csv") for name in names]
+    descaled_files = [os.path.join(descaled_dir, f"descaled_{name}.csv") for name in names]
+    model_files = [os.path.join(rf_dir, f"model_{name}.joblib") for name in names]
+
+    def ensure_models():
+        for scaled_file, model_file in zip(scaled_files, model_files):
+            if not os.path.exists(model_file):
+                train_and_save_model(scaled_file, rf_dir)
+
+    def predict_all():
+        # Caché nueva: se mide la carga de los modelos más la predicción por lotes
+        service = PredictionService(cache=ModelCache(max_models=max(8, n_tickers)))
+        requests = [service.latest_request(data_file, model_file, series=name)
+                    for data_file, model_file, name in zip(scaled_files, model_files, names)]
+        service.predict(requests, ajuste=0.5)
+
+    actions = {
+        "generate": lambda: generate_universe(raw_dir, n_tickers, n_rows, interval=interval, seed=seed),
+        "preprocess": lambda: [preprocess_data(f, scaled_dir, descaled_dir, n=n) for f in raw_files],
+        "train": lambda: [train_and_save_model(f, rf_dir) for f in scaled_files],
+        "search": lambda: [find_best_parameters(f, results_dir, search=search) for f in scaled_files],
+        "alerts": lambda: evaluate_alerts(list(zip(descaled_files, model_files))),
+        "predict": predict_all,
+    }
+
+    scenario = {
+        'run_at': datetime.now().isoformat(),
+        'commit': _git_commit(),
+        'label': label,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'cpus': os.cpu_count(),
+        'tickers': n_tickers,
+        'rows_per_ticker': n_rows,
+        'interval': interval,
+        'seed': seed,
+    }
+    results = []
+    os.makedirs(os.path.dirname(os.path.abspath(results_file)), exist_ok=True)
+    for stage in stages:
+        try:
+            if stage in ("alerts", "predict"):
+                ensure_models()
+            seconds, peak = _measure(actions[stage], memory=memory)
+            max_rss = _max_rss_mb()
+            result = dict(scenario, stage=stage, seconds=round(seconds, 4),
+                          peak_mb=round(peak, 2) if peak is not None else None,
+                          max_rss_mb=round(max_rss, 1) if max_rss is not None else None,
+                          rows_per_second=round(n_tickers * n_rows / seconds, 1) if seconds > 0 else None)
+            results.append(result)
+            with open(results_file, 'a') as f:
+                f.write(json.dumps(result) + "\n")
+            print(f"[{stage}] {seconds:.2f}s" + (f", pico {peak:.1f} MB" if peak is not None else ""))
+        except Exception as e:
+            print(f"Error en la etapa {stage} del benchmark: {e}")
+    return results
+
+
+def compare_results(results_file, baseline_commit, commit=None):
+    """
+    Compara los tiempos por escenario y etapa de dos commits registrados en results_file.
+
+    Returns:
+        DataFrame: seconds y peak_mb de ambos commits y la razón de tiempos (commit / baseline).
+    """
+    results = pd.read_json(results_file, lines=True)
+    commit = commit or results['commit'].iloc[-1]
+    keys = ['label', 'tickers', 'rows_per_ticker', 'interval', 'stage']
+    # Si un escenario se corrió varias veces en el mismo commit se toma la última corrida
+    latest = results.groupby(keys + ['commit'], dropna=False).last().reset_index()
+    base = latest[latest['commit'] == baseline_commit].set_index(keys)[['seconds', 'peak_mb']]
+    new = latest[latest['commit'] == commit].set_index(keys)[['seconds', 'peak_mb']]
+    comparison = base.join(new, lsuffix='_base', rsuffix='_new', how='inner')
+    comparison['ratio'] = comparison['seconds_new'] / comparison['seconds_base']
+    return comparison
+
+
+if __name__ == "__main__":
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_dir = os.path.join(script_dir, r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA")
+    work_dir = os.path.join(base_dir, "benchmark")
+    results_file = os.path.join(base_dir, "results", "benchmarks.jsonl")
+
+    # Escenarios: el pequeño se parece a los datos reales; el grande aproxima producción (intradía, muchos tickers)
+    scenario = sys.argv[1] if len(sys.argv) > 1 else "small"
+    if scenario == "small":
+        run_benchmarks(os.path.join(work_dir, "small"), results_file, n_tickers=3, n_rows=1_500, label="small")
+    elif scenario == "medium":
+        run_benchmarks(os.path.join(work_dir, "medium"), results_file, n_tickers=50, n_rows=50_000, interval="1h",
+                       stages=("generate", "preprocess", "train", "alerts", "predict"), label="medium")
+    elif scenario == "large":
+        run_benchmarks(os.path.join(work_dir, "large"), results_file, n_tickers=2_000, n_rows=100_000, interval="1m",
+                       stages=("generate", "preprocess"), memory=False, label="large-universe")
+        run_benchmarks(os.path.join(work_dir, "long"), results_file, n_tickers=1, n_rows=5_000_000, interval="1m",
+                       stages=("generate", "preprocess", "train", "predict"), label="long-history")
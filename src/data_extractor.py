@@ -1,8 +1,95 @@
 import yfinance as yf
 import pandas as pd
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from feature_store import store_path, last_index, write_frame, append_frame
+from instrumentation import instrument, record_error
 
-def extract_data(ticker, start_date=None, end_date=None, interval='1d', output_dir=r'C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data'):
+PRICE_COLUMNS = ["Close", "High", "Low", "Open", "Volume"]
+
+
+class YahooSource:
+    """
+    Fuente de datos que descarga las velas desde Yahoo Finance.
+
+    Usa yf.Ticker(...).history en lugar de yf.download: download guarda los resultados en un diccionario
+    global del módulo (por ticker, sin el intervalo) y no se puede llamar desde varios hilos a la vez.
+    """
+
+    def fetch(self, ticker, start=None, end=None, interval='1d'):
+        """
+        Devuelve un DataFrame con columnas planas (Close, High, Low, Open, Volume) indexado por fecha.
+        """
+        # Mismos valores por defecto que yf.download: todo el histórico, precios ajustados y sin dividendos
+        data = yf.Ticker(ticker).history(period='max', start=start, end=end, interval=interval,
+                                         auto_adjust=True, actions=False)
+        if data.empty:
+            return pd.DataFrame(columns=PRICE_COLUMNS)
+        # yf.download quita la zona horaria en intervalos de un día o más
+        if interval[-1] not in ('m', 'h'):
+            data.index = data.index.tz_localize(None)
+        return data[PRICE_COLUMNS]
+
+
+class ReplaySource:
+    """
+    Fuente de datos local que reproduce CSV con el formato de yfinance ({ticker}_{interval}.csv).
+    Sirve para probar la extracción sin conexión.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+
+    def fetch(self, ticker, start=None, end=None, interval='1d'):
+        file_path = os.path.join(self.data_dir, f'{ticker}_{interval}.csv')
+        if not os.path.exists(file_path):
+            return pd.DataFrame(columns=PRICE_COLUMNS)
+        data = pd.read_csv(file_path, header=0, skiprows=[1, 2], index_col=0, parse_dates=True, float_precision='round_trip')
+        # Mismo criterio que yfinance: start inclusivo, end exclusivo
+        if start is not None:
+            data = data[data.index >= pd.Timestamp(start)]
+        if end is not None:
+            data = data[data.index < pd.Timestamp(end)]
+        return data
+
+
+def _last_cached_row(file_path):
+    """
+    Lee solo la última línea del CSV en caché.
+
+    Returns:
+        tuple: (fecha de la última vela, offset en bytes donde empieza esa línea) o (None, None).
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        block = min(size, 4096)
+        f.seek(size - block)
+        tail = f.read(block).rstrip(b'\r\n')
+    if not tail:
+        return None, None
+    line_start = tail.rfind(b'\n') + 1
+    first_field = tail[line_start:].split(b',', 1)[0].decode()
+    try:
+        last_date = pd.Timestamp(first_field)
+    except ValueError:
+        # Solo existen las filas de cabecera
+        return None, None
+    return last_date, size - block + line_start
+
+
+def _to_yfinance_layout(data, ticker):
+    """
+    Reconstruye la cabecera de tres filas (Price / Ticker / Date) que escribe yfinance.
+    """
+    data = data[PRICE_COLUMNS].rename_axis('Date')
+    data.columns = pd.MultiIndex.from_product([PRICE_COLUMNS, [ticker]], names=['Price', 'Ticker'])
+    return data
+
+
+@instrument("extract", series=lambda args: f"{args['ticker']}_{args['interval']}", result="rows")
+def extract_data(ticker, start_date=None, end_date=None, interval='1d', output_dir=r'C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data',
+                 source=None, incremental=False, store_dir=None):
     """
     Extrae datos históricos de un ticker usando yfinance y los guarda en un archivo CSV.
 
@@ -12,33 +99,118 @@ def extract_data(ticker, start_date=None, end_date=None, interval='1d', output_d
         end_date (str): Fecha de fin en formato 'YYYY-MM-DD'. Si es None, extrae hasta la fecha actual.
         interval (str): Intervalo de los datos (ej. '1d' para diario, '1wk' para semanal, '1mo' para mensual).
         output_dir (str): Directorio donde se guardará el archivo CSV.
+        source: Fuente de datos con método fetch(ticker, start, end, interval). Por defecto YahooSource.
+        incremental (bool): Si el CSV ya existe, solo descarga las velas desde la última fecha guardada
+            y las agrega al archivo en lugar de reescribirlo.
+        store_dir (str): Si se indica, las velas se guardan en el almacén binario ({store_dir}/raw/{ticker}_{interval})
+            en lugar del CSV.
+
+    Returns:
+        int: Número de filas nuevas escritas (0 si no hubo datos o hubo un error).
     """
     print(f"Extrayendo datos para {ticker}...")
     try:
+        source = source or YahooSource()
+
         # Ajustar el directorio de salida relativo a la ubicación del script
         script_dir = os.path.dirname(os.path.abspath(__file__))
         absolute_output_dir = os.path.join(script_dir, output_dir)
+        file_path = os.path.join(absolute_output_dir, f'{ticker}_{interval}.csv')
+
+        raw_path = store_path(store_dir, 'raw', f'{ticker}_{interval}') if store_dir is not None else None
+
+        last_date, last_offset = None, None
+        if incremental and raw_path is not None:
+            last_date = last_index(raw_path)
+        elif incremental and os.path.exists(file_path):
+            last_date, last_offset = _last_cached_row(file_path)
+
+        if last_date is not None:
+            # Se vuelve a pedir la última vela porque en 1wk/1mo puede estar incompleta
+            data = source.fetch(ticker, start=last_date.strftime('%Y-%m-%d'), end=end_date, interval=interval)
+            data = data[data.index >= last_date]
+            if data.empty:
+                print(f"Sin velas nuevas para {ticker} ({interval}) desde {last_date.date()}.")
+                return 0
+
+            replaces_last = data.index[0] == last_date
+            if raw_path is not None:
+                # El almacén reemplaza por sí mismo las filas con fecha >= a la primera nueva
+                append_frame(raw_path, data[PRICE_COLUMNS])
+            elif replaces_last:
+                # Quitar la última fila para reemplazarla con la versión actualizada
+                with open(file_path, 'r+b') as f:
+                    f.truncate(last_offset)
+            if raw_path is None:
+                _to_yfinance_layout(data, ticker).to_csv(file_path, mode='a', header=False)
+            new_rows = len(data) - int(replaces_last)
+            print(f"{new_rows} velas nuevas agregadas a {raw_path or file_path}")
+            return new_rows
+
+        # Descargar los datos usando la fuente configurada
+        data = source.fetch(ticker, start=start_date, end=end_date, interval=interval)
 
-        # Descargar los datos usando yfinance
-        data = yf.download(ticker, start=start_date, end=end_date, interval=interval)
-        
         # Verificar si se descargaron datos
         if data.empty:
             print(f"No se encontraron datos para {ticker} con el intervalo {interval} en el rango especificado.")
-            return
+            return 0
+
+        if raw_path is not None:
+            write_frame(raw_path, data[PRICE_COLUMNS])
+            print(f"Datos guardados en {raw_path}")
+            return len(data)
 
         # Crear el directorio si no existe
         os.makedirs(absolute_output_dir, exist_ok=True)
-        
-        # Definir la ruta del archivo y guardar los datos en CSV
-        file_path = os.path.join(absolute_output_dir, f'{ticker}_{interval}.csv')
-        data.to_csv(file_path)
+
+        # Guardar los datos en CSV
+        _to_yfinance_layout(data, ticker).to_csv(file_path)
         print(f"Datos guardados en {file_path}")
+        return len(data)
     except Exception as e:
         print(f"Error al extraer datos para {ticker}: {e}")
+        record_error(e)
+        return 0
+
+
+def extract_batch(tickers, intervals, start_dates=None, end_date=None, output_dir=r'C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data',
+                  source=None, max_workers=4, store_dir=None):
+    """
+    Extrae en paralelo todas las combinaciones ticker × intervalo, de forma incremental sobre la caché CSV.
+
+    Args:
+        tickers (list): Lista de tickers (ej. ['BAP', 'IFS']).
+        intervals (list): Lista de intervalos (ej. ['1d', '1wk', '1mo']).
+        start_dates (dict): Fecha de inicio por intervalo para la primera descarga (ej. {'1d': '2020-01-30'}).
+        end_date (str): Fecha de fin común. Si es None, hasta la fecha actual.
+        output_dir (str): Directorio de la caché CSV.
+        source: Fuente de datos compartida por todos los hilos, así que su fetch debe ser seguro entre hilos
+            (sin estado global compartido). Por defecto YahooSource.
+        max_workers (int): Número máximo de descargas simultáneas.
+        store_dir (str): Si se indica, se usa el almacén binario en lugar de la caché CSV.
+
+    Returns:
+        dict: Filas nuevas por (ticker, intervalo).
+    """
+    start_dates = start_dates or {}
+    source = source or YahooSource()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(extract_data, ticker, start_dates.get(interval), end_date, interval, output_dir,
+                            source, True, store_dir): (ticker, interval)
+            for ticker in tickers
+            for interval in intervals
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
 
-if __name__ == '__main__': 
-    # Extraer los datos para diferentes intervalos de tiempo
-    extract_data('BAP', '2020-01-30', interval='1d', output_dir=r'C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data') #data diaria
-    extract_data('BAP', '2010-12-01', interval='1wk', output_dir=r'C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data') #data semanal
-    extract_data('BAP', '1996-01-01', interval='1mo', output_dir=r'C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data') #data mensual
+if __name__ == '__main__':
+    # Extraer los datos para diferentes intervalos de tiempo (solo velas nuevas si ya existe la caché)
+    extract_batch(
+        ['BAP'], ['1d', '1wk', '1mo'],
+        start_dates={'1d': '2020-01-30', '1wk': '2010-12-01', '1mo': '1996-01-01'},  # diaria, semanal, mensual
+        output_dir=r'C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data'
+    )
@@ -1,52 +1,407 @@
 import pandas as pd
+import numpy as np
 from sklearn.preprocessing import MinMaxScaler
 import os
+import json
+from feature_store import is_store, read_frame, read_arrays, read_meta, write_frame, append_frame, store_path
+from instrumentation import instrument, record, record_error
+from indicators import compute_indicators
 
-def preprocess_data(input_file, scaled_dir, descaled_dir, n=3):
+FEATURES_TO_SCALE = ["Close", "High", "Low", "Open", "Volume"]
+
+# Tipos del modo de baja memoria: precios en float32 y volumen entero (nullable para poder hacer ffill)
+LOW_MEMORY_DTYPES = {"Close": np.float32, "High": np.float32, "Low": np.float32, "Open": np.float32, "Volume": "Int64"}
+
+
+def _last_line_offset(file_path):
+    """
+    Devuelve el offset en bytes donde empieza la última línea del archivo.
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        block = min(size, 4096)
+        f.seek(size - block)
+        tail = f.read(block).rstrip(b'\r\n')
+    return size - block + tail.rfind(b'\n') + 1
+
+
+def _add_window_features(data, n, prev_closes=()):
+    """
+    Agrega Close_lag_1..n y SMA_n. prev_closes son los cierres anteriores a data (ventana arrastrada).
+    La SMA se calcula como suma en orden fijo para que el modo incremental dé exactamente lo mismo.
+    """
+    # La ventana conserva el tipo de Close (float32 en el modo de baja memoria)
+    closes = pd.concat([pd.Series(prev_closes, dtype=data['Close'].dtype), data['Close'].reset_index(drop=True)], ignore_index=True)
+    offset = len(prev_closes)
+
+    lag_cols = []
+    sma = closes.copy()
+    for i in range(1, n+1):
+        col = f'Close_lag_{i}'
+        lagged = closes.shift(i)
+        data[col] = lagged.iloc[offset:].to_numpy()
+        lag_cols.append(col)
+        if i < n:
+            sma = sma + lagged
+    data[f'SMA_{n}'] = (sma / n).iloc[offset:].to_numpy()
+    return lag_cols
+
+
+def _state_file(scaled_dir, input_file):
+    return os.path.join(scaled_dir, f"{os.path.basename(input_file).replace('.csv', '')}.state.json")
+
+
+def _range_of(frame):
+    if frame.empty:
+        return None, None
+    values = frame[FEATURES_TO_SCALE].to_numpy(dtype=float)
+    return np.nanmin(values, axis=0).tolist(), np.nanmax(values, axis=0).tolist()
+
+
+def _merge_range(range_a, range_b):
+    if range_a[0] is None:
+        return range_b
+    if range_b[0] is None:
+        return range_a
+    return (np.fmin(range_a[0], range_b[0]).tolist(), np.fmax(range_a[1], range_b[1]).tolist())
+
+
+def _scaler_from_range(data_min, data_max):
+    """
+    Reconstruye un MinMaxScaler con el mismo rango (mismos scale_ y min_ que el ajuste completo).
+    """
+    scaler = MinMaxScaler()
+    scaler.fit(pd.DataFrame([data_min, data_max], columns=FEATURES_TO_SCALE))
+    return scaler
+
+
+def load_scaler(data_file):
+    """
+    Escalador con el que preprocess_data normalizó data_file (CSV normalizado o serie del almacén), desde el rango
+    guardado en su estado. None si no hay estado (ej. un CSV desescalado).
+    """
+    if is_store(data_file):
+        state = read_meta(data_file)['extra'].get('preprocess')
+    else:
+        state_file = _state_file(os.path.dirname(os.path.abspath(data_file)), data_file)
+        state = None
+        if os.path.exists(state_file):
+            with open(state_file) as f:
+                state = json.load(f)
+    if state is None:
+        return None
+    return _scaler_from_range(state['data_min'], state['data_max'])
+
+
+def _write_outputs(data, scaler, scaled_file, descaled_file, append=False):
+    mode, header = ('a', False) if append else ('w', True)
+    data_scaled = data
+    data_scaled[FEATURES_TO_SCALE] = scaler.transform(data[FEATURES_TO_SCALE])
+    data_scaled.to_csv(scaled_file, mode=mode, header=header)
+
+    data_scaled[FEATURES_TO_SCALE] = scaler.inverse_transform(data_scaled[FEATURES_TO_SCALE])
+    data_scaled.to_csv(descaled_file, mode=mode, header=header)
+
+
+def _read_raw(input_file, dtype=None):
+    """
+    Lee los datos crudos desde el CSV de yfinance (cabecera de tres filas) o desde el almacén binario.
+    """
+    if is_store(input_file):
+        return read_frame(input_file, dtype=dtype)
+    return pd.read_csv(input_file, header=0, skiprows=[1, 2], index_col=0, parse_dates=True, dtype=dtype)
+
+
+def _read_raw_tail(input_file, state):
+    """
+    Lee solo las filas crudas desde la última fila procesada (incluida). Devuelve None si no se puede
+    continuar desde el estado guardado (por ejemplo, si el CSV crudo fue reescrito).
+    """
+    if is_store(input_file):
+        new_raw = read_frame(input_file, start=state['last_date'])
+        new_raw = new_raw[new_raw.index > pd.Timestamp(state['last_date'])]
+        return new_raw if not new_raw.empty else None
+
+    if state.get('raw_offset') is None or os.path.getsize(input_file) <= state['raw_offset']:
+        return None
+    try:
+        with open(input_file, 'rb') as f:
+            f.seek(state['raw_offset'])
+            new_raw = pd.read_csv(f, header=None, names=['Date'] + state['raw_columns'], index_col=0, parse_dates=True)
+    except ValueError:
+        return None
+    # Si el CSV crudo fue reescrito, el offset ya no apunta a la fila esperada
+    if not isinstance(new_raw.index, pd.DatetimeIndex) or new_raw.empty or new_raw.index[0] <= pd.Timestamp(state['last_date']):
+        return None
+    new_raw.index.name = None
+    return new_raw
+
+
+def _build_state(n, input_file, raw, prev_range, data_min, data_max, low_memory=False):
+    """
+    Estado necesario para reprocesar desde la última fila cruda (que puede ser reemplazada
+    por el extractor) sin volver a leer el histórico.
+
+    raw puede ser solo la cola de los datos crudos (basta con las últimas n + 1 filas); prev_range es el rango
+    de los datos procesados sin la última fila.
+    """
+    raw_before_last = raw.iloc[:-1]
+    return {
+        'n': n,
+        'raw_columns': raw.columns.tolist(),
+        'raw_offset': None if is_store(input_file) else _last_line_offset(input_file),
+        'last_date': str(raw_before_last.index[-1]) if len(raw_before_last) else None,
+        'prev_raw_row': [float(v) for v in raw_before_last.iloc[-1]] if len(raw_before_last) else None,
+        'prev_closes': raw_before_last['Close'].iloc[-n:].tolist(),
+        'prev_range': list(prev_range),
+        'data_min': data_min,
+        'data_max': data_max,
+        'low_memory': low_memory,
+    }
+
+
+def _raw_chunks(input_file, chunk_rows):
+    """
+    Lee los datos crudos por bloques de chunk_rows filas con los tipos de baja memoria.
+    """
+    if is_store(input_file):
+        index, _ = read_arrays(input_file, ["Close"])
+        for begin in range(0, len(index), chunk_rows):
+            chunk = read_frame(input_file, start=index[begin], end=index[min(begin + chunk_rows, len(index)) - 1])
+            yield chunk.astype({c: t for c, t in LOW_MEMORY_DTYPES.items() if c in chunk.columns})
+        return
+    yield from pd.read_csv(input_file, header=0, skiprows=[1, 2], index_col=0, parse_dates=True,
+                           dtype=LOW_MEMORY_DTYPES, chunksize=chunk_rows)
+
+
+def _window_chunks(input_file, n, chunk_rows):
+    """
+    Recorre los datos crudos por bloques y agrega lags y SMA arrastrando la ventana de cierres
+    y la última fila (para el ffill) de un bloque al siguiente.
+
+    Yields:
+        tuple: (bloque crudo con ffill, bloque con features y sin las filas incompletas).
+    """
+    last_row = None
+    prev_closes = []
+    for raw in _raw_chunks(input_file, chunk_rows):
+        raw = raw.ffill() if last_row is None else pd.concat([last_row, raw]).ffill().iloc[1:]
+        last_row = raw.iloc[[-1]]
+        # Los features se agregan sobre el mismo bloque (sin copia)
+        data = raw.copy(deep=False)
+        lag_cols = _add_window_features(data, n, prev_closes)
+        prev_closes = (list(prev_closes) + raw['Close'].iloc[-n:].tolist())[-n:]
+        data = data.dropna(subset=lag_cols)
+        if data['Volume'].notna().all():
+            data['Volume'] = data['Volume'].astype(np.int64)
+        yield raw, data
+
+
+def _preprocess_chunked(input_file, n, chunk_rows, scaled_file=None, descaled_file=None, output_path=None):
+    """
+    Preprocesamiento de baja memoria: dos pasadas por bloques sobre los datos crudos (la primera solo calcula el
+    rango del escalador, la segunda escala y escribe). La memoria máxima es del orden de un bloque.
+
+    Returns:
+        dict: Estado para el modo incremental.
+    """
+    data_range = (None, None)
+    for _, data in _window_chunks(input_file, n, chunk_rows):
+        data_range = _merge_range(data_range, _range_of(data))
+    scaler = _scaler_from_range(*data_range)
+
+    prev_range = (None, None)
+    last_row = None
+    last_data = None
+    raw_tail = None
+    first = True
+    for raw, data in _window_chunks(input_file, n, chunk_rows):
+        raw_tail = raw.iloc[-(n + 1):] if raw_tail is None else pd.concat([raw_tail, raw.iloc[-(n + 1):]]).iloc[-(n + 1):]
+        if data.empty:
+            continue
+        # Rango de todas las filas procesadas menos la última (la que puede reemplazar el extractor)
+        if last_row is not None:
+            prev_range = _merge_range(prev_range, _range_of(last_row))
+        prev_range = _merge_range(prev_range, _range_of(data.iloc[:-1]))
+        last_row = data.iloc[[-1]].copy()
+
+        if output_path is not None:
+            data[FEATURES_TO_SCALE] = scaler.transform(data[FEATURES_TO_SCALE]).astype(np.float32)
+            if first:
+                write_frame(output_path, data, scaler=scaler)
+            else:
+                append_frame(output_path, data)
+            last_data = data.iloc[[-1]]
+        else:
+            _write_outputs(data, scaler, scaled_file, descaled_file, append=not first)
+        first = False
+
+    state = _build_state(n, input_file, raw_tail, prev_range, scaler.data_min_.tolist(), scaler.data_max_.tolist(),
+                         low_memory=True)
+    if output_path is not None and last_data is not None:
+        # Se vuelve a escribir la última fila para guardar el estado junto con los metadatos
+        append_frame(output_path, last_data, extra={'preprocess': state})
+    return state
+
+
+def _incremental_rows(input_file, state, n):
+    """
+    Calcula los features de las filas nuevas con la ventana guardada.
+
+    Returns:
+        DataFrame con las filas nuevas (la primera reemplaza a la última ya procesada), o None si
+        hace falta un recálculo completo. Actualiza state para la siguiente corrida.
+    """
+    if state.get('n') != n or len(state['prev_closes']) < n or state['prev_raw_row'] is None:
+        return None
+    new_raw = _read_raw_tail(input_file, state)
+    if new_raw is None:
+        return None
+
+    # El ffill continúa desde la última fila cruda anterior
+    raw_columns = state['raw_columns']
+    prev_row = pd.DataFrame([state['prev_raw_row']], columns=raw_columns, index=[pd.Timestamp(state['last_date'])])
+    new_raw = pd.concat([prev_row, new_raw[raw_columns]]).ffill().iloc[1:]
+    if state.get('low_memory'):
+        new_raw = new_raw.astype({c: t for c, t in LOW_MEMORY_DTYPES.items() if c in raw_columns})
+
+    data = new_raw.copy()
+    lag_cols = _add_window_features(data, n, state['prev_closes'])
+    data = data.dropna(subset=lag_cols)
+    if state.get('low_memory') and data['Volume'].notna().all():
+        data['Volume'] = data['Volume'].astype(np.int64)
+
+    data_range = _merge_range(tuple(state['prev_range']), _range_of(data))
+    if data_range[0] != state['data_min'] or data_range[1] != state['data_max']:
+        print(f"El rango del escalador cambió para {input_file}; se hace un reescalado completo.")
+        return None
+
+    closes = state['prev_closes'] + new_raw['Close'].iloc[:-1].tolist()
+    state.update({
+        'raw_offset': None if is_store(input_file) else _last_line_offset(input_file),
+        'last_date': str(new_raw.index[-2]) if len(new_raw) > 1 else state['last_date'],
+        'prev_raw_row': [float(v) for v in new_raw.iloc[-2]] if len(new_raw) > 1 else state['prev_raw_row'],
+        'prev_closes': closes[-n:],
+        'prev_range': list(_merge_range(tuple(state['prev_range']), _range_of(data.iloc[:-1]))),
+    })
+    return data
+
+
+@instrument("preprocess", series="input_file")
+def preprocess_data(input_file, scaled_dir, descaled_dir, n=3, incremental=False, store_dir=None, indicators=None,
+                    low_memory=False, chunk_rows=500_000):
     """
     Preprocesa los datos, guarda normalizados en scaled_dir y desescalados en descaled_dir.
+
+    Con incremental=True reutiliza la ventana de cierres y el rango del escalador de la corrida anterior
+    y solo calcula las filas nuevas. Si el rango del escalador cambia, se recalcula todo.
+
+    input_file puede ser el CSV de yfinance o una serie 'raw' del almacén binario. Con store_dir, los datos
+    normalizados se guardan en el almacén ({store_dir}/features/{ticker}_{intervalo}) junto con los
+    parámetros del escalador, y la versión desescalada se deriva al leer en lugar de escribirse aparte.
+
+    indicators (dict): indicadores técnicos adicionales para compute_indicators (ver indicators.DEFAULT_INDICATORS).
+    Se calculan en una sola pasada junto con los lags y la SMA; en este caso el modo incremental
+    hace un recálculo completo.
+
+    low_memory (bool): precios en float32 y volumen entero, y lectura del archivo crudo por bloques de
+    chunk_rows filas arrastrando la ventana de lags/SMA entre bloques; la memoria máxima queda en unos pocos
+    bloques sin importar el largo de la serie. Con indicators la serie se lee completa (con los mismos tipos).
     """
     try:
-        data = pd.read_csv(input_file, header=0, skiprows=[1, 2], index_col=0, parse_dates=True)
-        data.ffill(inplace=True)
+        name = os.path.basename(input_file).replace('.csv', '')
+        if store_dir is not None:
+            output_path = store_path(store_dir, 'features', name)
+            state = read_meta(output_path)['extra'].get('preprocess') if is_store(output_path) else None
+        else:
+            os.makedirs(scaled_dir, exist_ok=True)
+            os.makedirs(descaled_dir, exist_ok=True)
+            scaled_file = os.path.join(scaled_dir, f"{name}.csv")
+            descaled_file = os.path.join(descaled_dir, f"descaled_{name}.csv")
+            state_file = _state_file(scaled_dir, input_file)
+            state = None
+            if os.path.exists(state_file) and os.path.exists(scaled_file) and os.path.exists(descaled_file):
+                with open(state_file) as f:
+                    state = json.load(f)
+
+        data = _incremental_rows(input_file, state, n) if incremental and state is not None and indicators is None else None
+        if data is not None:
+            record(mode='incremental', rows=len(data) - 1, features=len(data.columns))
+            scaler = _scaler_from_range(state['data_min'], state['data_max'])
+            if store_dir is not None:
+                data[FEATURES_TO_SCALE] = scaler.transform(data[FEATURES_TO_SCALE])
+                append_frame(output_path, data, extra={'preprocess': state})
+                print(f"{len(data) - 1} filas nuevas agregadas a {output_path}")
+                return
 
-        # === Ventanas deslizantes (lags) ===
-        lag_cols = []
-        for i in range(1, n+1):
-            col = f'Close_lag_{i}'
-            data[col] = data['Close'].shift(i)
-            lag_cols.append(col)
+            # Reemplazar la última fila de salida (se reprocesa la última fila cruda)
+            for file_path, offset in ((scaled_file, state['scaled_offset']), (descaled_file, state['descaled_offset'])):
+                with open(file_path, 'r+b') as f:
+                    f.truncate(offset)
+            _write_outputs(data, scaler, scaled_file, descaled_file, append=True)
+            state['scaled_offset'] = _last_line_offset(scaled_file)
+            state['descaled_offset'] = _last_line_offset(descaled_file)
+            with open(state_file, 'w') as f:
+                json.dump(state, f)
+            print(f"{len(data) - 1} filas nuevas agregadas a {scaled_file} y {descaled_file}")
+            return
 
-        # === SMA ===
-        data[f'SMA_{n}'] = data['Close'].rolling(window=n).mean()
+        if low_memory and indicators is None:
+            record(mode='chunked')
+            if store_dir is not None:
+                _preprocess_chunked(input_file, n, chunk_rows, output_path=output_path)
+                print(f"Datos normalizados guardados en {output_path}")
+                return
+            state = _preprocess_chunked(input_file, n, chunk_rows, scaled_file=scaled_file, descaled_file=descaled_file)
+            print(f"Datos normalizados guardados en {scaled_file}")
+            print(f"Datos desescalados guardados en {descaled_file}")
+            state['scaled_offset'] = _last_line_offset(scaled_file)
+            state['descaled_offset'] = _last_line_offset(descaled_file)
+            with open(state_file, 'w') as f:
+                json.dump(state, f)
+            return
 
-        # Eliminar filas con nulos solo en las columnas lag
+        raw = _read_raw(input_file, dtype=LOW_MEMORY_DTYPES if low_memory else None).ffill()
+
+        # === Ventanas deslizantes (lags) y SMA ===
+        if indicators is None:
+            data = raw.copy()
+            lag_cols = _add_window_features(data, n)
+        else:
+            window_features = compute_indicators(raw, n, indicators)
+            data = pd.concat([raw, window_features], axis=1)
+            lag_cols = list(window_features.columns)
+
+        # Eliminar filas con nulos solo en las columnas de ventana (lags e indicadores)
         data = data.dropna(subset=lag_cols).copy()
 
         # === Normalización ===
+        record(mode='full', rows=len(data), features=len(data.columns))
         scaler = MinMaxScaler()
-        features_to_scale = ["Close", "High", "Low", "Open", "Volume"]
+        scaler.fit(data[FEATURES_TO_SCALE])
+        state = _build_state(n, input_file, raw.iloc[-(n + 1):], _range_of(data.iloc[:-1]),
+                             scaler.data_min_.tolist(), scaler.data_max_.tolist(), low_memory=low_memory)
 
-        scaler.fit(data[features_to_scale])
-        data_scaled = data.copy()
-        data_scaled[features_to_scale] = scaler.transform(data[features_to_scale])
+        if store_dir is not None:
+            data[FEATURES_TO_SCALE] = scaler.transform(data[FEATURES_TO_SCALE])
+            write_frame(output_path, data, scaler=scaler, extra={'preprocess': state})
+            print(f"Datos normalizados guardados en {output_path}")
+            return
 
-        # === Guarda los datos normalizados (0 a 1) ===
-        os.makedirs(scaled_dir, exist_ok=True)
-        scaled_file = os.path.join(scaled_dir, os.path.basename(input_file))
-        data_scaled.to_csv(scaled_file)
+        # === Guarda los datos normalizados (0 a 1) y desescalados (valores originales) ===
+        _write_outputs(data, scaler, scaled_file, descaled_file)
         print(f"Datos normalizados guardados en {scaled_file}")
-
-        # === Guarda los datos desescalados (valores originales) ===
-        os.makedirs(descaled_dir, exist_ok=True)
-        data_descaled = data_scaled.copy()
-        data_descaled[features_to_scale] = scaler.inverse_transform(data_scaled[features_to_scale])
-        descaled_file = os.path.join(descaled_dir, f"descaled_{os.path.basename(input_file)}")
-        data_descaled.to_csv(descaled_file)
         print(f"Datos desescalados guardados en {descaled_file}")
 
+        state['scaled_offset'] = _last_line_offset(scaled_file)
+        state['descaled_offset'] = _last_line_offset(descaled_file)
+        with open(state_file, 'w') as f:
+            json.dump(state, f)
+
     except Exception as e:
         print(f"Error al preprocesar {input_file}: {e}")
+        record_error(e)
 
 if __name__ == "__main__":
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -58,6 +413,6 @@ if __name__ == "__main__":
     for interval in ["1d", "1wk", "1mo"]:
         input_file = os.path.join(data_dir, f"BAP_{interval}.csv")
         if os.path.exists(input_file):
-            preprocess_data(input_file, scaled_dir=scaled_dir, descaled_dir=descaled_dir, n=n)
+            preprocess_data(input_file, scaled_dir=scaled_dir, descaled_dir=descaled_dir, n=n, incremental=True)
         else:
             print(f"El archivo {input_file} no existe.")
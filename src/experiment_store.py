@@ -0,0 +1,109 @@
+import pandas as pd
+import numpy as np
+import sqlite3
+import hashlib
+import json
+import threading
+import os
+from datetime import datetime
+
+
+def hash_data(X, y=None):
+    """
+    Hash del contenido de la matriz de features (valores, columnas e índice) y, si se indica, del target.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps([str(c) for c in X.columns]).encode())
+    h.update(np.ascontiguousarray(X.index.to_numpy()).astype('int64', copy=False).tobytes()
+             if isinstance(X.index, pd.DatetimeIndex) else str(list(X.index)).encode())
+    h.update(np.ascontiguousarray(X.to_numpy(dtype=float)).tobytes())
+    if y is not None:
+        h.update(np.ascontiguousarray(np.asarray(y, dtype=float)).tobytes())
+    return h.hexdigest()
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+class ExperimentStore:
+    """
+    Registro local (SQLite) de experimentos. Cada celda (datos, features, parámetros, fold) guarda sus
+    métricas, de modo que una búsqueda repetida sobre los mismos datos solo evalúa lo que falta.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cells (
+                    data_hash TEXT, features TEXT, params TEXT, fold TEXT,
+                    metrics TEXT, created_at TEXT,
+                    PRIMARY KEY (data_hash, features, params, fold)
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, created_at TEXT, stage TEXT, input_file TEXT,
+                    data_hash TEXT, params TEXT, metrics TEXT, artifact TEXT
+                )""")
+
+    def get(self, data_hash, features, params, fold):
+        """
+        Métricas guardadas de la celda, o None si todavía no se evaluó.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT metrics FROM cells WHERE data_hash=? AND features=? AND params=? AND fold=?",
+                (data_hash, _dumps(list(features)), _dumps(params), str(fold))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, data_hash, features, params, fold, metrics):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cells VALUES (?, ?, ?, ?, ?, ?)",
+                (data_hash, _dumps(list(features)), _dumps(params), str(fold), _dumps(metrics),
+                 datetime.now().isoformat()))
+
+    def log_run(self, stage, input_file, data_hash, params, metrics, artifact=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO runs (created_at, stage, input_file, data_hash, params, metrics, artifact) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (datetime.now().isoformat(), stage, str(input_file), data_hash, _dumps(params), _dumps(metrics),
+                 None if artifact is None else str(artifact)))
+
+    def runs(self, stage=None, input_file=None):
+        """
+        Historial de corridas como DataFrame (filtrable por etapa y archivo de entrada).
+        """
+        query, args = "SELECT * FROM runs WHERE 1=1", []
+        if stage is not None:
+            query += " AND stage=?"
+            args.append(stage)
+        if input_file is not None:
+            query += " AND input_file=?"
+            args.append(str(input_file))
+        with self._lock:
+            return pd.read_sql_query(query + " ORDER BY id", self._conn, params=args)
+
+    def cells(self, data_hash=None):
+        query, args = "SELECT * FROM cells", []
+        if data_hash is not None:
+            query += " WHERE data_hash=?"
+            args.append(data_hash)
+        with self._lock:
+            return pd.read_sql_query(query, self._conn, params=args)
+
+    def close(self):
+        self._conn.close()
+
+
+def open_store(store):
+    """
+    Acepta una ruta al archivo SQLite o un ExperimentStore ya abierto.
+    """
+    if store is None or isinstance(store, ExperimentStore):
+        return store
+    return ExperimentStore(store)
@@ -0,0 +1,200 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+
+META_FILE = "meta.json"
+INDEX_FILE = "index.bin"
+
+
+def store_path(store_dir, kind, name):
+    """
+    Ruta de una serie dentro del almacén: {store_dir}/{kind}/{name}, con kind 'raw' o 'features'
+    y name del estilo 'BAP_1d'.
+    """
+    return os.path.join(store_dir, kind, name)
+
+
+def is_store(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+
+def _read_meta(path):
+    with open(os.path.join(path, META_FILE)) as f:
+        return json.load(f)
+
+
+def _write_meta(path, meta):
+    # Se escribe primero a un temporal para no dejar un meta.json a medias
+    tmp_file = os.path.join(path, META_FILE + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_file, os.path.join(path, META_FILE))
+
+
+def _column_file(path, column):
+    return os.path.join(path, f"{column}.bin")
+
+
+def _memmap(file_path, dtype, rows):
+    if rows == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(file_path, dtype=dtype, mode="r", shape=(rows,))
+
+
+def write_frame(path, frame, scaler=None, extra=None):
+    """
+    Guarda un DataFrame indexado por fecha como un archivo binario por columna.
+
+    Args:
+        path (str): Directorio de la serie (ver store_path).
+        frame (DataFrame): Datos a guardar. Las columnas numéricas conservan su dtype.
+        scaler (MinMaxScaler): Escalador ya ajustado; se guardan sus parámetros para derivar la vista desescalada.
+        extra (dict): Metadatos adicionales (ej. el estado del preprocesamiento incremental).
+    """
+    os.makedirs(path, exist_ok=True)
+    index = pd.DatetimeIndex(frame.index).as_unit("ns").asi8
+    index.astype(np.int64).tofile(os.path.join(path, INDEX_FILE))
+
+    columns = {}
+    for column in frame.columns:
+        values = np.ascontiguousarray(frame[column].to_numpy())
+        values.tofile(_column_file(path, column))
+        columns[column] = values.dtype.str
+
+    meta = {"rows": len(frame), "columns": columns, "extra": extra or {}}
+    if scaler is not None:
+        meta["scaler"] = {
+            "columns": list(scaler.feature_names_in_),
+            "scale": scaler.scale_.tolist(),
+            "min": scaler.min_.tolist(),
+        }
+    _write_meta(path, meta)
+
+
+def append_frame(path, frame, extra=None):
+    """
+    Agrega filas al final de la serie. Las filas guardadas con fecha >= a la primera fila nueva
+    se reemplazan (la última vela de 1wk/1mo puede venir actualizada).
+    """
+    if not is_store(path):
+        write_frame(path, frame, extra=extra)
+        return
+    meta = _read_meta(path)
+    index = _memmap(os.path.join(path, INDEX_FILE), np.int64, meta["rows"])
+    new_index = pd.DatetimeIndex(frame.index).as_unit("ns").asi8.astype(np.int64)
+    keep = int(np.searchsorted(index, new_index[0], side="left")) if len(new_index) else meta["rows"]
+    del index
+
+    files = [(os.path.join(path, INDEX_FILE), np.dtype(np.int64), new_index)]
+    for column, dtype in meta["columns"].items():
+        files.append((_column_file(path, column), np.dtype(dtype), frame[column].to_numpy()))
+    for file_path, dtype, values in files:
+        with open(file_path, "r+b") as f:
+            f.truncate(keep * dtype.itemsize)
+            f.seek(0, os.SEEK_END)
+            np.ascontiguousarray(values, dtype=dtype).tofile(f)
+
+    meta["rows"] = keep + len(frame)
+    if extra is not None:
+        meta["extra"] = extra
+    _write_meta(path, meta)
+
+
+def read_training_data(source, features, target="Close", low_memory=False):
+    """
+    Lee X (features en ese orden) e y para entrenar.
+
+    Con low_memory las features se leen directo como float32 (el tipo con el que sklearn entrena los árboles,
+    así no hace su propia copia) y X se arma sin copiar: queda un solo bloque float32 contiguo.
+    """
+    dtype = {column: np.float32 for column in features} if low_memory else None
+    data = read_frame(source, columns=list(features) + [target], dtype=dtype)
+    y = data.pop(target)
+    return data, y
+
+
+def list_columns(source):
+    """
+    Columnas disponibles en un CSV (sin leer los datos) o en una serie del almacén.
+    """
+    if is_store(source):
+        return list(_read_meta(source)["columns"])
+    return list(pd.read_csv(source, index_col=0, nrows=0).columns)
+
+
+def last_index(path):
+    """
+    Fecha de la última fila guardada, o None si la serie no existe o está vacía.
+    """
+    if not is_store(path):
+        return None
+    rows = _read_meta(path)["rows"]
+    if rows == 0:
+        return None
+    return pd.Timestamp(_memmap(os.path.join(path, INDEX_FILE), np.int64, rows)[-1])
+
+
+def read_meta(source):
+    return _read_meta(source)
+
+
+def read_arrays(path, columns=None, start=None, end=None, view="scaled"):
+    """
+    Lee columnas de la serie como arreglos NumPy mapeados en memoria (sin copiar).
+
+    Args:
+        path (str): Directorio de la serie.
+        columns (list): Columnas a leer. Si es None, todas.
+        start, end: Rango de fechas (ambos inclusivos). Se resuelve con búsqueda binaria sobre el índice.
+        view (str): 'scaled' devuelve lo guardado; 'descaled' aplica la inversa del escalador a sus columnas.
+
+    Returns:
+        tuple: (índice datetime64[ns], dict columna -> arreglo).
+    """
+    meta = _read_meta(path)
+    rows = meta["rows"]
+    index = _memmap(os.path.join(path, INDEX_FILE), np.int64, rows)
+    lo = int(np.searchsorted(index, pd.Timestamp(start).value, side="left")) if start is not None else 0
+    hi = int(np.searchsorted(index, pd.Timestamp(end).value, side="right")) if end is not None else rows
+
+    columns = list(meta["columns"]) if columns is None else list(columns)
+    arrays = {}
+    for column in columns:
+        if column not in meta["columns"]:
+            raise KeyError(f"La columna {column} no existe en {path}")
+        arrays[column] = _memmap(_column_file(path, column), np.dtype(meta["columns"][column]), rows)[lo:hi]
+
+    scaler = meta.get("scaler")
+    if view == "descaled" and scaler is not None:
+        # Misma operación que MinMaxScaler.inverse_transform: (X - min_) / scale_
+        for column, scale, min_ in zip(scaler["columns"], scaler["scale"], scaler["min"]):
+            if column in arrays:
+                arrays[column] = (arrays[column] - min_) / scale
+    return index[lo:hi].view("datetime64[ns]"), arrays
+
+
+def read_frame(source, columns=None, start=None, end=None, view="scaled", dtype=None):
+    """
+    Carga una serie como DataFrame, ya sea desde el almacén binario o desde un CSV preprocesado.
+    view solo aplica al almacén (en CSV la escala es la del archivo).
+    dtype (tipo o dict columna -> tipo) se aplica al leer, sin pasar por float64 (ej. np.float32).
+    """
+    if is_store(source):
+        index, arrays = read_arrays(source, columns, start, end, view)
+        data = pd.DataFrame(arrays, index=pd.DatetimeIndex(index), copy=False)
+        return data if dtype is None else data.astype(dtype)
+
+    header = pd.read_csv(source, nrows=0).columns
+    usecols = None
+    if columns is not None:
+        usecols = [header[0]] + list(columns)
+    if dtype is not None and not isinstance(dtype, dict):
+        # El índice (fechas) no se convierte
+        dtype = {column: dtype for column in (columns if columns is not None else header[1:])}
+    data = pd.read_csv(source, index_col=0, parse_dates=True, usecols=usecols, dtype=dtype)
+    if columns is not None:
+        data = data[list(columns)]
+    if start is not None or end is not None:
+        data = data.loc[start:end]
+    return data
@@ -0,0 +1,179 @@
+import pandas as pd
+import numpy as np
+import os
+import math
+from sklearn.ensemble import RandomForestRegressor
+from feature_store import list_columns, read_frame
+from indicators import select_features
+from experiment_store import hash_data, open_store
+from instrumentation import instrument, record, record_error
+from ramdomF1 import FIXED_PARAMS, _save_atomic
+from predictor import load_model
+
+DEFAULT_QUANTILES = (0.1, 0.5, 0.9)
+
+
+def make_targets(close, horizons):
+    """
+    Retornos Close[t+h] / Close[t] - 1 para h = 1..horizons: arreglo (filas, horizons), NaN al final de la serie.
+    """
+    close = np.asarray(close, dtype=float)
+    targets = np.full((len(close), horizons), np.nan)
+    for h in range(1, horizons + 1):
+        targets[:len(close) - h, h - 1] = close[h:] / close[:-h] - 1
+    return targets
+
+
+def tree_predictions(model, X):
+    """
+    Predicción de cada árbol: arreglo (n_árboles, filas, horizontes). Con un bosque exportado (FlatForest)
+    es una sola pasada vectorizada; con sklearn se recorre la lista de árboles.
+    """
+    if hasattr(model, 'predict_trees'):
+        return model.predict_trees(X)
+    if hasattr(X, 'columns') and hasattr(model, 'feature_names_in_'):
+        X = X[list(model.feature_names_in_)]
+    # Los árboles internos se entrenaron sin nombres de columnas y en float32
+    X = np.asarray(X, dtype=np.float32)
+    per_tree = np.stack([tree.predict(X) for tree in model.estimators_])
+    return per_tree.reshape(len(model.estimators_), len(X), -1)
+
+
+def predict_intervals(model, X, quantiles=DEFAULT_QUANTILES):
+    """
+    Media y cuantiles de las predicciones de los árboles para cada fila y horizonte.
+
+    Returns:
+        tuple: (media (filas, horizontes), cuantiles (len(quantiles), filas, horizontes)).
+    """
+    per_tree = tree_predictions(model, X)
+    # Todos los cuantiles de todas las filas y horizontes en una sola operación
+    return per_tree.mean(axis=0), np.quantile(per_tree, quantiles, axis=0)
+
+
+def _interval_metrics(y_true, mean, lower, upper):
+    """
+    Métricas por horizonte: MAE del retorno, acierto de dirección y cobertura del intervalo.
+    """
+    metrics = []
+    for h in range(y_true.shape[1]):
+        metrics.append({
+            'horizon': h + 1,
+            'MAE': float(np.mean(np.abs(y_true[:, h] - mean[:, h]))),
+            'direction_hit_rate': float(np.mean(np.sign(mean[:, h]) == np.sign(y_true[:, h]))),
+            'coverage': float(np.mean((y_true[:, h] >= lower[:, h]) & (y_true[:, h] <= upper[:, h]))),
+            'interval_width': float(np.mean(upper[:, h] - lower[:, h])),
+        })
+    return metrics
+
+
+@instrument("train_forecast", series="input_file")
+def train_forecaster(input_file, results_dir, horizons=5, params=None, quantiles=(0.1, 0.9), store=None,
+                     low_memory=False):
+    """
+    Entrena un solo Random Forest multi-salida que pronostica los retornos de t+1 a t+horizons en un solo ajuste
+    (en lugar de un modelo por horizonte) y evalúa la cobertura de sus intervalos en el 20% final.
+
+    Los targets son retornos relativos al cierre actual, así que los datos deben estar en precios reales:
+    CSV desescalado o serie del almacén (se usa la vista desescalada).
+
+    Args:
+        input_file (str): Datos preprocesados.
+        results_dir (str): Carpeta del modelo (forecast_{serie}.joblib) y de las métricas por horizonte.
+        horizons (int): Cantidad de velas a pronosticar.
+        params (dict): Parámetros del RandomForestRegressor (por defecto los de ramdomF1).
+        quantiles (tuple): Cuantiles inferior y superior del intervalo a evaluar.
+        store (str o ExperimentStore): Registro de experimentos donde se guarda la corrida.
+        low_memory (bool): Leer las features como float32.
+
+    Returns:
+        DataFrame: Métricas por horizonte (o None si hubo un error).
+    """
+    try:
+        params = dict(params or FIXED_PARAMS)
+        features = select_features(list_columns(input_file))
+        target = "Close"
+        dtype = {column: np.float32 for column in features} if low_memory else None
+        data = read_frame(input_file, columns=list(dict.fromkeys(features + [target])), view="descaled", dtype=dtype)
+        X = data[features]
+        Y = make_targets(data[target], horizons)
+
+        # Las últimas filas no tienen todos los horizontes: no se usan para entrenar
+        X, Y = X.iloc[:len(X) - horizons], Y[:len(Y) - horizons]
+        record(rows=len(X), features=len(features), horizons=horizons)
+
+        # Separar sin mezclar temporalidad; el hueco de horizons filas evita que los targets de train
+        # incluyan cierres del periodo de prueba
+        train_size = len(X) - math.ceil(0.2 * len(X))
+        test_start = min(train_size + horizons, len(X))
+        model = RandomForestRegressor(**params)
+        model.fit(X.iloc[:train_size], Y[:train_size])
+        mean, (lower, upper) = predict_intervals(model, X.iloc[test_start:], quantiles)
+        metrics = pd.DataFrame(_interval_metrics(Y[test_start:], mean, lower, upper))
+        record(coverage=float(metrics['coverage'].mean()))
+        print(metrics.to_string(index=False))
+
+        # Modelo final con todas las filas
+        model.fit(X, Y)
+        name = os.path.basename(os.path.normpath(input_file)).replace('.csv', '')
+        os.makedirs(results_dir, exist_ok=True)
+        model_file = os.path.join(results_dir, f"forecast_{name}.joblib")
+        _save_atomic(model, model_file)
+        result_file = os.path.join(results_dir, f"forecast_results_{name}.csv")
+        metrics.to_csv(result_file, index=False)
+        print(f"Modelo de pronóstico guardado en {model_file}")
+        print(f"Resultados guardados en {result_file}")
+
+        store = open_store(store)
+        if store is not None:
+            store.log_run("train_forecast", input_file, hash_data(X, Y), {**params, 'horizons': horizons},
+                          {'quantiles': list(quantiles), 'horizons': metrics.to_dict('records')}, model_file)
+        return metrics
+
+    except Exception as e:
+        print(f"Error al entrenar el modelo de pronóstico para {input_file}: {e}")
+        record_error(e)
+
+
+def forecast(data, model, quantiles=DEFAULT_QUANTILES, rows=1):
+    """
+    Pronóstico con intervalos desde las últimas filas de los datos, en precios.
+
+    Args:
+        data (DataFrame): Features y Close en precios reales (ver train_forecaster).
+        model: Modelo de train_forecaster (RandomForestRegressor o bosque exportado).
+        rows (int): Cantidad de filas finales desde las que se pronostica.
+
+    Returns:
+        DataFrame: Una fila por (fecha, horizonte) con el cierre actual, el precio medio y los cuantiles.
+    """
+    features = list(getattr(model, 'feature_names_in_', select_features(list(data.columns))))
+    data = data.iloc[-rows:]
+    mean, bands = predict_intervals(model, data[features], quantiles)
+    close = data["Close"].to_numpy(dtype=float)[:, None]
+
+    horizons = mean.shape[1]
+    result = pd.DataFrame({
+        'date': np.repeat(data.index, horizons),
+        'horizon': np.tile(np.arange(1, horizons + 1), len(data)),
+        'close': np.repeat(close[:, 0], horizons),
+        'mean': (close * (1 + mean)).ravel(),
+    })
+    for q, band in zip(quantiles, bands):
+        result[f'q{round(q * 100):02d}'] = (close * (1 + band)).ravel()
+    return result
+
+
+if __name__ == "__main__":
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(script_dir, r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data\preprocessed")
+    results_dir = os.path.join(script_dir, r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\results_forecast")
+
+    for interval in ["1d", "1wk", "1mo"]:
+        input_file = os.path.join(data_dir, f"descaled_BAP_{interval}.csv")
+        if not os.path.exists(input_file):
+            print(f"El archivo {input_file} no existe.")
+            continue
+        train_forecaster(input_file, results_dir, horizons=5)
+        model_file = os.path.join(results_dir, f"forecast_{os.path.basename(input_file).replace('.csv', '')}.joblib")
+        print(forecast(read_frame(input_file), load_model(model_file)).to_string(index=False))
@@ -0,0 +1,169 @@
+import numpy as np
+import os
+import json
+import shutil
+from joblib import load
+
+ARRAYS = ("feature", "threshold", "left", "right", "missing_left", "value", "roots")
+
+
+def _floor_float32(threshold):
+    """
+    Redondea los umbrales hacia abajo a float32. sklearn compara X en float32 contra umbrales float64;
+    para todo x float32, x <= t equivale a x <= floor32(t), así que las predicciones no cambian.
+    """
+    threshold32 = threshold.astype(np.float32)
+    above = threshold32.astype(np.float64) > threshold
+    threshold32[above] = np.nextafter(threshold32[above], np.float32(-np.inf))
+    return threshold32
+
+
+def export_forest(model, output_dir):
+    """
+    Convierte un RandomForestRegressor entrenado en arreglos planos (.npy) que se pueden mapear en memoria.
+
+    Todos los árboles se concatenan: los índices de hijos son globales y roots indica el nodo raíz de cada árbol.
+    La escritura se hace en un directorio temporal que luego reemplaza al anterior.
+
+    Args:
+        model (RandomForestRegressor): Modelo entrenado.
+        output_dir (str): Directorio de salida (ej. best_model_BAP_1d.forest).
+    """
+    features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left < 0
+        roots.append(offset)
+        features.append(np.where(is_leaf, -1, tree.feature).astype(np.int32))
+        thresholds.append(_floor_float32(tree.threshold))
+        lefts.append(np.where(is_leaf, -1, tree.children_left + offset).astype(np.int32))
+        rights.append(np.where(is_leaf, -1, tree.children_right + offset).astype(np.int32))
+        missing_go_to_left = getattr(tree, "missing_go_to_left", None)
+        missing.append(np.zeros(tree.node_count, dtype=np.uint8) if missing_go_to_left is None
+                       else np.asarray(missing_go_to_left, dtype=np.uint8))
+        values.append(tree.value[:, :, 0].astype(np.float64))
+        max_depth = max(max_depth, tree.max_depth)
+        offset += tree.node_count
+
+    arrays = {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "missing_left": np.concatenate(missing),
+        "value": np.ascontiguousarray(np.concatenate(values)),
+        "roots": np.array(roots, dtype=np.int32),
+    }
+    meta = {
+        "n_trees": len(model.estimators_),
+        "n_features": int(model.n_features_in_),
+        "n_outputs": int(model.n_outputs_),
+        "max_depth": int(max_depth),
+        "feature_names": [str(c) for c in getattr(model, "feature_names_in_", [])],
+    }
+
+    tmp_dir = output_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    old_dir = output_dir.rstrip("/\\") + ".old"
+    if os.path.exists(output_dir):
+        os.replace(output_dir, old_dir)
+    os.replace(tmp_dir, output_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class FlatForest:
+    """
+    Predictor NumPy sobre el formato plano de export_forest. Recorre todos los árboles a la vez, un nivel
+    por iteración, y da las mismas predicciones que RandomForestRegressor.predict.
+    """
+
+    def __init__(self, arrays, meta):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.n_trees = meta["n_trees"]
+        self.n_features_in_ = meta["n_features"]
+        self.n_outputs_ = meta["n_outputs"]
+        self.max_depth = meta["max_depth"]
+        if meta["feature_names"]:
+            self.feature_names_in_ = np.array(meta["feature_names"], dtype=object)
+
+    def _as_array(self, X):
+        if hasattr(X, "columns") and hasattr(self, "feature_names_in_"):
+            X = X[list(self.feature_names_in_)]
+        return np.asarray(X, dtype=np.float32).reshape(-1, self.n_features_in_)
+
+    def apply(self, X):
+        """
+        Índice (global) de la hoja de cada árbol para cada fila: arreglo (n_trees, n_rows).
+        """
+        X = self._as_array(X)
+        rows = np.arange(X.shape[0])[None, :]
+        node = np.repeat(self.roots.astype(np.intp)[:, None], X.shape[0], axis=1)
+        for _ in range(self.max_depth):
+            feature = self.feature[node]
+            internal = feature >= 0
+            if not internal.any():
+                break
+            x = X[rows, np.maximum(feature, 0)]
+            go_left = (x <= self.threshold[node]) | (np.isnan(x) & (self.missing_left[node] == 1))
+            node = np.where(internal, np.where(go_left, self.left[node], self.right[node]), node)
+        return node
+
+    def predict_trees(self, X):
+        """
+        Predicción de cada árbol: arreglo (n_trees, n_rows, n_outputs).
+        """
+        return self.value[self.apply(X)]
+
+    def predict(self, X):
+        per_tree = self.predict_trees(X)
+        # Se acumula árbol por árbol, en el mismo orden que sklearn, para obtener los mismos float64
+        prediction = np.zeros(per_tree.shape[1:], dtype=np.float64)
+        for tree_prediction in per_tree:
+            prediction += tree_prediction
+        prediction /= self.n_trees
+        return prediction[:, 0] if self.n_outputs_ == 1 else prediction
+
+
+def load_forest(forest_dir, mmap=True):
+    """
+    Carga un bosque exportado. Con mmap=True los arreglos se mapean en memoria en lugar de leerse.
+    """
+    with open(os.path.join(forest_dir, "meta.json")) as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(forest_dir, f"{name}.npy"), mmap_mode="r" if mmap else None) for name in ARRAYS}
+    return FlatForest(arrays, meta)
+
+
+def is_forest(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, "roots.npy"))
+
+
+def export_artifact(model_file):
+    """
+    Exporta un artefacto .joblib a un directorio .forest al lado del original y devuelve su ruta.
+    """
+    output_dir = str(model_file).replace(".joblib", ".forest")
+    export_forest(load(model_file), output_dir)
+    return output_dir
+
+
+if __name__ == "__main__":
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_dir = os.path.join(script_dir, r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA")
+
+    for folder in ["results", "results_rf_fijos", os.path.join("data", "models")]:
+        folder = os.path.join(base_dir, folder)
+        if not os.path.isdir(folder):
+            continue
+        for file_name in sorted(os.listdir(folder)):
+            if file_name.endswith(".joblib"):
+                print(f"Bosque exportado en {export_artifact(os.path.join(folder, file_name))}")
@@ -1,33 +1,284 @@
 #vamos a mostrar la matriz de correlacion de los datos preprocesados
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+import numpy as np
 import os
+from feature_store import is_store, read_frame, write_frame
+from indicators import rolling_mean
+from data_preprocessor import FEATURES_TO_SCALE, load_scaler
+from instrumentation import instrument, record
 
-def plot_correlation_matrix(input_file, output_dir):
-    try:
-        # Cargar los datos preprocesados
-        data = pd.read_csv(input_file, index_col=0, parse_dates=True)
 
-        # Calcular la matriz de correlación
-        corr = data.corr()
+class CorrelationStats:
+    """
+    Estadísticos suficientes de la correlación (conteos, medias y co-momentos por par de columnas).
+
+    Cada par usa solo las filas donde ambas columnas tienen dato (como DataFrame.corr), así que sirve para
+    series de distintos tickers con fechas que no coinciden. Los lotes se combinan con la fórmula de Chan
+    (medias y co-momentos centrados, sin restar sumas grandes): agregar velas no obliga a recalcular.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.n = np.zeros((k, k))
+        # mean[i, j] y m2[i, j]: media y suma de cuadrados centrada de la columna i en las filas donde j tiene dato
+        self.mean = np.zeros((k, k))
+        self.m2 = np.zeros((k, k))
+        self.c = np.zeros((k, k))
+
+    @classmethod
+    def from_values(cls, columns, values):
+        """
+        Estadísticos de un lote (filas x columnas, NaN = sin dato) con productos de matrices.
+        """
+        stats = cls(columns)
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return stats
+        mask = ~np.isnan(values)
+        present = mask.astype(float)
+        # Se centra cada columna en su media del lote antes de acumular
+        counts = present.sum(axis=0)
+        shift = np.where(mask, values, 0.0).sum(axis=0) / np.maximum(counts, 1)
+        x = np.where(mask, values - shift, 0.0)
+
+        n = present.T @ present
+        sums = x.T @ present
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(n > 0, sums / n, 0.0)
+        stats.n = n
+        stats.mean = mean + shift[:, None]
+        stats.m2 = (x * x).T @ present - mean * sums
+        stats.c = x.T @ x - mean * sums.T
+        return stats
+
+    def merge(self, other):
+        """
+        Combina con los estadísticos de otro lote de las mismas columnas (fórmula de Chan).
+        """
+        if other.columns != self.columns:
+            raise ValueError("Los estadísticos tienen columnas distintas")
+        n = self.n + other.n
+        safe_n = np.maximum(n, 1)
+        weight = self.n * other.n / safe_n
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.n / safe_n
+        self.m2 = self.m2 + other.m2 + delta * delta * weight
+        self.c = self.c + other.c + delta * delta.T * weight
+        self.n = n
+        return self
+
+    def update(self, values):
+        return self.merge(CorrelationStats.from_values(self.columns, values))
+
+    def copy(self):
+        stats = CorrelationStats(self.columns)
+        stats.n, stats.mean, stats.m2, stats.c = self.n.copy(), self.mean.copy(), self.m2.copy(), self.c.copy()
+        return stats
+
+    def corr(self, min_periods=2):
+        """
+        Matriz de correlación de Pearson (NaN en los pares con menos de min_periods filas o sin variación).
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = self.c / np.sqrt(self.m2 * self.m2.T)
+        corr = np.clip(corr, -1.0, 1.0)
+        corr[self.n < min_periods] = np.nan
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+
+def _read_prices(input_file, columns=None, start=None):
+    """
+    Lee la serie en precios reales: vista desescalada del almacén, o CSV normalizado desescalado con el rango
+    guardado por preprocess_data. En la escala min-max el mínimo vale 0 (su retorno logarítmico es -inf)
+    y un reescalado cambiaría las filas ya acumuladas en los estadísticos.
+    """
+    data = read_frame(input_file, columns=columns, start=start, view="descaled")
+    scaler = None if is_store(input_file) else load_scaler(input_file)
+    if scaler is not None:
+        for i, name in enumerate(FEATURES_TO_SCALE):
+            if name in data.columns:
+                data[name] = (data[name] - scaler.min_[i]) / scaler.scale_[i]
+    return data
+
+
+def _read_values(input_files, column, start=None):
+    """
+    Un archivo: todas sus columnas. Varios: la columna indicada de cada serie, alineadas por fecha.
+    """
+    if isinstance(input_files, str):
+        return _read_prices(input_files, start=start)
+    series = {}
+    for input_file in input_files:
+        name = os.path.basename(os.path.normpath(input_file)).replace('.csv', '')
+        series[name] = _read_prices(input_file, columns=[column], start=start)[column]
+    return pd.concat(series, axis=1).sort_index()
+
+
+def _load_state(output_file):
+    with np.load(output_file, allow_pickle=False) as f:
+        stats = CorrelationStats(f['columns'].tolist())
+        stats.n, stats.mean, stats.m2, stats.c = f['n'], f['mean'], f['m2'], f['c']
+        return stats, str(f['anchor_date']), f['pending']
+
+
+@instrument("correlation")
+def correlation_matrix(input_files, output_file=None, column="Close", returns=None, incremental=True):
+    """
+    Matriz de correlación desde estadísticos acumulados; con incremental solo se leen las filas nuevas.
+
+    Args:
+        input_files (str o list): Una serie (se correlacionan todas sus columnas) o varias (se correlaciona
+            la columna indicada entre series, alineadas por fecha).
+        output_file (str): Archivo .npz con la matriz y los estadísticos para la siguiente corrida.
+        column (str): Columna a comparar entre series.
+        returns (bool): Correlacionar retornos logarítmicos en lugar de niveles. Por defecto, sí con varias series
+            (los niveles de precios con tendencia dan correlaciones espurias) y no con una sola.
+        incremental (bool): Continuar desde output_file si existe y tiene las mismas columnas. Supone que entre
+            corridas todas las series se actualizan hasta la misma fecha: las filas ya acumuladas no se revisan.
+
+    Las series se leen en precios reales (ver _read_prices), así que se pueden pasar CSV normalizados.
 
-        # Crear un mapa de calor
-        plt.figure(figsize=(12, 8))
-        sns.heatmap(corr, annot=True, fmt=".2f", cmap="coolwarm", square=True, cbar_kws={"shrink": .8})
-        plt.title("Matriz de Correlación")
-        plt.xticks(rotation=45)
-        plt.yticks(rotation=45)
+    Returns:
+        DataFrame: Matriz de correlación.
+    """
+    if returns is None:
+        returns = not isinstance(input_files, str)
 
-        # Guardar la figura
+    state = None
+    if incremental and output_file is not None and os.path.exists(output_file):
+        state = _load_state(output_file)
+
+    # Se lee desde la penúltima fila procesada (la ancla de los retornos); la última se vuelve a sumar
+    # porque el extractor puede reemplazarla (velas 1wk/1mo en curso)
+    data = _read_values(input_files, column, start=state[1] if state is not None else None)
+    if returns:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            data = np.log(data.astype(float)).diff()
+    if state is not None:
+        stats, anchor_date, _ = state
+        if stats.columns != [str(c) for c in data.columns] or data.empty or data.index[0] != pd.Timestamp(anchor_date):
+            print(f"Las series cambiaron desde la última corrida; se recalcula {output_file}.")
+            return correlation_matrix(input_files, output_file, column, returns, incremental=False)
+        data = data.iloc[1:]
+    else:
+        stats = CorrelationStats([str(c) for c in data.columns])
+        if returns:
+            data = data.iloc[1:]
+    if data.empty:
+        return stats.update(state[2]).corr() if state is not None else stats.corr()
+
+    values = data.to_numpy(dtype=float)
+    stats.update(values[:-1])
+    if len(data) > 1:
+        anchor_date = str(data.index[-2])
+    elif state is None:
+        # Una sola fila: no hay ancla para continuar después
+        return stats.update(values).corr()
+    final = stats.copy().update(values[-1:])
+    corr = final.corr()
+    record(rows=len(data), features=len(stats.columns))
+
+    if output_file is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+        np.savez(output_file, columns=np.array(stats.columns), corr=corr.to_numpy(), n=stats.n, mean=stats.mean,
+                 m2=stats.m2, c=stats.c, anchor_date=np.array(anchor_date), pending=values[-1:])
+    return corr
+
+
+def rolling_correlation(data, window, against="Close", columns=None, min_periods=None, output_path=None):
+    """
+    Correlación móvil de cada columna contra la columna against, con sumas móviles (O(n) sin importar
+    la ventana). Cada par usa solo las filas donde ambas tienen dato.
+
+    Args:
+        data (DataFrame o str): Datos, o una serie del almacén / CSV preprocesado (se lee en precios reales).
+        window (int): Tamaño de la ventana.
+        min_periods (int): Filas mínimas con dato en la ventana (por defecto, la ventana completa).
+        output_path (str): Si se indica, se guarda en el almacén binario (feature_store.write_frame).
+
+    Returns:
+        DataFrame: Una columna de correlación por serie, con el índice de data.
+    """
+    if isinstance(data, str):
+        data = _read_prices(data)
+    columns = [c for c in (columns or data.columns) if c != against]
+    min_periods = min_periods or window
+    y_all = data[against].to_numpy(dtype=float)
+
+    result = {}
+    for column in columns:
+        x = data[column].to_numpy(dtype=float)
+        mask = ~np.isnan(x) & ~np.isnan(y_all)
+        if not mask.any():
+            result[f"corr_{column}_{against}_{window}"] = np.full(len(x), np.nan)
+            continue
+        # Centradas en la media global para que las diferencias de momentos no pierdan precisión
+        dx = np.where(mask, x - x[mask].mean(), 0.0)
+        dy = np.where(mask, y_all - y_all[mask].mean(), 0.0)
+        count = rolling_mean(mask.astype(float), window) * window
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mx = rolling_mean(dx, window) * window / count
+            my = rolling_mean(dy, window) * window / count
+            cov = rolling_mean(dx * dy, window) * window / count - mx * my
+            var_x = rolling_mean(dx * dx, window) * window / count - mx * mx
+            var_y = rolling_mean(dy * dy, window) * window / count - my * my
+            corr = np.clip(cov / np.sqrt(var_x * var_y), -1.0, 1.0)
+        corr[(np.round(count) < min_periods) | (var_x <= 0) | (var_y <= 0)] = np.nan
+        result[f"corr_{column}_{against}_{window}"] = corr
+    result = pd.DataFrame(result, index=data.index)
+
+    if output_path is not None:
+        write_frame(output_path, result)
+    return result
+
+
+def _plot_heatmap(corr, output_file, annot=None):
+    """
+    Dibuja la matriz como mapa de calor. seaborn/matplotlib se importan aquí para que el cálculo no dependa de ellos.
+    """
+    import seaborn as sns
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    # Con cientos de series las anotaciones no se leen y son lo más lento de dibujar
+    annot = len(corr) <= 30 if annot is None else annot
+    size = max(12, len(corr) * 0.15)
+    plt.figure(figsize=(size, size * 2 / 3))
+    sns.heatmap(corr, annot=annot, fmt=".2f", cmap="coolwarm", square=True, cbar_kws={"shrink": .8})
+    plt.title("Matriz de Correlación")
+    plt.xticks(rotation=45)
+    plt.yticks(rotation=45)
+    plt.savefig(output_file)
+    plt.close()
+
+
+def plot_correlation_matrix(input_file, output_dir, plot=True, incremental=True):
+    """
+    Calcula la matriz de correlación de los datos preprocesados y la guarda en output_dir como .npz
+    (estadísticos incluidos, para actualizarla al agregar velas) y, con plot, como mapa de calor .png.
+
+    input_file puede ser una lista de series: en ese caso se correlacionan los retornos de Close entre ellas.
+    """
+    try:
+        if isinstance(input_file, str):
+            name = os.path.basename(os.path.normpath(input_file)).replace('.csv', '')
+        else:
+            name = f"universe_{len(input_file)}"
         os.makedirs(output_dir, exist_ok=True)
-        output_file = os.path.join(output_dir, f"correlation_matrix_{os.path.basename(input_file).replace('.csv', '')}.png")
-        plt.savefig(output_file)
-        plt.close()
-        print(f"Matriz de correlación guardada en {output_file}")
+        corr = correlation_matrix(input_file, os.path.join(output_dir, f"correlation_matrix_{name}.npz"),
+                                  incremental=incremental)
+
+        if plot:
+            output_file = os.path.join(output_dir, f"correlation_matrix_{name}.png")
+            _plot_heatmap(corr, output_file)
+            print(f"Matriz de correlación guardada en {output_file}")
+        return corr
 
     except Exception as e:
         print(f"Error al generar la matriz de correlación para {input_file}: {e}")
+
 if __name__ == "__main__":
     script_dir = os.path.dirname(os.path.abspath(__file__))
     data_dir = os.path.join(script_dir, r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data\preprocesed_normalizada")
@@ -36,4 +287,4 @@ if __name__ == "__main__":
     # Cambia el nombre del archivo según sea necesario
     input_file = os.path.join(data_dir, "BAP_1d.csv")
 
-    plot_correlation_matrix(input_file, output_dir)
\ No newline at end of file
+    plot_correlation_matrix(input_file, output_dir)
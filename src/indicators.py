@@ -0,0 +1,191 @@
+import pandas as pd
+import numpy as np
+from scipy.signal import lfilter
+
+BASE_FEATURES = ["Open", "High", "Low", "Volume"]
+
+# Orden de las columnas de features que usan los entrenadores (Close_lag_ y SMA_ primero, como antes)
+FEATURE_PREFIXES = ("Close_lag_", "SMA_", "EMA_", "RSI_", "MACD_", "BB_", "ATR_", "Volume_z_")
+
+DEFAULT_INDICATORS = {
+    'sma': [5, 20],
+    'ema': [12, 26],
+    'rsi': [14],
+    'macd': [(12, 26, 9)],
+    'bollinger': [(20, 2.0)],
+    'atr': [14],
+    'volume_z': [20],
+}
+
+
+def select_features(columns):
+    """
+    Features de entrenamiento: Open/High/Low/Volume más las columnas de indicadores, agrupadas por prefijo.
+    Con solo Close_lag_* y SMA_* da la misma selección que antes.
+    """
+    return BASE_FEATURES + [col for prefix in FEATURE_PREFIXES for col in columns if col.startswith(prefix)]
+
+
+def _window_sums(x, window, block=4096):
+    """
+    Sumas móviles de d y d² (d = x centrado) con sumas acumuladas: O(n) sin importar la ventana.
+
+    La suma acumulada se hace por bloques (cada uno con las window - 1 filas previas) y centrada en el primer
+    valor del bloque: así el error de restar dos sumas grandes no crece con el largo de la serie.
+
+    Returns:
+        tuple: (referencia, suma de d, suma de d²) de cada ventana completa, en el orden de la serie.
+    """
+    rows = len(x)
+    block = max(block, window)
+    starts = np.arange(window - 1, rows, block)
+    index = (starts - window + 1)[:, None] + np.arange(block + window - 1)[None, :]
+    segments = x[np.minimum(index, rows - 1)]
+    ref = segments[:, :1]
+    d = segments - ref
+    zeros = np.zeros((len(starts), 1))
+    csum = np.cumsum(np.concatenate((zeros, d), axis=1), axis=1)
+    csum_sq = np.cumsum(np.concatenate((zeros, d * d), axis=1), axis=1)
+    size = rows - window + 1
+    ref = np.broadcast_to(ref, (len(starts), block)).ravel()[:size]
+    sums = (csum[:, window:] - csum[:, :-window]).ravel()[:size]
+    sums_sq = (csum_sq[:, window:] - csum_sq[:, :-window]).ravel()[:size]
+    return ref, sums, sums_sq
+
+
+def rolling_mean(x, window):
+    """
+    Media móvil de una ventana completa (NaN en las primeras window - 1 filas), en O(n) sin importar la ventana.
+    """
+    out = np.full(len(x), np.nan)
+    if len(x) < window:
+        return out
+    ref, sums, _ = _window_sums(x, window)
+    out[window - 1:] = sums / window + ref
+    return out
+
+
+def _rolling_std(x, window):
+    """
+    Desviación estándar móvil (ddof=0) a partir de las sumas móviles de d y d².
+    """
+    out = np.full(len(x), np.nan)
+    if len(x) < window:
+        return out
+    _, sums, sums_sq = _window_sums(x, window)
+    mean = sums / window
+    out[window - 1:] = np.sqrt(np.maximum(sums_sq / window - mean * mean, 0.0))
+    return out
+
+
+def _ewm(x, alpha):
+    """
+    Media exponencial recursiva y[t] = alpha * x[t] + (1 - alpha) * y[t-1], con y[0] = x[0]
+    (igual a pandas ewm(adjust=False)), como filtro IIR de un polo.
+    """
+    if len(x) == 0:
+        return np.array([], dtype=float)
+    y, _ = lfilter([alpha], [1.0, alpha - 1.0], x, zi=[(1.0 - alpha) * x[0]])
+    return y
+
+
+def _rsi(close, window):
+    """
+    RSI de Wilder: medias exponenciales (alpha = 1/window) de subidas y bajadas.
+    """
+    out = np.full(len(close), np.nan)
+    if len(close) < 2:
+        return out
+    change = np.diff(close)
+    gain = _ewm(np.maximum(change, 0.0), 1.0 / window)
+    loss = _ewm(np.maximum(-change, 0.0), 1.0 / window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100.0 - 100.0 / (1.0 + gain / loss)
+    # Sin bajadas el RSI es 100; sin movimiento, neutro
+    rsi[(loss == 0) & (gain > 0)] = 100.0
+    rsi[(loss == 0) & (gain == 0)] = 50.0
+    out[1:] = rsi
+    return out
+
+
+def compute_indicators(data, n=None, indicators=None):
+    """
+    Calcula los features de ventana en una sola pasada sobre arreglos contiguos de NumPy.
+
+    Las medias móviles y desviaciones usan sumas acumuladas y las exponenciales (EMA, RSI, MACD, ATR)
+    un filtro recursivo, así que el costo no depende del tamaño de las ventanas.
+
+    Args:
+        data (DataFrame): Velas con Close/High/Low/Volume.
+        n (int): Si se indica, agrega Close_lag_1..n y SMA_n (los features de siempre).
+        indicators (dict): Indicadores y ventanas, ej. {'sma': [5, 20], 'ema': [12], 'rsi': [14],
+            'macd': [(12, 26, 9)], 'bollinger': [(20, 2.0)], 'atr': [14], 'volume_z': [20]}.
+            Ver DEFAULT_INDICATORS.
+
+    Returns:
+        DataFrame: Un feature por columna, con el mismo índice que data.
+    """
+    indicators = indicators or {}
+    close = np.ascontiguousarray(data['Close'].to_numpy(dtype=np.float64))
+    rows = len(close)
+    features = {}
+
+    if n:
+        for i in range(1, n + 1):
+            lagged = np.full(rows, np.nan)
+            lagged[i:] = close[:rows - i]
+            features[f'Close_lag_{i}'] = lagged
+
+    sma_windows = list(indicators.get('sma', []))
+    if n and n not in sma_windows:
+        sma_windows.insert(0, n)
+    for window in sma_windows:
+        features[f'SMA_{window}'] = rolling_mean(close, window)
+
+    emas = {}
+    for window in indicators.get('ema', []):
+        emas[window] = _ewm(close, 2.0 / (window + 1))
+        features[f'EMA_{window}'] = emas[window]
+
+    for window in indicators.get('rsi', []):
+        features[f'RSI_{window}'] = _rsi(close, window)
+
+    for fast, slow, signal in indicators.get('macd', []):
+        # Las EMA ya calculadas se reutilizan
+        fast_ema = emas.get(fast)
+        fast_ema = _ewm(close, 2.0 / (fast + 1)) if fast_ema is None else fast_ema
+        slow_ema = emas.get(slow)
+        slow_ema = _ewm(close, 2.0 / (slow + 1)) if slow_ema is None else slow_ema
+        macd = fast_ema - slow_ema
+        macd_signal = _ewm(macd, 2.0 / (signal + 1))
+        features[f'MACD_{fast}_{slow}'] = macd
+        features[f'MACD_signal_{fast}_{slow}_{signal}'] = macd_signal
+        features[f'MACD_hist_{fast}_{slow}_{signal}'] = macd - macd_signal
+
+    for window, k in indicators.get('bollinger', []):
+        mid = features.get(f'SMA_{window}')
+        mid = rolling_mean(close, window) if mid is None else mid
+        std = _rolling_std(close, window)
+        features[f'BB_upper_{window}'] = mid + k * std
+        features[f'BB_lower_{window}'] = mid - k * std
+        with np.errstate(divide='ignore', invalid='ignore'):
+            features[f'BB_width_{window}'] = 2 * k * std / mid
+
+    if indicators.get('atr'):
+        high = np.ascontiguousarray(data['High'].to_numpy(dtype=np.float64))
+        low = np.ascontiguousarray(data['Low'].to_numpy(dtype=np.float64))
+        prev_close = np.concatenate(([np.nan], close[:-1]))
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+        for window in indicators['atr']:
+            features[f'ATR_{window}'] = _ewm(true_range, 1.0 / window)
+
+    if indicators.get('volume_z'):
+        volume = np.ascontiguousarray(data['Volume'].to_numpy(dtype=np.float64))
+        for window in indicators['volume_z']:
+            std = _rolling_std(volume, window)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                z = (volume - rolling_mean(volume, window)) / std
+            z[std == 0] = 0.0
+            features[f'Volume_z_{window}'] = z
+
+    return pd.DataFrame(features, index=data.index)
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import inspect
+import threading
+import functools
+import contextlib
+import cProfile
+import tracemalloc
+import contextvars
+from datetime import datetime
+
+# Variables de entorno: así los procesos hijos (pipeline) heredan la configuración
+METRICS_ENV = "PROYECTOIA_METRICS_FILE"
+PROFILE_ENV = "PROYECTOIA_PROFILE_DIR"
+MEMORY_ENV = "PROYECTOIA_TRACE_MEMORY"
+
+_config = {
+    'metrics_file': os.environ.get(METRICS_ENV) or None,
+    'profile_dir': os.environ.get(PROFILE_ENV) or None,
+    'memory': os.environ.get(MEMORY_ENV) == "1",
+}
+_write_lock = threading.Lock()
+_current = contextvars.ContextVar("instrumentation_stage", default=None)
+# Errores atrapados por las etapas (ver capture_errors); funciona aunque la instrumentación esté desactivada
+_errors = contextvars.ContextVar("instrumentation_errors", default=None)
+# cProfile no admite dos perfiles activos a la vez: solo se perfila la etapa más externa
+_profiling = threading.local()
+
+
+def configure(metrics_file=None, profile_dir=None, memory=False):
+    """
+    Activa (o desactiva, con metrics_file=None) la instrumentación del proceso y de sus procesos hijos.
+
+    Args:
+        metrics_file (str): Archivo JSON-lines donde se agrega una línea por etapa ejecutada.
+        profile_dir (str): Si se indica, se guarda un volcado de cProfile (.prof) por etapa.
+        memory (bool): Medir el pico de memoria de cada etapa con tracemalloc (más lento).
+    """
+    _config.update(metrics_file=metrics_file, profile_dir=profile_dir, memory=bool(memory))
+    for name, value in ((METRICS_ENV, metrics_file), (PROFILE_ENV, profile_dir), (MEMORY_ENV, "1" if memory else None)):
+        if value:
+            os.environ[name] = str(value)
+        else:
+            os.environ.pop(name, None)
+
+
+def enabled():
+    return _config['metrics_file'] is not None
+
+
+def record(**fields):
+    """
+    Agrega campos (filas, features, métricas...) a la etapa en curso. Sin instrumentación no hace nada.
+    """
+    current = _current.get()
+    if current is not None:
+        current.fields.update(fields)
+
+
+def record_error(error):
+    """
+    Marca la etapa en curso como fallida. Se llama desde los except que atrapan la excepción
+    para que el fallo quede registrado aunque la función no la propague.
+    """
+    message = f"{type(error).__name__}: {error}"
+    current = _current.get()
+    if current is not None:
+        current.fields['status'] = 'error'
+        current.fields['error'] = message
+    errors = _errors.get()
+    if errors is not None:
+        errors.append(message)
+
+
+@contextlib.contextmanager
+def capture_errors():
+    """
+    Junta en una lista los errores marcados con record_error dentro del bloque. Sirve para saber si una etapa
+    falló aunque haya atrapado la excepción (ej. los nodos del pipeline).
+    """
+    errors = []
+    token = _errors.set(errors)
+    try:
+        yield errors
+    finally:
+        _errors.reset(token)
+
+
+def _emit(entry):
+    line = json.dumps(entry, default=str) + "\n"
+    with _write_lock:
+        with open(_config['metrics_file'], 'a') as f:
+            f.write(line)
+
+
+class _Stage:
+    def __init__(self, name, series=None, **labels):
+        self.fields = {'stage': name, 'series': series, **labels, 'status': 'ok'}
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self._trace_memory = _config['memory'] and not tracemalloc.is_tracing()
+        if self._trace_memory:
+            tracemalloc.start()
+        self._profiler = None
+        if _config['profile_dir'] is not None and not getattr(_profiling, 'active', False):
+            _profiling.active = True
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._started_at = datetime.now()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._started
+        if self._profiler is not None:
+            self._profiler.disable()
+            _profiling.active = False
+        if exc is not None:
+            record_error(exc)
+        entry = {'started_at': self._started_at.isoformat(), 'seconds': round(seconds, 6), 'pid': os.getpid(), **self.fields}
+        if self._trace_memory:
+            entry['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 3)
+            tracemalloc.stop()
+        if self._profiler is not None:
+            os.makedirs(_config['profile_dir'], exist_ok=True)
+            file_name = f"{entry['stage']}_{entry['series'] or 'all'}_{self._started_at:%Y%m%d_%H%M%S_%f}.prof"
+            entry['profile'] = os.path.join(_config['profile_dir'], file_name)
+            self._profiler.dump_stats(entry['profile'])
+        _current.reset(self._token)
+        _emit(entry)
+        return False
+
+
+class _NullStage:
+    fields = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, series=None, **labels):
+    """
+    Context manager que mide una etapa: tiempo, estado, campos de record() y, según la configuración,
+    pico de memoria y perfil de cProfile. Sin instrumentación devuelve un objeto vacío.
+    """
+    if _config['metrics_file'] is None:
+        return _NULL_STAGE
+    return _Stage(name, series, **labels)
+
+
+def _series_label(value):
+    return os.path.basename(os.path.normpath(str(value))).replace('.csv', '')
+
+
+def instrument(name, series=None, result=None):
+    """
+    Decorador: ejecuta la función dentro de stage(name). series es el nombre del argumento que identifica
+    la serie (ej. 'input_file') o una función que recibe los argumentos y devuelve la etiqueta.
+    Con result, el valor devuelto se registra en ese campo (ej. result='rows').
+    Sin instrumentación el costo es una sola consulta al diccionario de configuración.
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _config['metrics_file'] is None:
+                return function(*args, **kwargs)
+            label = None
+            if series is not None:
+                bound = signature.bind_partial(*args, **kwargs)
+                bound.apply_defaults()
+                label = series(bound.arguments) if callable(series) else _series_label(bound.arguments.get(series))
+            with _Stage(name, label) as current:
+                value = function(*args, **kwargs)
+                if result is not None:
+                    current.fields[result] = value
+                return value
+        return wrapper
+    return decorator
+
+
+def read_metrics(metrics_file):
+    """
+    Lee el archivo de métricas como DataFrame (una fila por etapa ejecutada).
+    """
+    import pandas as pd
+    return pd.read_json(metrics_file, lines=True)
@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from feature_store import store_path
+
+
+def _hash_path(path):
+    """
+    Hash del contenido de un archivo o de todos los archivos de un directorio (series del almacén).
+    """
+    h = hashlib.sha256()
+    if os.path.isdir(path):
+        files = sorted(os.path.join(root, f) for root, _, names in os.walk(path) for f in names)
+    else:
+        files = [path]
+    for file_path in files:
+        h.update(os.path.relpath(file_path, path).encode())
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    return h.hexdigest()
+
+
+def _node(name, kind, kwargs, deps=(), inputs=(), outputs=()):
+    return {'name': name, 'kind': kind, 'kwargs': kwargs, 'deps': list(deps), 'inputs': list(inputs), 'outputs': list(outputs)}
+
+
+def build_pipeline(tickers, intervals, data_dir, results_dir, rf_dir, start_dates=None, n=4, search='halving',
+                   store_dir=None, source=None, extract=True, indicators=None):
+    """
+    Construye el DAG extract -> preprocess -> train/search -> artifact para cada ticker × intervalo.
+
+    Args:
+        tickers (list): Tickers a procesar (ej. ['BAP']).
+        intervals (list): Intervalos (ej. ['1d', '1wk', '1mo']).
+        data_dir (str): Directorio de los CSV crudos; los preprocesados van a sus subcarpetas habituales.
+        results_dir (str): Resultados de find_best_parameters.
+        rf_dir (str): Resultados de train_and_save_model (parámetros fijos).
+        start_dates (dict): Fecha de inicio por intervalo para la primera extracción.
+        n (int): Número de lags / ventana de la SMA.
+        search (str): 'grid' o 'halving' para find_best_parameters.
+        store_dir (str): Si se indica, los datos crudos y los features van al almacén binario.
+        source: Fuente de datos del extractor (por defecto Yahoo Finance).
+        extract (bool): Si es False no se descargan datos y se parte de los que ya existen.
+        indicators (dict): Indicadores técnicos adicionales del preprocesamiento (ver indicators.py).
+
+    Returns:
+        dict: Nodos por nombre.
+    """
+    start_dates = start_dates or {}
+    scaled_dir = os.path.join(data_dir, "preprocesed_normalizada")
+    descaled_dir = os.path.join(data_dir, "preprocessed")
+    nodes = {}
+    for ticker in tickers:
+        for interval in intervals:
+            name = f"{ticker}_{interval}"
+            raw = store_path(store_dir, 'raw', name) if store_dir else os.path.join(data_dir, f"{name}.csv")
+            scaled = store_path(store_dir, 'features', name) if store_dir else os.path.join(scaled_dir, f"{name}.csv")
+
+            deps = []
+            if extract:
+                nodes[f"extract:{name}"] = _node(f"extract:{name}", 'extract', {
+                    'ticker': ticker, 'start_date': start_dates.get(interval), 'interval': interval,
+                    'output_dir': data_dir, 'source': source, 'incremental': True, 'store_dir': store_dir,
+                }, outputs=[raw])
+                deps = [f"extract:{name}"]
+
+            nodes[f"preprocess:{name}"] = _node(f"preprocess:{name}", 'preprocess', {
+                'input_file': raw, 'scaled_dir': scaled_dir, 'descaled_dir': descaled_dir, 'n': n,
+                'incremental': True, 'store_dir': store_dir, 'indicators': indicators,
+            }, deps=deps, inputs=[raw], outputs=[scaled])
+
+            nodes[f"train:{name}"] = _node(f"train:{name}", 'train', {
+                'input_file': scaled, 'results_dir': rf_dir, 'store': os.path.join(rf_dir, "experiments.sqlite"),
+            }, deps=[f"preprocess:{name}"], inputs=[scaled], outputs=[os.path.join(rf_dir, f"model_{name}.joblib")])
+
+            nodes[f"search:{name}"] = _node(f"search:{name}", 'search', {
+                'input_file': scaled, 'results_dir': results_dir, 'search': search,
+                'store': os.path.join(results_dir, "experiments.sqlite"),
+            }, deps=[f"preprocess:{name}"], inputs=[scaled], outputs=[os.path.join(results_dir, f"best_model_{name}.joblib")])
+
+            models = nodes[f"train:{name}"]['outputs'] + nodes[f"search:{name}"]['outputs']
+            nodes[f"artifact:{name}"] = _node(f"artifact:{name}", 'artifact', {
+                'name': name, 'models': models, 'manifest_dir': results_dir,
+            }, deps=[f"train:{name}", f"search:{name}"], inputs=models,
+                outputs=[os.path.join(results_dir, f"artifacts_{name}.json")])
+    return nodes
+
+
+def _write_manifest(name, models, manifest_dir):
+    """
+    Exporta cada modelo al formato plano de forest_export y registra los artefactos finales de la serie
+    (ruta, hash y bosque exportado) en artifacts_{name}.json.
+    """
+    from forest_export import export_artifact
+    manifest = {
+        'series': name,
+        'created_at': datetime.now().isoformat(),
+        'models': [{'path': path, 'sha256': _hash_path(path), 'forest': export_artifact(path)}
+                   for path in models if os.path.exists(path)],
+    }
+    os.makedirs(manifest_dir, exist_ok=True)
+    with open(os.path.join(manifest_dir, f"artifacts_{name}.json"), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def _run_node(kind, kwargs):
+    """
+    Ejecuta un nodo en el proceso hijo y devuelve su duración (sin contar el tiempo en cola) y los errores
+    que la etapa atrapó y registró con record_error. Los imports van aquí para que cada proceso cargue solo lo que usa.
+    """
+    from instrumentation import capture_errors
+    started = time.perf_counter()
+    with capture_errors() as errors:
+        if kind == 'extract':
+            from data_extractor import extract_data
+            extract_data(**kwargs)
+        elif kind == 'preprocess':
+            from data_preprocessor import preprocess_data
+            preprocess_data(**kwargs)
+        elif kind == 'train':
+            from ramdomF1 import train_and_save_model
+            train_and_save_model(**kwargs)
+        elif kind == 'search':
+            from ramdom_forestR import find_best_parameters
+            find_best_parameters(**kwargs)
+        elif kind == 'artifact':
+            _write_manifest(**kwargs)
+        else:
+            raise ValueError(f"Tipo de nodo desconocido: {kind}")
+    return time.perf_counter() - started, errors
+
+
+def _signature(node):
+    """
+    Firma del nodo: parámetros + hash del contenido de sus entradas. Si no cambia, el nodo se salta.
+    """
+    h = hashlib.sha256(json.dumps([node['kind'], node['kwargs']], sort_keys=True, default=str).encode())
+    for path in node['inputs']:
+        h.update(_hash_path(path).encode() if os.path.exists(path) else b'missing')
+    return h.hexdigest()
+
+
+def run_pipeline(nodes, state_file, max_workers=None, metrics_file=None):
+    """
+    Ejecuta el DAG en un pool de procesos. Los nodos independientes corren en paralelo y los nodos
+    cuyas entradas no cambiaron desde la última corrida exitosa se saltan.
+
+    El pool se dimensiona con los núcleos de la máquina y los nodos de búsqueda reciben n_jobs = núcleos // procesos,
+    para no multiplicar los hilos de GridSearchCV(n_jobs=-1) por el número de procesos.
+
+    Args:
+        nodes (dict): Nodos de build_pipeline.
+        state_file (str): JSON con las firmas de la última corrida exitosa de cada nodo.
+        max_workers (int): Procesos simultáneos. Por defecto, el ancho del DAG acotado por los núcleos.
+        metrics_file (str): Si se indica, se guardan los tiempos por nodo en formato JSON.
+
+    Returns:
+        list: Un dict por nodo con name, status ('ok', 'skipped', 'failed', 'blocked') y seconds.
+
+    Raises:
+        ValueError: Si un nodo depende de otro que no está en nodes (nunca podría ejecutarse).
+    """
+    for name, node in nodes.items():
+        missing = [dep for dep in node['deps'] if dep not in nodes]
+        if missing:
+            raise ValueError(f"El nodo {name} depende de nodos que no están en el pipeline: {', '.join(missing)}")
+
+    cpus = os.cpu_count() or 1
+    width = max(1, sum(1 for node in nodes.values() if node['kind'] in ('train', 'search')))
+    max_workers = max_workers or max(1, min(cpus, width))
+    inner_jobs = max(1, cpus // max_workers)
+
+    state = {}
+    if os.path.exists(state_file):
+        with open(state_file) as f:
+            state = json.load(f)
+
+    pending = dict(nodes)
+    status = {}
+    timings = []
+    running = {}
+
+    def finish(name, node_status, seconds, signature=None, error=None):
+        status[name] = node_status
+        timings.append({'name': name, 'status': node_status, 'seconds': round(seconds, 4)})
+        if error is not None:
+            timings[-1]['error'] = error
+        # La firma solo se guarda si la etapa terminó bien; si falló, se reintenta en la siguiente corrida
+        if node_status == 'ok' and signature is not None:
+            state[name] = signature
+        elif node_status == 'failed':
+            state.pop(name, None)
+        print(f"[{node_status}] {name} ({seconds:.2f}s)" + (f": {error}" if error else ""))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            finished = len(status)
+            for name in list(pending):
+                node = pending[name]
+                if any(status.get(dep) in ('failed', 'blocked') for dep in node['deps']):
+                    del pending[name]
+                    finish(name, 'blocked', 0.0)
+                    continue
+                if not all(status.get(dep) in ('ok', 'skipped') for dep in node['deps']):
+                    continue
+                del pending[name]
+
+                # La extracción depende de la fuente remota, así que siempre se ejecuta
+                signature = _signature(node) if node['kind'] != 'extract' else None
+                if signature is not None and state.get(name) == signature and all(os.path.exists(p) for p in node['outputs']):
+                    finish(name, 'skipped', 0.0)
+                    continue
+
+                kwargs = dict(node['kwargs'])
+                if node['kind'] == 'search':
+                    kwargs['n_jobs'] = inner_jobs
+                running[executor.submit(_run_node, node['kind'], kwargs)] = (name, signature)
+
+            if not running:
+                if len(status) == finished:
+                    # Nada en ejecución ni listo (ej. dependencias circulares): no hay cómo avanzar
+                    for name in list(pending):
+                        del pending[name]
+                        finish(name, 'blocked', 0.0, error="Dependencias que nunca terminan")
+                    break
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, signature = running.pop(future)
+                if future.exception() is not None:
+                    finish(name, 'failed', 0.0, error=f"{type(future.exception()).__name__}: {future.exception()}")
+                    continue
+                # Las etapas atrapan sus propias excepciones: el fallo se detecta por los errores que registraron
+                # (una salida vieja de una corrida anterior no cuenta como éxito) y por las salidas faltantes
+                seconds, errors = future.result()
+                if errors:
+                    finish(name, 'failed', seconds, error="; ".join(errors))
+                elif not all(os.path.exists(p) for p in nodes[name]['outputs']):
+                    finish(name, 'failed', seconds, error="No se generaron todas las salidas")
+                else:
+                    finish(name, 'ok', seconds, signature)
+
+    os.makedirs(os.path.dirname(os.path.abspath(state_file)), exist_ok=True)
+    with open(state_file, 'w') as f:
+        json.dump(state, f, indent=2)
+    if metrics_file is not None:
+        with open(metrics_file, 'w') as f:
+            json.dump(timings, f, indent=2)
+    return timings
+
+
+if __name__ == "__main__":
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_dir = os.path.join(script_dir, r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA")
+    data_dir = os.path.join(base_dir, "data")
+
+    # Métricas por etapa y serie (los procesos del pool heredan la configuración)
+    from instrumentation import configure
+    configure(metrics_file=os.path.join(base_dir, "results", "stage_metrics.jsonl"))
+
+    nodes = build_pipeline(
+        ["BAP"], ["1d", "1wk", "1mo"], data_dir,
+        results_dir=os.path.join(base_dir, "results"),
+        rf_dir=os.path.join(base_dir, "results_rf_fijos"),
+        start_dates={'1d': '2020-01-30', '1wk': '2010-12-01', '1mo': '1996-01-01'},
+    )
+    run_pipeline(nodes, state_file=os.path.join(data_dir, "pipeline_state.json"),
+                 metrics_file=os.path.join(base_dir, "results", "pipeline_timings.json"))
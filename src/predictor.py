@@ -1,36 +1,175 @@
 import pandas as pd
 from joblib import load
 import os
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from feature_store import list_columns, read_frame
+from forest_export import is_forest, load_forest
+from indicators import select_features
+from instrumentation import instrument, record
 
-# 1. Carga el modelo entrenado
-model_path = r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\results\best_model_BAP_1d.joblib"
-model = load(model_path)
+DEFAULT_FEATURES = ["Open", "High", "Low", "Volume"]
 
-# 2. Carga tus datos preprocesados NO normalizados (escala real)
-data_path = r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data\preprocesed_normalizada\BAP_1d.csv"
-data = pd.read_csv(data_path, index_col=0, parse_dates=True)
 
-# 3. Selecciona la última fila para predecir el siguiente día
-X_cols = ["Open", "High", "Low", "Volume"] + \
-    [col for col in data.columns if col.startswith("Close_lag_")] + \
-    [col for col in data.columns if col.startswith("SMA_")]
+class ModelCache:
+    """
+    Caché LRU de modelos cargados, con clave (ruta, mtime): si el artefacto se reescribe se vuelve a cargar.
+    Acepta tanto artefactos .joblib como bosques exportados con forest_export (directorios .forest).
+    """
 
-last_row = data[X_cols].iloc[[-1]]
+    def __init__(self, max_models=8):
+        self.max_models = max_models
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
 
-# 4. Predice el precio del siguiente día
-pred_next_day = model.predict(last_row)[0]
+    def get(self, model_path):
+        path = os.path.abspath(str(model_path))
+        key = (path, os.path.getmtime(path))
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
 
-# 5. Obtén el precio actual real (último valor de 'Close')
-last_close = data["Close"].iloc[-1]
-last_fecha = data.index[-1]
+        model = load_forest(path) if is_forest(path) else load(path)
 
-# 6. Ajuste empírico: suma una fracción del cambio último real (puedes ajustar el "factor" para calibrar)
-# Ejemplo: usar la diferencia real entre el último y el penúltimo cierre
-last_close_prev = data["Close"].iloc[-2]
-ajuste = 0.5 * (last_close - last_close_prev)   # Usa 0.5 como ejemplo, puedes probar 1, 0.3, etc.
-pred_next_day_ajustada = pred_next_day + ajuste
+        with self._lock:
+            # Descartar versiones anteriores del mismo artefacto
+            for old_key in [k for k in self._models if k[0] == path]:
+                del self._models[old_key]
+            self._models[key] = model
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+        return model
 
-print(f"Fecha actual: {last_fecha}")
-print(f"Precio de cierre actual: {last_close:.4f}")
-print(f"Predicción base para el siguiente día: {pred_next_day:.4f}")
-print(f"Predicción AJUSTADA para el siguiente día: {pred_next_day_ajustada:.4f}")
+
+_default_cache = ModelCache()
+
+
+def load_model(model_path):
+    """
+    Devuelve el modelo desde la caché compartida del proceso.
+    """
+    return _default_cache.get(model_path)
+
+
+def feature_columns(model, columns=None):
+    """
+    Features que espera el modelo; si no las guardó, se usa la selección por prefijo de los entrenadores.
+    """
+    if hasattr(model, 'feature_names_in_'):
+        return list(model.feature_names_in_)
+    return select_features(columns or [])
+
+
+class PredictionService:
+    """
+    Servicio de predicción reutilizable: mantiene los modelos en caché y agrupa las filas por modelo
+    para hacer una sola llamada a predict por artefacto.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or _default_cache
+
+    @instrument("predict")
+    def predict(self, requests, ajuste=None):
+        """
+        Predice un lote de filas de features, posiblemente de distintos tickers/intervalos.
+
+        Args:
+            requests (list): dicts con 'model' (ruta del artefacto) y 'features' (dict columna -> valor).
+                Opcionalmente 'last_close' y 'prev_close' para el ajuste, y cualquier otra clave
+                (ej. 'ticker', 'interval'), que se devuelve tal cual.
+            ajuste (float): Si se indica, suma ajuste * (last_close - prev_close) a la predicción.
+
+        Returns:
+            list: Un dict por request con 'prediction' y, si corresponde, 'prediction_ajustada'.
+        """
+        results = [None] * len(requests)
+        by_model = {}
+        for i, request in enumerate(requests):
+            by_model.setdefault(request['model'], []).append(i)
+
+        record(rows=len(requests), models=len(by_model))
+        for model_path, positions in by_model.items():
+            model = self.cache.get(model_path)
+            rows = pd.DataFrame([requests[i]['features'] for i in positions])
+            predictions = model.predict(rows[feature_columns(model, list(rows.columns))])
+            for i, prediction in zip(positions, predictions):
+                request = requests[i]
+                result = {k: v for k, v in request.items() if k not in ('features', 'model')}
+                result['prediction'] = float(prediction)
+                if ajuste is not None and request.get('last_close') is not None and request.get('prev_close') is not None:
+                    result['prediction_ajustada'] = float(prediction + ajuste * (request['last_close'] - request['prev_close']))
+                results[i] = result
+        return results
+
+    def latest_request(self, data_path, model_path, **extra):
+        """
+        Construye el request para predecir la siguiente vela a partir de la última fila de los datos.
+        """
+        model = self.cache.get(model_path)
+        X_cols = feature_columns(model, list_columns(data_path))
+        data = read_frame(data_path, columns=list(dict.fromkeys(X_cols + ["Close"])))
+        request = {
+            'model': model_path,
+            'features': data[X_cols].iloc[-1].to_dict(),
+            'date': str(data.index[-1]),
+            'last_close': float(data["Close"].iloc[-1]),
+            'prev_close': float(data["Close"].iloc[-2]),
+        }
+        request.update(extra)
+        return request
+
+
+def serve(service=None, host='127.0.0.1', port=8000):
+    """
+    Expone el servicio por HTTP local: POST /predict con {"requests": [...], "ajuste": 0.5}.
+    Cada conexión se atiende en un hilo y todos comparten la misma caché de modelos.
+    """
+    service = service or PredictionService()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/predict':
+                self.send_error(404)
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                payload = {'predictions': service.predict(body['requests'], body.get('ajuste'))}
+                status = 200
+            except Exception as e:
+                payload = {'error': str(e)}
+                status = 400
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Servicio de predicción escuchando en http://{host}:{server.server_address[1]}/predict")
+    return server
+
+
+if __name__ == '__main__':
+    # 1. Modelo entrenado y datos preprocesados
+    model_path = r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\results\best_model_BAP_1d.joblib"
+    data_path = r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data\preprocesed_normalizada\BAP_1d.csv"
+
+    # 2. Predice el precio del siguiente día a partir de la última fila
+    service = PredictionService()
+    request = service.latest_request(data_path, model_path)
+
+    # 3. Ajuste empírico: suma una fracción del cambio último real (puedes ajustar el "factor" para calibrar)
+    result = service.predict([request], ajuste=0.5)[0]   # Usa 0.5 como ejemplo, puedes probar 1, 0.3, etc.
+
+    print(f"Fecha actual: {request['date']}")
+    print(f"Precio de cierre actual: {request['last_close']:.4f}")
+    print(f"Predicción base para el siguiente día: {result['prediction']:.4f}")
+    print(f"Predicción AJUSTADA para el siguiente día: {result['prediction_ajustada']:.4f}")
@@ -1,50 +1,87 @@
 import pandas as pd
-from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import r2_score, mean_squared_error
 import os
 import json
-from joblib import dump
+import math
+import numpy as np
+from joblib import dump, load
+from feature_store import list_columns, read_training_data
+from indicators import select_features
+from experiment_store import hash_data, open_store
+from instrumentation import instrument, record, record_error
 
-def train_and_save_model(input_file, results_dir):
+FIXED_PARAMS = {
+    'n_estimators': 50,
+    'max_depth': 20,
+    'min_samples_split': 5,
+    'min_samples_leaf': 2,
+    'max_features': 'sqrt',
+    'random_state': 42
+}
+
+def _save_atomic(model, model_file):
+    """
+    Escribe el modelo en un temporal y lo reemplaza de una vez: quien lo esté leyendo (predictor, alertas)
+    ve siempre el artefacto anterior completo o el nuevo.
+    """
+    tmp_file = model_file + ".tmp"
+    dump(model, tmp_file)
+    os.replace(tmp_file, model_file)
+
+
+def _score(model, X, y):
+    if len(y) == 0:
+        return {'R2': None, 'MSE': None}
+    y_pred = model.predict(X)
+    return {'R2': r2_score(y, y_pred) if len(y) > 1 else None, 'MSE': mean_squared_error(y, y_pred)}
+
+
+@instrument("train", series="input_file")
+def train_and_save_model(input_file, results_dir, store=None, low_memory=False):
     """
     Carga los datos preprocesados, entrena un modelo Random Forest con parámetros fijos y guarda los resultados en un CSV.
+
+    Con store (registro SQLite de experimentos), si los datos, las features y los parámetros no cambiaron
+    y el modelo guardado es el de la corrida anterior, se reutilizan sus métricas sin reentrenar.
+
+    low_memory: las features se leen como float32 contiguo (ver feature_store.read_training_data).
     """
     try:
-        data = pd.read_csv(input_file, index_col=0, parse_dates=True)
-
-        # Selección automática de features
-        feature_cols = ["Open", "High", "Low", "Volume"]
-        lag_cols = [col for col in data.columns if col.startswith("Close_lag_")]
-        sma_cols = [col for col in data.columns if col.startswith("SMA_")]
-        features = feature_cols + lag_cols + sma_cols
+        # Selección automática de features (solo se leen las columnas necesarias)
+        features = select_features(list_columns(input_file))
 
         target = "Close"
-        X = data[features]
-        y = data[target]
+        X, y = read_training_data(input_file, features, target, low_memory=low_memory)
+        record(rows=len(X), features=len(features))
 
-        # Separar los datos (sin mezclar temporalidad)
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, shuffle=False
-        )
+        # Separar los datos (sin mezclar temporalidad). Mismo corte que train_test_split(test_size=0.2, shuffle=False),
+        # pero con vistas en lugar de copias
+        train_size = len(X) - math.ceil(0.2 * len(X))
+        X_train, X_test = X.iloc[:train_size], X.iloc[train_size:]
+        y_train, y_test = y.iloc[:train_size], y.iloc[train_size:]
 
         # Parámetros fijos
-        fixed_params = {
-            'n_estimators': 50,
-            'max_depth': 20,
-            'min_samples_split': 5,
-            'min_samples_leaf': 2,
-            'max_features': 'sqrt',
-            'random_state': 42
-        }
+        fixed_params = dict(FIXED_PARAMS)
 
-        rf = RandomForestRegressor(**fixed_params)
-        rf.fit(X_train, y_train)
+        model_file = os.path.join(results_dir, f"model_{os.path.basename(input_file).replace('.csv','')}.joblib")
+        store = open_store(store)
+        data_hash = hash_data(X, y) if store is not None else None
+        cached = store.get(data_hash, features, fixed_params, "holdout_0.2") if store is not None else None
 
-        y_pred = rf.predict(X_test)
-        r2 = r2_score(y_test, y_pred)
-        mse = mean_squared_error(y_test, y_pred)
+        rf = None
+        if cached is not None and os.path.exists(model_file) and os.path.getmtime(model_file) == cached['artifact_mtime']:
+            r2, mse = cached['R2'], cached['MSE']
+            print(f"Modelo sin cambios, se reutiliza {model_file}")
+        else:
+            rf = RandomForestRegressor(**fixed_params)
+            rf.fit(X_train, y_train)
 
+            y_pred = rf.predict(X_test)
+            r2 = r2_score(y_test, y_pred)
+            mse = mean_squared_error(y_test, y_pred)
+
+        record(R2=r2, MSE=mse, retrained=rf is not None)
         print("Parámetros usados:", fixed_params)
         print(f"R2 en el conjunto de prueba: {r2:.4f}")
         print(f"MSE en el conjunto de prueba: {mse:.6f}")
@@ -64,13 +101,152 @@ def train_and_save_model(input_file, results_dir):
         results_df.to_csv(result_file, index=False)
         print(f"Resultados guardados en {result_file}")
 
-        # Guardar el modelo entrenado
-        model_file = os.path.join(results_dir, f"model_{os.path.basename(input_file).replace('.csv','')}.joblib")
-        dump(rf, model_file)
-        print(f"Modelo guardado en {model_file}")
+        # Guardar el modelo entrenado (solo si se reentrenó)
+        if rf is not None:
+            _save_atomic(rf, model_file)
+            print(f"Modelo guardado en {model_file}")
+            if store is not None:
+                store.put(data_hash, features, fixed_params, "holdout_0.2",
+                          {'R2': r2, 'MSE': mse, 'artifact_mtime': os.path.getmtime(model_file)})
+        if store is not None:
+            store.log_run("train", input_file, data_hash, fixed_params, result_dict, model_file)
 
     except Exception as e:
         print(f"Error al entrenar y guardar el modelo para {input_file}: {e}")
+        record_error(e)
+
+def _seen_hash(X, y):
+    """
+    Hash de las filas con las que se entrenó el modelo, sin la última (la vela en curso puede actualizarse).
+    """
+    return hash_data(X.iloc[:-1], y.iloc[:-1])
+
+
+@instrument("train_incremental", series="input_file")
+def update_model(input_file, results_dir, new_trees=10, window=500, max_trees=None, full_refit_every=None, store=None,
+                 low_memory=False):
+    """
+    Actualiza el modelo de parámetros fijos con las velas nuevas en lugar de reentrenarlo desde cero.
+
+    Con warm_start se agregan new_trees árboles entrenados sobre las últimas window filas. Antes de agregarlos,
+    el modelo se evalúa sobre las filas nuevas (que todavía no vio), así las métricas son siempre fuera de muestra.
+    Cada full_refit_every actualizaciones se hace un reentrenamiento completo con las filas anteriores a las
+    nuevas, se registran sus métricas sobre las mismas filas nuevas para compararlas con el modelo incremental,
+    y el bosque completo pasa a ser la base.
+
+    El estado (fecha hasta la que se entrenó, árboles por actualización, historial de métricas) se guarda en
+    model_{ticker}_{intervalo}.incremental.json. Si no existe, la primera llamada hace un ajuste completo
+    (y avisa si reemplaza un modelo de train_and_save_model, que usa el mismo archivo).
+    También se guarda el hash de las filas ya vistas (sin la última, que el extractor puede reemplazar): si cambian,
+    por ejemplo porque preprocess_data reescaló todo el histórico al aparecer un nuevo mínimo o máximo, los árboles
+    viejos ya no sirven para la escala nueva y se hace un ajuste completo.
+
+    Args:
+        input_file (str): CSV preprocesado o serie del almacén.
+        results_dir (str): Carpeta del modelo (la misma de train_and_save_model).
+        new_trees (int): Árboles que se agregan por actualización.
+        window (int): Filas más recientes con las que se entrenan los árboles nuevos.
+        max_trees (int): Si se indica, se retiran los árboles más viejos para no superar este tamaño.
+        full_refit_every (int): Cada cuántas actualizaciones se hace un reentrenamiento completo.
+        store (str o ExperimentStore): Registro de experimentos donde se guarda cada actualización.
+        low_memory (bool): Leer las features como float32 contiguo.
+
+    Returns:
+        dict: Métricas de la actualización (o None si hubo un error).
+    """
+    try:
+        features = select_features(list_columns(input_file))
+        target = "Close"
+        X, y = read_training_data(input_file, features, target, low_memory=low_memory)
+        record(rows=len(X), features=len(features))
+
+        name = os.path.basename(os.path.normpath(input_file)).replace('.csv', '')
+        model_file = os.path.join(results_dir, f"model_{name}.joblib")
+        state_file = os.path.join(results_dir, f"model_{name}.incremental.json")
+        state = None
+        if os.path.exists(state_file) and os.path.exists(model_file):
+            with open(state_file) as f:
+                state = json.load(f)
+
+        os.makedirs(results_dir, exist_ok=True)
+        new_start = None
+        if state is not None and state['features'] == features:
+            new_start = int(np.searchsorted(X.index, pd.Timestamp(state['trained_until']), side='right'))
+            if state.get('seen_hash') != _seen_hash(X.iloc[:new_start], y.iloc[:new_start]):
+                print(f"Las filas ya vistas por el modelo de {name} cambiaron (reescalado); se reentrena completo.")
+                new_start = None
+
+        if new_start is None:
+            if state is None and os.path.exists(model_file):
+                print(f"{model_file} no fue entrenado con update_model; se reemplaza por un ajuste completo.")
+            # Sin estado previo, con otras features o con el histórico cambiado no se sabe qué vio el modelo: ajuste completo
+            rf = RandomForestRegressor(**FIXED_PARAMS)
+            rf.fit(X, y)
+            state = {'features': features, 'trained_until': str(X.index[-1]), 'updates': 0,
+                     'updates_since_full': 0, 'tree_until': [str(X.index[-1])] * len(rf.estimators_), 'history': []}
+            result = {'date': state['trained_until'], 'mode': 'full', 'new_rows': len(X), 'n_trees': len(rf.estimators_)}
+        else:
+            rf = load(model_file)
+            if new_start >= len(X):
+                print(f"Sin velas nuevas para {name}; el modelo no cambia.")
+                return None
+            X_new, y_new = X.iloc[new_start:], y.iloc[new_start:]
+            result = {'date': str(X.index[-1]), 'mode': 'incremental', 'new_rows': len(y_new),
+                      'incremental': _score(rf, X_new, y_new)}
+
+            state['updates'] += 1
+            state['updates_since_full'] += 1
+            if full_refit_every is not None and state['updates_since_full'] >= full_refit_every:
+                # Reentrenamiento completo con lo anterior a las filas nuevas: se compara sobre las mismas filas
+                rf = RandomForestRegressor(**FIXED_PARAMS)
+                rf.fit(X.iloc[:new_start], y.iloc[:new_start])
+                result['mode'] = 'full_refit'
+                result['full_refit'] = _score(rf, X_new, y_new)
+                state['tree_until'] = [state['trained_until']] * len(rf.estimators_)
+                state['updates_since_full'] = 0
+
+            # Árboles nuevos sobre la ventana reciente; la semilla cambia en cada actualización
+            start = max(0, len(X) - window)
+            rf.set_params(warm_start=True, n_estimators=len(rf.estimators_) + new_trees,
+                          random_state=FIXED_PARAMS['random_state'] + state['updates'])
+            rf.fit(X.iloc[start:], y.iloc[start:])
+            state['tree_until'] += [str(X.index[-1])] * new_trees
+
+            if max_trees is not None and len(rf.estimators_) > max_trees:
+                # Retirar los árboles más viejos (los primeros de la lista)
+                retired = len(rf.estimators_) - max_trees
+                rf.estimators_ = rf.estimators_[retired:]
+                rf.n_estimators = len(rf.estimators_)
+                state['tree_until'] = state['tree_until'][retired:]
+                result['retired_trees'] = retired
+            rf.set_params(warm_start=False)
+            state['trained_until'] = str(X.index[-1])
+            result['n_trees'] = len(rf.estimators_)
+
+        _save_atomic(rf, model_file)
+        state['seen_hash'] = _seen_hash(X, y)
+        state['history'].append(result)
+        tmp_file = state_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_file, state_file)
+
+        record(**{k: v for k, v in result.items() if k != 'date'})
+        print(f"Modelo {result['mode']} guardado en {model_file} ({result['n_trees']} árboles)")
+        if 'incremental' in result:
+            print(f"Filas nuevas: {result['new_rows']} - métricas del modelo anterior sobre ellas: {result['incremental']}")
+        if 'full_refit' in result:
+            print(f"Reentrenamiento completo sobre las mismas filas: {result['full_refit']}")
+
+        store = open_store(store)
+        if store is not None:
+            store.log_run("train_incremental", input_file, hash_data(X, y), FIXED_PARAMS, result, model_file)
+        return result
+
+    except Exception as e:
+        print(f"Error al actualizar el modelo para {input_file}: {e}")
+        record_error(e)
+        return None
 
 if __name__ == "__main__":
     preprocessed_data_dir = r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data\preprocesed_normalizada"
@@ -83,6 +259,6 @@ if __name__ == "__main__":
     for interval in ["1d", "1wk", "1mo"]:
         input_file = os.path.join(absolute_preprocessed_data_dir, f"BAP_{interval}.csv")
         if os.path.exists(input_file):
-            train_and_save_model(input_file, absolute_results_dir)
+            train_and_save_model(input_file, absolute_results_dir, store=os.path.join(absolute_results_dir, "experiments.sqlite"))
         else:
             print(f"El archivo {input_file} no existe.")
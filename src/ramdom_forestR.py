@@ -1,29 +1,113 @@
 import pandas as pd
-from sklearn.model_selection import TimeSeriesSplit, GridSearchCV
+from sklearn.model_selection import TimeSeriesSplit, GridSearchCV, ParameterGrid
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import r2_score, mean_squared_error
 import numpy as np
 import os
 import json
-from joblib import dump
+from joblib import Parallel, delayed
+from feature_store import list_columns, read_training_data
+from indicators import select_features
+from experiment_store import hash_data, open_store
+from instrumentation import instrument, record, record_error
+from ramdomF1 import _save_atomic
+
+def _grow_and_score(forest, params, n_estimators, X_train, y_train, X_test, y_test):
+    """
+    Agrega árboles al bosque (warm_start) hasta n_estimators y devuelve el bosque y su R² en el fold.
+    Con el mismo random_state, el bosque crecido es idéntico a uno entrenado desde cero con ese tamaño.
+    """
+    if forest is None:
+        forest = RandomForestRegressor(**params, n_estimators=n_estimators, warm_start=True, random_state=42)
+    else:
+        forest.set_params(n_estimators=n_estimators)
+    forest.fit(X_train, y_train)
+    return forest, r2_score(y_test, forest.predict(X_test))
+
+
+def _score_cells(tasks, forests, configs, size, folds, n_jobs, store=None, data_hash=None, cv_name=None):
+    """
+    Evalúa las celdas (configuración, fold) con size árboles. Las que ya están en el registro de
+    experimentos se toman de ahí sin entrenar; el resto se entrena en paralelo y se guarda.
+    """
+    scores = {}
+    pending = []
+    for c, f in tasks:
+        params = {**configs[c], 'n_estimators': size}
+        cached = store.get(data_hash, folds[f][0].columns, params, f"{cv_name}#{f}") if store is not None else None
+        if cached is not None:
+            scores[(c, f)] = cached['R2']
+        else:
+            pending.append((c, f))
+
+    # Los árboles se construyen sin el GIL, así que los hilos comparten los bosques sin copiarlos
+    outputs = Parallel(n_jobs=n_jobs, prefer="threads")(
+        delayed(_grow_and_score)(forests.get(task), configs[task[0]], size, *folds[task[1]]) for task in pending
+    )
+    for (c, f), (forest, score) in zip(pending, outputs):
+        forests[(c, f)] = forest
+        scores[(c, f)] = score
+        if store is not None:
+            store.put(data_hash, folds[f][0].columns, {**configs[c], 'n_estimators': size}, f"{cv_name}#{f}", {'R2': score})
+    return scores
+
 
-def find_best_parameters(input_file, results_dir):
+def halving_search(X, y, param_grid, cv, eta=3, n_jobs=-1, store=None):
+    """
+    Búsqueda por successive halving sobre n_estimators: todas las configuraciones empiezan con el
+    bosque más pequeño, se conserva la mejor 1/eta parte y los bosques sobrevivientes crecen
+    (warm_start) hasta el siguiente tamaño, reutilizando los árboles ya entrenados.
+    Con eta=1 no se descarta nada y equivale a la búsqueda exhaustiva.
+
+    Returns:
+        tuple: (mejores parámetros, R² por fold de los mejores parámetros, lista de resultados por candidato).
+    """
+    sizes = sorted(param_grid['n_estimators'])
+    configs = list(ParameterGrid({k: v for k, v in param_grid.items() if k != 'n_estimators'}))
+    folds = [(X.iloc[train], y.iloc[train], X.iloc[test], y.iloc[test]) for train, test in cv.split(X)]
+    data_hash = hash_data(X, y) if store is not None else None
+
+    forests = {}
+    results = []
+    alive = list(range(len(configs)))
+    for rung, size in enumerate(sizes):
+        tasks = [(c, f) for c in alive for f in range(len(folds))]
+        scores = _score_cells(tasks, forests, configs, size, folds, n_jobs, store, data_hash, repr(cv))
+        fold_scores = {c: [scores[(c, f)] for f in range(len(folds))] for c in alive}
+        for c in alive:
+            results.append({'params': {**configs[c], 'n_estimators': size}, 'scores': np.array(fold_scores[c])})
+
+        if rung < len(sizes) - 1:
+            keep = max(1, int(np.ceil(len(alive) / eta)))
+            alive = sorted(alive, key=lambda c: -np.mean(fold_scores[c]))[:keep]
+            forests = {key: forest for key, forest in forests.items() if key[0] in alive}
+
+    best = max(results, key=lambda result: result['scores'].mean())
+    return dict(sorted(best['params'].items())), best['scores'], results
+
+
+@instrument("search", series="input_file")
+def find_best_parameters(input_file, results_dir, search="grid", n_jobs=-1, store=None, low_memory=False):
     """
     Carga los datos preprocesados, busca los mejores parámetros y guarda los resultados en un CSV usando validación cruzada temporal.
     Imprime los R² de cada fold para el mejor modelo.
+
+    search='halving' reemplaza el GridSearchCV exhaustivo por halving_search, que evalúa los mismos
+    folds pero descarta configuraciones malas antes de entrenar los bosques grandes.
+
+    store (str o ExperimentStore): registro SQLite de experimentos. Las celdas (datos, features, parámetros,
+    fold) ya evaluadas no se vuelven a entrenar, y si el modelo final ya existe para los mismos datos
+    y parámetros tampoco se reentrena.
+
+    low_memory: las features se leen como float32 contiguo (ver feature_store.read_training_data).
     """
     try:
-        data = pd.read_csv(input_file, index_col=0, parse_dates=True)
-
-        # Selección automática de features
-        feature_cols = ["Open", "High", "Low", "Volume"]
-        lag_cols = [col for col in data.columns if col.startswith("Close_lag_")]
-        sma_cols = [col for col in data.columns if col.startswith("SMA_")]
-        features = feature_cols + lag_cols + sma_cols
+        # Selección automática de features (solo se leen las columnas necesarias)
+        features = select_features(list_columns(input_file))
 
         target = "Close"
-        X = data[features]
-        y = data[target]
+        X, y = read_training_data(input_file, features, target, low_memory=low_memory)
+        record(rows=len(X), features=len(features), search=search)
 
         # División temporal: 80% entrenamiento, 20% prueba
         train_size = int(0.8 * len(X))
@@ -41,34 +125,52 @@ def find_best_parameters(input_file, results_dir):
             'max_features': ['sqrt']  # Usa 'sqrt' para regresión
         }
 
-        rf = RandomForestRegressor(random_state=42)
-        grid_search = GridSearchCV(estimator=rf, param_grid=param_grid, cv=tscv, n_jobs=-1, verbose=0, scoring='r2')
-        grid_search.fit(X_train, y_train)
+        store = open_store(store)
+        best_model = None
+        if search == "halving" or store is not None:
+            # Con registro de experimentos la búsqueda exhaustiva se hace por celdas (eta=1)
+            eta = 3 if search == "halving" else 1
+            best_params, split_test_scores, _ = halving_search(X_train, y_train, param_grid, tscv, eta=eta, n_jobs=n_jobs, store=store)
+        else:
+            rf = RandomForestRegressor(random_state=42)
+            grid_search = GridSearchCV(estimator=rf, param_grid=param_grid, cv=tscv, n_jobs=n_jobs, verbose=0, scoring='r2')
+            grid_search.fit(X_train, y_train)
+
+            best_params = grid_search.best_params_
+            best_model = grid_search.best_estimator_
 
-        best_params = grid_search.best_params_
+            # Extraer los R2 de cada split (fold) para el mejor modelo
+            best_index = grid_search.best_index_
+            split_test_scores = []
+            # cv_results_['split0_test_score'], etc., son arrays con la score para cada split y cada combinación de params
+            for i in range(tscv.get_n_splits()):
+                split_test_scores.append(grid_search.cv_results_[f'split{i}_test_score'][best_index])
 
-        # Extraer los R2 de cada split (fold) para el mejor modelo
-        best_index = grid_search.best_index_
-        split_test_scores = []
-        # cv_results_['split0_test_score'], etc., son arrays con la score para cada split y cada combinación de params
-        for i in range(tscv.get_n_splits()):
-            split_test_scores.append(grid_search.cv_results_[f'split{i}_test_score'][best_index])
-        
         split_test_scores = np.array(split_test_scores)
         promedio_r2 = split_test_scores.mean()
         std_r2 = split_test_scores.std()
-        
+
         print("\nResultados de Validación Cruzada (TimeSeriesSplit):")
         for i, score in enumerate(split_test_scores):
             print(f"Fold {i+1} - R²: {score:.4f}")
         print(f"Promedio R²: {promedio_r2:.3f} ± {std_r2:.3f}\n")
 
         # Evaluar el modelo en el conjunto de prueba (20% más reciente)
-        best_model = grid_search.best_estimator_
-        y_pred = best_model.predict(X_test)
-        r2 = r2_score(y_test, y_pred)
-        mse = mean_squared_error(y_test, y_pred)
-
+        model_file = os.path.join(results_dir, f"best_model_{os.path.basename(input_file).replace('.csv','')}.joblib")
+        data_hash = hash_data(X, y) if store is not None else None
+        cached = store.get(data_hash, features, best_params, "holdout_0.8") if store is not None else None
+        if cached is not None and os.path.exists(model_file) and os.path.getmtime(model_file) == cached['artifact_mtime']:
+            r2, mse = cached['R2'], cached['MSE']
+            print(f"Modelo sin cambios, se reutiliza {model_file}")
+        else:
+            if best_model is None:
+                best_model = RandomForestRegressor(**best_params, random_state=42)
+                best_model.fit(X_train, y_train)
+            y_pred = best_model.predict(X_test)
+            r2 = r2_score(y_test, y_pred)
+            mse = mean_squared_error(y_test, y_pred)
+
+        record(best_params=best_params, R2_test=r2, MSE_test=mse, R2_mean_cv=promedio_r2)
         print("Mejores parámetros encontrados:", best_params)
         print(f"R2 en el conjunto de prueba: {r2:.4f}")
         print(f"MSE en el conjunto de prueba: {mse:.6f}")
@@ -92,13 +194,19 @@ def find_best_parameters(input_file, results_dir):
         results_df.to_csv(result_file, index=False)
         print(f"Resultados guardados en {result_file}")
 
-        # Guardar el modelo entrenado
-        model_file = os.path.join(results_dir, f"best_model_{os.path.basename(input_file).replace('.csv','')}.joblib")
-        dump(best_model, model_file)
-        print(f"Modelo guardado en {model_file}")
+        # Guardar el modelo entrenado (solo si se reentrenó)
+        if best_model is not None:
+            _save_atomic(best_model, model_file)
+            print(f"Modelo guardado en {model_file}")
+            if store is not None:
+                store.put(data_hash, features, best_params, "holdout_0.8",
+                          {'R2': r2, 'MSE': mse, 'artifact_mtime': os.path.getmtime(model_file)})
+        if store is not None:
+            store.log_run("search", input_file, data_hash, best_params, result_dict, model_file)
 
     except Exception as e:
         print(f"Error al buscar los mejores parámetros para {input_file}: {e}")
+        record_error(e)
 
 if __name__ == "__main__":
     preprocessed_data_dir = r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data\preprocesed_normalizada"
@@ -110,6 +218,6 @@ if __name__ == "__main__":
     for interval in ["1d", "1wk", "1mo"]:
         input_file = os.path.join(absolute_preprocessed_data_dir, f"BAP_{interval}.csv")
         if os.path.exists(input_file):
-            find_best_parameters(input_file, absolute_results_dir)
+            find_best_parameters(input_file, absolute_results_dir, store=os.path.join(absolute_results_dir, "experiments.sqlite"))
         else:
             print(f"El archivo {input_file} no existe.")
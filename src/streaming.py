@@ -0,0 +1,380 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import time
+import heapq
+import asyncio
+from collections import deque
+from feature_store import is_store, read_frame
+from predictor import ModelCache, feature_columns
+from data_extractor import ReplaySource
+from data_preprocessor import FEATURES_TO_SCALE, load_scaler
+from alert_system import _change_alerts
+from forest_export import FlatForest
+
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def _parse_bar(bar):
+    bar = dict(bar)
+    bar['date'] = pd.Timestamp(bar['date'])
+    return bar
+
+
+async def replay_source(data_dir, tickers, interval='1d', start=None, end=None, delay=0.0):
+    """
+    Fuente asíncrona que reproduce los CSV de yfinance ({ticker}_{interval}.csv) como un flujo de velas,
+    intercalando los tickers por fecha.
+
+    Args:
+        delay (float): Segundos de espera entre fechas distintas (0 reproduce lo más rápido posible).
+
+    Yields:
+        dict: Vela con ticker, interval, date, Open, High, Low, Close y Volume.
+    """
+    source = ReplaySource(data_dir)
+
+    def bars(ticker):
+        data = source.fetch(ticker, start=start, end=end, interval=interval)
+        for date, row in zip(data.index, data[BAR_COLUMNS].itertuples(index=False)):
+            yield date, ticker, row
+
+    last_date = None
+    for count, (date, ticker, row) in enumerate(heapq.merge(*(bars(t) for t in tickers), key=lambda item: item[0])):
+        if delay and last_date is not None and date != last_date:
+            await asyncio.sleep(delay)
+        elif count % 1000 == 0:
+            # Cede el control para que el consumidor procese mientras se lee
+            await asyncio.sleep(0)
+        last_date = date
+        yield {'ticker': ticker, 'interval': interval, 'date': date, **row._asdict()}
+
+
+async def socket_source(host, port):
+    """
+    Fuente asíncrona que lee velas como líneas JSON desde un socket TCP (ver serve_bars).
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.strip():
+                yield _parse_bar(json.loads(line))
+    finally:
+        writer.close()
+
+
+async def serve_bars(bars, host='127.0.0.1', port=0):
+    """
+    Servidor TCP de prueba: envía a cada cliente las velas de bars (iterable asíncrono o lista) como líneas JSON
+    y cierra la conexión. Devuelve el asyncio.Server (el puerto real está en server.sockets[0]).
+    """
+    async def handle(reader, writer):
+        if hasattr(bars, '__aiter__'):
+            async for bar in bars:
+                writer.write((json.dumps(bar, default=str) + "\n").encode())
+                await writer.drain()
+        else:
+            for bar in bars:
+                writer.write((json.dumps(bar, default=str) + "\n").encode())
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+class SeriesState:
+    """
+    Estado de una serie en el flujo: solo los últimos n + 1 cierres y las dos últimas predicciones (O(ventana)).
+    La última vela se puede reemplazar (vela intradía en formación) reenviándola con la misma fecha.
+    """
+
+    def __init__(self, name, model_path, features, n, closes=(), last_date=None, scaler=None):
+        self.name = name
+        self.model_path = model_path
+        self.features = features
+        self.n = n
+        self.closes = deque(closes, maxlen=n + 1)
+        self.predictions = deque(maxlen=2)
+        self.last_date = last_date
+        self.scaler = scaler
+
+    def feature_row(self, bar):
+        """
+        Features de la vela en el orden del modelo, o None si la vela es vieja o falta historia
+        (en ese caso la vela solo se agrega a la ventana). Devuelve también el cierre anterior
+        (para el cambio real) y si la vela reemplaza a la última.
+        """
+        replaces = self.last_date is not None and bar['date'] == self.last_date
+        if self.last_date is not None and bar['date'] < self.last_date:
+            return None
+        previous = list(self.closes)[:-1] if replaces else list(self.closes)
+        if len(previous) < self.n:
+            self.update(bar, None, replaces)
+            return None
+
+        values = {column: float(bar[column]) for column in BAR_COLUMNS}
+        # Lags y SMA igual que _add_window_features (la SMA suma en el mismo orden)
+        sma = values['Close']
+        for i in range(1, self.n + 1):
+            values[f'Close_lag_{i}'] = previous[-i]
+            if i < self.n:
+                sma = sma + previous[-i]
+        values[f'SMA_{self.n}'] = sma / self.n
+        if self.scaler is not None:
+            scale, minimum = self.scaler
+            for j, column in enumerate(FEATURES_TO_SCALE):
+                values[column] = values[column] * scale[j] + minimum[j]
+        return [values[feature] for feature in self.features], previous[-1], replaces
+
+    def update(self, bar, prediction, replaces):
+        if replaces:
+            self.closes.pop()
+            if self.predictions:
+                self.predictions.pop()
+        self.closes.append(float(bar['Close']))
+        self.predictions.append(prediction)
+        self.last_date = bar['date']
+
+
+class StreamingAlerts:
+    """
+    Modo streaming de alert_system: actualiza los features de cada serie con cada vela nueva, predice con el
+    modelo en caché y aplica el mismo umbral de cambio real y predicho que evaluate_alerts.
+
+    Las velas se agrupan en micro-lotes: dentro de un lote se hace una sola llamada a predict por modelo.
+    Para miles de tickers conviene usar bosques exportados (forest_export), cuyo predict por lote es mucho
+    más barato que el de sklearn.
+    """
+
+    def __init__(self, threshold=0.03, batch_size=2048, max_delay=0.002, cache=None, on_alert=None, max_queue=None):
+        """
+        Args:
+            threshold (float): Porcentaje de cambio para considerar una alerta (e.g., 0.03 para 3%).
+            batch_size (int): Máximo de velas por micro-lote.
+            max_delay (float): Segundos que se espera a que lleguen más velas antes de procesar un lote incompleto.
+            cache (ModelCache): Caché de modelos. Por defecto una propia con espacio para todas las series;
+                una caché recibida no se modifica (si es chica se avisa, los modelos se recargarán).
+            on_alert (callable): Se llama con cada registro de alerta. Si es None, las alertas se imprimen.
+            max_queue (int): Velas que pueden esperar en cola (por defecto dos por serie, hasta batch_size). Con la
+                cola llena la lectura espera, así una fuente más rápida que el procesamiento no acumula latencia.
+        """
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.cache = cache
+        self._own_cache = cache is None
+        self.on_alert = on_alert
+        self.series = {}
+        self.latencies = deque(maxlen=100_000)
+        self.bars_processed = 0
+
+    def add_series(self, ticker, interval, model_path, data_file=None, scaled=False, warm_start=True):
+        """
+        Registra una serie. Con data_file (CSV preprocesado o serie del almacén) la ventana arranca con los
+        últimos cierres ya procesados, así la primera vela del flujo ya tiene features completos.
+
+        Args:
+            warm_start (bool): Tomar la ventana inicial de data_file. Con False se arma con las primeras velas
+                del flujo (útil al reproducir un histórico desde el principio).
+            scaled (bool): El modelo espera Open/High/Low/Volume normalizados (como predictor.py). El rango del
+                escalador se toma del estado del preprocesamiento o de los metadatos del almacén.
+                Con False se usan valores desescalados, igual que evaluate_alerts.
+        """
+        name = f"{ticker}_{interval}"
+        if self.cache is None:
+            self.cache = ModelCache(max_models=1024)
+        if len(self.series) >= self.cache.max_models:
+            if self._own_cache:
+                self.cache.max_models = 2 * len(self.series)
+            elif len(self.series) == self.cache.max_models:
+                print(f"La caché de modelos tiene espacio para {self.cache.max_models} modelos y hay más series; "
+                      f"los modelos se volverán a cargar en cada lote.")
+        model = self.cache.get(model_path)
+        features = feature_columns(model)
+        n = sum(1 for feature in features if feature.startswith("Close_lag_"))
+        unsupported = [f for f in features if f not in BAR_COLUMNS and not f.startswith("Close_lag_") and f != f"SMA_{n}"]
+        if n == 0 or unsupported:
+            raise ValueError(f"El modelo de {name} usa features que el modo streaming no calcula: {unsupported or 'sin lags'}")
+
+        scaler = None
+        if scaled:
+            fitted = load_scaler(data_file)
+            if fitted is None:
+                raise ValueError(f"No se encontró el rango del escalador de {data_file} (¿se preprocesó?)")
+            scaler = (fitted.scale_.tolist(), fitted.min_.tolist())
+
+        closes, last_date = (), None
+        if data_file is not None and warm_start:
+            if scaled and not is_store(data_file):
+                # En el CSV normalizado view no aplica y Close está escalado: la ventana se arma con los lags
+                # (que no se escalan) y el Close desescalado de la última fila
+                lags = [f"Close_lag_{i}" for i in range(n, 0, -1)]
+                last = read_frame(data_file, columns=lags + ["Close"]).iloc[-1]
+                scale, minimum = scaler
+                closes = [float(last[lag]) for lag in lags] + [(float(last["Close"]) - minimum[0]) / scale[0]]
+                last_date = last.name
+            else:
+                history = read_frame(data_file, columns=["Close"], view="descaled").iloc[-(n + 1):]
+                closes, last_date = history["Close"].tolist(), history.index[-1]
+
+        self.series[name] = SeriesState(name, model_path, features, n, closes, last_date, scaler)
+        return self.series[name]
+
+    def process(self, bars):
+        """
+        Procesa un lote de velas y devuelve las alertas generadas.
+
+        Las velas de una misma serie se procesan en orden (en rondas sucesivas); en cada ronda se hace
+        una llamada a predict por modelo con todas las series que lo usan.
+        """
+        alerts = []
+        rounds = []
+        seen = {}
+        for bar in bars:
+            name = f"{bar['ticker']}_{bar['interval']}"
+            if name not in self.series:
+                continue
+            position = seen.get(name, 0)
+            seen[name] = position + 1
+            if position == len(rounds):
+                rounds.append([])
+            rounds[position].append((self.series[name], bar))
+
+        for round_bars in rounds:
+            by_model = {}
+            for state, bar in round_bars:
+                row = state.feature_row(bar)
+                if row is not None:
+                    by_model.setdefault(state.model_path, []).append((state, bar, row))
+
+            for model_path, items in by_model.items():
+                model = self.cache.get(model_path)
+                X = np.array([row[0] for _, _, row in items], dtype=np.float64)
+                if not isinstance(model, FlatForest):
+                    # sklearn espera las columnas con nombre si se entrenó con un DataFrame
+                    X = pd.DataFrame(X, columns=items[0][0].features)
+                predictions = model.predict(X)
+
+                for (state, bar, (_, prev_close, replaces)), prediction in zip(items, predictions):
+                    prediction = float(prediction)
+                    prev_prediction = None
+                    if len(state.predictions) == 2 or (len(state.predictions) == 1 and not replaces):
+                        prev_prediction = state.predictions[-2] if replaces else state.predictions[-1]
+                    state.update(bar, prediction, replaces)
+
+                    real_change = bar['Close'] / prev_close - 1 if prev_close else np.nan
+                    predicted_change = prediction / prev_prediction - 1 if prev_prediction else np.nan
+                    # El umbral se revisa antes de armar el registro (la mayoría de las velas no alertan)
+                    if abs(real_change) > self.threshold:
+                        alerts += _change_alerts(state.name, pd.DatetimeIndex([bar['date']]), np.array([real_change]),
+                                                 self.threshold, "real")
+                    if abs(predicted_change) > self.threshold:
+                        alerts += _change_alerts(state.name, pd.DatetimeIndex([bar['date']]), np.array([predicted_change]),
+                                                 self.threshold, "prediccion")
+        self.bars_processed += len(bars)
+        return alerts
+
+    async def run(self, source):
+        """
+        Consume una fuente asíncrona de velas hasta que se agota y devuelve todas las alertas.
+
+        La lectura corre en una tarea aparte: mientras se procesa un lote, las velas que llegan se acumulan
+        y forman el siguiente, así el tamaño del lote se adapta a la carga. Cada lote lleva a lo sumo una vela
+        por serie (una llamada a predict por modelo) y la cola tiene un máximo de max_queue velas: con la cola
+        llena la lectura espera, así la latencia por vela queda acotada a unos pocos lotes aunque la fuente sea
+        más rápida que el procesamiento. Si la fuente falla, se procesan las velas ya recibidas y se propaga
+        su excepción.
+        """
+        queue = asyncio.Queue(maxsize=self.max_queue or min(self.batch_size, 2 * max(len(self.series), 1)))
+        done = object()
+
+        async def read():
+            try:
+                async for bar in source:
+                    await queue.put((time.perf_counter(), bar))
+            except Exception as e:
+                await queue.put((None, e))
+            else:
+                await queue.put((None, done))
+
+        reader = asyncio.create_task(read())
+        all_alerts = []
+        finished = False
+        carry = None
+        try:
+            while not finished:
+                item = carry if carry is not None else await queue.get()
+                carry = None
+                batch = [item]
+                names = {f"{item[1]['ticker']}_{item[1]['interval']}"} if item[0] is not None else set()
+                deadline = time.perf_counter() + self.max_delay
+                while len(batch) < self.batch_size and batch[-1][0] is not None:
+                    if queue.empty():
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            break
+                        try:
+                            item = await asyncio.wait_for(queue.get(), remaining)
+                        except asyncio.TimeoutError:
+                            break
+                    else:
+                        item = queue.get_nowait()
+                    if item[0] is not None:
+                        name = f"{item[1]['ticker']}_{item[1]['interval']}"
+                        if name in names:
+                            # Una vela por serie en cada lote (una sola ronda de predict): la siguiente de la
+                            # misma serie abre el próximo lote en lugar de alargar este
+                            carry = item
+                            break
+                        names.add(name)
+                    batch.append(item)
+                error = None
+                if batch[-1][0] is None:
+                    # Fin de la fuente: done o la excepción de la lectura
+                    finished = True
+                    _, end = batch.pop()
+                    error = None if end is done else end
+
+                alerts = self.process([bar for _, bar in batch])
+                now = time.perf_counter()
+                self.latencies.extend(now - received for received, _ in batch)
+                for alert in alerts:
+                    if self.on_alert is not None:
+                        self.on_alert(alert)
+                    else:
+                        print(f"[{alert['series']}] {alert['message']}")
+                all_alerts += alerts
+                if error is not None:
+                    raise error
+                # Cede el control para que el lector siga llenando la cola
+                await asyncio.sleep(0)
+        finally:
+            reader.cancel()
+        return all_alerts
+
+    def latency_stats(self):
+        """
+        Latencia por vela (desde que se recibe hasta que se evalúan sus alertas) en milisegundos.
+        """
+        if not self.latencies:
+            return {}
+        latencies = np.array(self.latencies) * 1000
+        return {'bars': self.bars_processed, 'p50_ms': float(np.percentile(latencies, 50)),
+                'p99_ms': float(np.percentile(latencies, 99)), 'max_ms': float(latencies.max())}
+
+
+if __name__ == '__main__':
+    # Reproduce los CSV crudos como si fueran un flujo en vivo y genera alertas vela a vela
+    data_dir = r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\data"
+    model_dir = r"C:\Users\PC\Desktop\EJERCICIOS_PROGRA\python\ProyectoIA\results_rf_fijos"
+
+    engine = StreamingAlerts(threshold=0.03)
+    engine.add_series("BAP", "1d", os.path.join(model_dir, "model_BAP_1d.joblib"),
+                      data_file=os.path.join(data_dir, "preprocesed_normalizada", "BAP_1d.csv"), scaled=True, warm_start=False)
+    asyncio.run(engine.run(replay_source(data_dir, ["BAP"], "1d")))
+    print(engine.latency_stats())
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Los módulos de src se importan entre sí con imports planos (from feature_store import ...)
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+sys.path.insert(0, os.path.abspath(SRC_DIR))
@@ -0,0 +1,72 @@
+import os
+import json
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from joblib import dump, load
+from conftest import DATA_DIR
+from alert_system import DEFAULT_FEATURES, evaluate_alerts
+from data_preprocessor import preprocess_data
+
+
+def _series(tmp_path):
+    preprocess_data(os.path.join(DATA_DIR, "BAP_1d.csv"), str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=4)
+    data_file = tmp_path / "descaled" / "descaled_BAP_1d.csv"
+    data = pd.read_csv(data_file, index_col=0, parse_dates=True)
+    model_file = str(tmp_path / "model.joblib")
+    dump(LinearRegression().fit(data[DEFAULT_FEATURES], data["Close"]), model_file)
+    return str(data_file), model_file, data
+
+
+def _iterrows_alerts(data, model, threshold):
+    """
+    El bucle original de generate_alerts (sin el filtro del día actual): una alerta por cambio que supera el umbral.
+    """
+    data = data.copy()
+    data["Predicted_Close"] = model.predict(data[DEFAULT_FEATURES])
+    data["Daily_Change"] = data["Close"].pct_change()
+    data["Predicted_Change"] = data["Predicted_Close"].pct_change()
+    alerts = []
+    for index, row in data.iterrows():
+        if pd.notna(row["Daily_Change"]) and abs(row["Daily_Change"]) > threshold:
+            alerts.append((index, "real", round(row["Daily_Change"], 12)))
+        if pd.notna(row["Predicted_Change"]) and abs(row["Predicted_Change"]) > threshold:
+            alerts.append((index, "prediccion", round(row["Predicted_Change"], 12)))
+    return sorted(alerts)
+
+
+def _keys(records):
+    return sorted((r["date"], r["kind"], round(r["change"], 12)) for r in records)
+
+
+def test_vectorized_alerts_match_iterrows_loop(tmp_path):
+    data_file, model_file, data = _series(tmp_path)
+    expected = _iterrows_alerts(data, load(model_file), 0.03)
+    records = evaluate_alerts([(data_file, model_file)], threshold=0.03)
+    assert len(expected) > 0
+    assert _keys(records) == expected
+
+
+def test_since_and_state_file(tmp_path):
+    data_file, model_file, data = _series(tmp_path)
+    full = evaluate_alerts([(data_file, model_file)])
+    cut = data.index[-200]
+    after = [r for r in full if r["date"] > cut]
+
+    assert _keys(evaluate_alerts([(data_file, model_file)], since={"BAP_1d": str(cut)})) == _keys(after)
+
+    # Modo programado: la primera corrida llega hasta cut, la segunda solo evalúa las velas nuevas
+    state_file = str(tmp_path / "alerts_state.json")
+    partial_file = str(tmp_path / "descaled_BAP_1d.csv")
+    data.loc[:cut].to_csv(partial_file)
+    first = evaluate_alerts([(partial_file, model_file)], state_file=state_file)
+    data.to_csv(partial_file)
+    second = evaluate_alerts([(partial_file, model_file)], state_file=state_file)
+    assert _keys(first) == _keys([r for r in full if r["date"] <= cut])
+    assert _keys(second) == _keys(after)
+    assert evaluate_alerts([(partial_file, model_file)], state_file=state_file) == []
+    with open(state_file) as f:
+        assert pd.Timestamp(json.load(f)["BAP_1d"]) == data.index[-1]
+
+    # Un since explícito tiene prioridad sobre el archivo de estado
+    again = evaluate_alerts([(partial_file, model_file)], since={"BAP_1d": str(cut)}, state_file=state_file)
+    assert _keys(again) == _keys(after)
@@ -0,0 +1,75 @@
+import os
+import numpy as np
+import pandas as pd
+import backtest
+from sklearn.ensemble import RandomForestRegressor
+from conftest import DATA_DIR
+from data_preprocessor import preprocess_data
+from experiment_store import ExperimentStore
+from feature_store import list_columns
+from indicators import select_features
+
+PARAMS = {'n_estimators': 10, 'max_depth': 8, 'random_state': 0}
+
+
+def _input_file(tmp_path, drop_last=0):
+    lines = open(os.path.join(DATA_DIR, "BAP_1wk.csv")).readlines()
+    os.makedirs(tmp_path, exist_ok=True)
+    raw_file = tmp_path / "BAP_1wk.csv"
+    raw_file.write_text("".join(lines[:len(lines) - drop_last]))
+    preprocess_data(str(raw_file), str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=4)
+    # Precios reales: las filas ya evaluadas no cambian si las velas nuevas mueven el rango del escalador
+    return str(tmp_path / "descaled" / "descaled_BAP_1wk.csv")
+
+
+def _count_fits(monkeypatch):
+    fits = []
+    fit_predict = backtest._fit_predict
+
+    def counting(*args):
+        fits.append(len(args[1]))
+        return fit_predict(*args)
+
+    monkeypatch.setattr(backtest, "_fit_predict", counting)
+    return fits
+
+
+def test_walk_forward_matches_refitting_each_step(tmp_path):
+    input_file = _input_file(tmp_path)
+    result, per_step, summary = backtest.walk_forward(input_file, PARAMS, retrain_every=50, window='sliding',
+                                                      window_size=200, min_train=300, n_jobs=1)
+    data = pd.read_csv(input_file, index_col=0, parse_dates=True)
+    features = select_features(list_columns(input_file))
+    X, y = data[features].to_numpy(dtype=np.float32), data["Close"].to_numpy()
+
+    expected = []
+    for split in range(300, len(data), 50):
+        model = RandomForestRegressor(**PARAMS).fit(X[split - 200:split], y[split - 200:split])
+        expected.append(model.predict(X[split:split + 50]))
+    np.testing.assert_array_equal(result['y_pred'].to_numpy(), np.concatenate(expected))
+    np.testing.assert_array_equal(result['y_true'].to_numpy(), y[300:])
+    assert summary['steps'] == len(per_step) == len(expected)
+    assert (per_step['train_rows'] == 200).all()
+
+
+def test_cached_rerun_is_identical_and_only_new_steps_are_fitted(tmp_path, monkeypatch):
+    fits = _count_fits(monkeypatch)
+    store = ExperimentStore(str(tmp_path / "experiments.sqlite"))
+    kwargs = dict(params=PARAMS, retrain_every=50, window='expanding', min_train=300, n_jobs=1, store=store)
+
+    # Primero sin las últimas 30 velas: al agregarlas solo se recalculan los pasos que cambian
+    backtest.walk_forward(_input_file(tmp_path / "partial", drop_last=30), **kwargs)
+    partial_fits = len(fits)
+    input_file = _input_file(tmp_path / "full")
+    result, per_step, summary = backtest.walk_forward(input_file, **kwargs)
+    assert 0 < len(fits) - partial_fits < len(per_step)
+
+    fits.clear()
+    cached = backtest.walk_forward(input_file, **kwargs)
+    assert fits == []
+    pd.testing.assert_frame_equal(cached[0], result)
+    pd.testing.assert_frame_equal(cached[1], per_step)
+    assert cached[2] == summary
+
+    uncached = backtest.walk_forward(input_file, **{**kwargs, 'store': None})
+    pd.testing.assert_frame_equal(uncached[0], result)
@@ -0,0 +1,26 @@
+import filecmp
+import numpy as np
+import pandas as pd
+from benchmark import generate_universe, write_synthetic_csv
+from data_extractor import ReplaySource
+
+
+def test_synthetic_csv_does_not_depend_on_chunk_size(tmp_path):
+    files = [write_synthetic_csv(str(tmp_path / f"SYN_{chunk}.csv"), "SYN", 5000, interval='1h', chunk_rows=chunk)
+             for chunk in (500_000, 1000, 37)]
+    assert filecmp.cmp(files[0], files[1], shallow=False)
+    assert filecmp.cmp(files[0], files[2], shallow=False)
+
+
+def test_universe_is_reproducible_and_readable(tmp_path):
+    first = generate_universe(str(tmp_path / "a"), 3, 400, seed=7)
+    second = generate_universe(str(tmp_path / "b"), 3, 400, seed=7)
+    assert all(filecmp.cmp(a, b, shallow=False) for a, b in zip(first, second))
+    assert not filecmp.cmp(first[0], first[1], shallow=False)
+
+    # Mismo formato que los CSV de yfinance: se leen con el lector de la extracción
+    data = ReplaySource(str(tmp_path / "a")).fetch("SYN0001", interval='1d')
+    assert len(data) == 400 and isinstance(data.index, pd.DatetimeIndex)
+    assert (data["High"] >= data[["Open", "Close"]].max(axis=1)).all()
+    assert (data["Low"] <= data[["Open", "Close"]].min(axis=1)).all()
+    assert np.issubdtype(data["Volume"].dtype, np.integer)
@@ -0,0 +1,82 @@
+import os
+import numpy as np
+import pandas as pd
+from conftest import DATA_DIR
+from data_preprocessor import preprocess_data
+from generar_matriz_correlacion import CorrelationStats, correlation_matrix, rolling_correlation
+
+
+def test_merged_stats_match_pandas_corr():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(500, 4)) @ rng.normal(size=(4, 4)) + 1e6
+    values[rng.random(values.shape) < 0.1] = np.nan
+    data = pd.DataFrame(values, columns=list("abcd"))
+
+    stats = CorrelationStats(data.columns)
+    for batch in np.array_split(values, [1, 7, 130, 131, 400]):
+        stats.update(batch)
+    pd.testing.assert_frame_equal(stats.corr(), data.corr(), rtol=1e-10, atol=1e-12)
+
+
+def _raw_series():
+    """
+    BAP_1d y dos series derivadas (otro factor aleatorio y algunas fechas faltantes) como tickers distintos.
+    """
+    data = pd.read_csv(os.path.join(DATA_DIR, "BAP_1d.csv"), header=0, skiprows=[1, 2], index_col=0, parse_dates=True)
+    rng = np.random.default_rng(1)
+    series = {"BAP": data}
+    for i, name in enumerate(["AAA", "BBB"]):
+        factor = np.exp(np.cumsum(rng.normal(scale=0.01, size=len(data))))
+        other = data.copy()
+        other[["Close", "High", "Low", "Open"]] = other[["Close", "High", "Low", "Open"]].mul(factor, axis=0)
+        series[name] = other.drop(other.index[rng.choice(len(other), 20 * (i + 1), replace=False)])
+    return series
+
+
+def _preprocess(tmp_path, until=None):
+    """
+    Preprocesa las series de _raw_series (opcionalmente solo hasta una fecha) en tmp_path.
+    """
+    scaled = []
+    for name, data in _raw_series().items():
+        raw_file = str(tmp_path / f"{name}_1d.csv")
+        with open(raw_file, "w") as f:
+            f.write(f"Price,Close,High,Low,Open,Volume\nTicker,{name},{name},{name},{name},{name}\nDate,,,,,\n")
+            data.loc[:until].to_csv(f, header=False)
+        preprocess_data(raw_file, str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=4, incremental=True)
+        scaled.append(str(tmp_path / "scaled" / f"{name}_1d.csv"))
+    return scaled
+
+
+def test_cross_series_returns_match_pandas(tmp_path):
+    scaled = _preprocess(tmp_path)
+    descaled = [str(tmp_path / "descaled" / f"descaled_{os.path.basename(f)}") for f in scaled]
+    closes = pd.concat({os.path.basename(f).replace('.csv', ''): pd.read_csv(f, index_col=0, parse_dates=True)["Close"]
+                        for f in descaled}, axis=1).sort_index()
+    expected = np.log(closes).diff().iloc[1:].corr()
+    assert np.isfinite(expected.to_numpy()).all()
+
+    result = correlation_matrix(descaled)
+    pd.testing.assert_frame_equal(result, expected, rtol=1e-10, atol=1e-12)
+
+    # Desde los CSV normalizados los retornos se calculan en precios reales (sin -inf donde Close escalado vale 0)
+    from_scaled = correlation_matrix(scaled)
+    np.testing.assert_allclose(from_scaled.to_numpy(), expected.to_numpy(), rtol=1e-10)
+
+
+def test_incremental_matches_full(tmp_path):
+    output_file = str(tmp_path / "corr.npz")
+    correlation_matrix(_preprocess(tmp_path, until="2021-06-30"), output_file)
+    # Con todas las filas cambia el rango del escalador: los estadísticos guardados están en precios reales
+    scaled = _preprocess(tmp_path)
+    result = correlation_matrix(scaled, output_file)
+    np.testing.assert_allclose(result.to_numpy(), correlation_matrix(scaled).to_numpy(), rtol=1e-10)
+
+
+def test_rolling_correlation_matches_pandas(tmp_path):
+    data = pd.read_csv(os.path.join(DATA_DIR, "BAP_1d.csv"), header=0, skiprows=[1, 2], index_col=0, parse_dates=True)
+    data.iloc[[10, 500, 501], 1] = np.nan
+    result = rolling_correlation(data, 20)
+    for column in ["High", "Low", "Open", "Volume"]:
+        expected = data[column].rolling(20).corr(data["Close"])
+        np.testing.assert_allclose(result[f"corr_{column}_Close_20"], expected, rtol=1e-8, atol=1e-8, err_msg=column)
@@ -0,0 +1,47 @@
+import os
+import numpy as np
+import ramdom_forestR
+from sklearn.model_selection import TimeSeriesSplit
+from conftest import DATA_DIR
+from data_preprocessor import preprocess_data
+from experiment_store import ExperimentStore, hash_data
+from feature_store import list_columns, read_training_data
+from indicators import select_features
+
+PARAM_GRID = {
+    'n_estimators': [5, 15],
+    'max_depth': [2, None],
+    'min_samples_leaf': [1, 10],
+    'max_features': ['sqrt'],
+}
+
+
+def test_rerun_skips_evaluated_cells(tmp_path, monkeypatch):
+    preprocess_data(os.path.join(DATA_DIR, "BAP_1wk.csv"), str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=4)
+    input_file = str(tmp_path / "scaled" / "BAP_1wk.csv")
+    X, y = read_training_data(input_file, select_features(list_columns(input_file)))
+    cv = TimeSeriesSplit(n_splits=3)
+
+    fits = []
+    grow_and_score = ramdom_forestR._grow_and_score
+
+    def counting(*args):
+        fits.append(args[2])
+        return grow_and_score(*args)
+
+    monkeypatch.setattr(ramdom_forestR, "_grow_and_score", counting)
+    store = ExperimentStore(str(tmp_path / "experiments.sqlite"))
+
+    first = ramdom_forestR.halving_search(X, y, PARAM_GRID, cv, eta=1, n_jobs=1, store=store)
+    assert len(fits) == 4 * 2 * 3
+    assert len(store.cells(hash_data(X, y))) == 4 * 2 * 3
+
+    # Segunda corrida sobre los mismos datos: todas las celdas salen del registro, sin entrenar
+    second = ramdom_forestR.halving_search(X, y, PARAM_GRID, cv, eta=1, n_jobs=1, store=store)
+    assert len(fits) == 4 * 2 * 3
+    assert second[0] == first[0]
+    np.testing.assert_array_equal(second[1], first[1])
+
+    # Datos distintos: nada se reutiliza
+    ramdom_forestR.halving_search(X.iloc[:-1], y.iloc[:-1], PARAM_GRID, cv, eta=1, n_jobs=1, store=store)
+    assert len(fits) == 2 * 4 * 2 * 3
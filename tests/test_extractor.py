@@ -0,0 +1,32 @@
+import os
+import filecmp
+from conftest import DATA_DIR
+from data_extractor import ReplaySource, extract_batch
+
+INTERVALS = ["1d", "1wk", "1mo"]
+
+
+def test_batch_extraction_reproduces_csvs(tmp_path):
+    results = extract_batch(["BAP"], INTERVALS, output_dir=str(tmp_path), source=ReplaySource(DATA_DIR), max_workers=3)
+    for interval in INTERVALS:
+        expected = os.path.join(DATA_DIR, f"BAP_{interval}.csv")
+        with open(expected) as f:
+            assert results[("BAP", interval)] == len(f.readlines()) - 3
+        assert filecmp.cmp(tmp_path / f"BAP_{interval}.csv", expected, shallow=False)
+
+
+def test_incremental_batch_extraction_appends_new_rows(tmp_path):
+    for interval in INTERVALS:
+        with open(os.path.join(DATA_DIR, f"BAP_{interval}.csv")) as f:
+            lines = f.readlines()
+        # La última vela guardada está desactualizada: se reemplaza con la versión de la fuente
+        stale = lines[-6].split(",")
+        stale[1] = "1.0"
+        (tmp_path / f"BAP_{interval}.csv").write_text("".join(lines[:-6]) + ",".join(stale))
+
+    results = extract_batch(["BAP"], INTERVALS, output_dir=str(tmp_path), source=ReplaySource(DATA_DIR))
+    assert results == {("BAP", interval): 5 for interval in INTERVALS}
+    for interval in INTERVALS:
+        assert filecmp.cmp(tmp_path / f"BAP_{interval}.csv", os.path.join(DATA_DIR, f"BAP_{interval}.csv"), shallow=False)
+    assert extract_batch(["BAP"], INTERVALS, output_dir=str(tmp_path), source=ReplaySource(DATA_DIR)) == \
+        {("BAP", interval): 0 for interval in INTERVALS}
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+from feature_store import append_frame, read_arrays, read_frame, write_frame
+
+
+def _frame(start, rows):
+    index = pd.date_range(start, periods=rows, freq="D")
+    return pd.DataFrame({"Close": np.arange(rows, dtype=float), "Volume": np.arange(rows, dtype=np.int64)}, index=index)
+
+
+def test_roundtrip_and_append_replaces_overlapping_rows(tmp_path):
+    path = str(tmp_path / "serie")
+    write_frame(path, _frame("2024-01-01", 10))
+    update = _frame("2024-01-10", 3) + 100
+    append_frame(path, update)
+    result = read_frame(path)
+    assert len(result) == 12
+    assert list(result.index[9:]) == list(update.index)
+    for column in update.columns:
+        np.testing.assert_array_equal(result[column].to_numpy()[9:], update[column].to_numpy())
+    assert result["Volume"].dtype == np.int64
+
+
+def test_read_arrays_are_memory_mapped_views(tmp_path):
+    path = str(tmp_path / "serie")
+    write_frame(path, _frame("2024-01-01", 100))
+    index, arrays = read_arrays(path, ["Close"], start="2024-01-11", end="2024-01-20")
+    assert len(index) == 10
+    close = arrays["Close"]
+    # Sin copia: el arreglo es una vista del archivo mapeado en memoria
+    assert isinstance(close, np.memmap) or isinstance(close.base, np.memmap)
+    np.testing.assert_array_equal(close, np.arange(10, 20, dtype=float))
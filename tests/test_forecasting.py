@@ -0,0 +1,66 @@
+import os
+import numpy as np
+import pandas as pd
+from conftest import DATA_DIR
+from alert_system import evaluate_forecast_alerts
+from data_preprocessor import preprocess_data
+from feature_store import read_frame
+from forecasting import forecast, make_targets, predict_intervals, train_forecaster
+from forest_export import export_artifact, load_forest
+from predictor import load_model
+
+PARAMS = {'n_estimators': 20, 'max_depth': 8, 'min_samples_leaf': 2, 'random_state': 0}
+
+
+def _forecaster(tmp_path):
+    preprocess_data(os.path.join(DATA_DIR, "BAP_1wk.csv"), str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=4)
+    data_file = str(tmp_path / "descaled" / "descaled_BAP_1wk.csv")
+    metrics = train_forecaster(data_file, str(tmp_path / "forecast"), horizons=3, params=PARAMS)
+    return data_file, str(tmp_path / "forecast" / "forecast_descaled_BAP_1wk.joblib"), metrics
+
+
+def test_make_targets_matches_shifted_returns():
+    close = pd.Series([10.0, 11.0, 9.9, 12.0, 12.5])
+    targets = make_targets(close, 2)
+    for h in (1, 2):
+        np.testing.assert_allclose(targets[:, h - 1], (close.shift(-h) / close - 1).to_numpy())
+
+
+def test_intervals_come_from_per_tree_predictions(tmp_path):
+    data_file, model_file, metrics = _forecaster(tmp_path)
+    assert list(metrics['horizon']) == [1, 2, 3]
+    assert metrics['coverage'].between(0, 1).all()
+
+    model = load_model(model_file)
+    X = read_frame(data_file)[list(model.feature_names_in_)].iloc[-50:]
+    mean, bands = predict_intervals(model, X, (0.1, 0.5, 0.9))
+    per_tree = np.stack([tree.predict(X.to_numpy(dtype=np.float32)) for tree in model.estimators_])
+    np.testing.assert_allclose(mean, model.predict(X), rtol=1e-12)
+    np.testing.assert_allclose(bands, np.quantile(per_tree, (0.1, 0.5, 0.9), axis=0), rtol=1e-12)
+    assert (bands[0] <= bands[1]).all() and (bands[1] <= bands[2]).all()
+
+    # El bosque exportado da los mismos intervalos en una sola pasada vectorizada
+    forest = load_forest(export_artifact(model_file))
+    flat_mean, flat_bands = predict_intervals(forest, X, (0.1, 0.5, 0.9))
+    np.testing.assert_array_equal(flat_bands, bands)
+    np.testing.assert_allclose(flat_mean, mean, rtol=1e-12)
+
+
+def test_forecast_and_interval_alerts(tmp_path):
+    data_file, model_file, _ = _forecaster(tmp_path)
+    model = load_model(model_file)
+    data = read_frame(data_file)
+    result = forecast(data, model, rows=2)
+    assert len(result) == 2 * 3
+    assert list(result['horizon']) == [1, 2, 3, 1, 2, 3]
+    assert (result['q10'] <= result['q50']).all() and (result['q50'] <= result['q90']).all()
+    np.testing.assert_allclose(result['close'].iloc[-1], data["Close"].iloc[-1])
+
+    # Las alertas salen de los mismos intervalos: todo el intervalo por encima (o debajo) del umbral
+    threshold = 0.0
+    alerts = evaluate_forecast_alerts([(data_file, model_file)], threshold, since={'BAP_1wk': str(data.index[-60])})
+    _, (lower, upper) = predict_intervals(model, data[list(model.feature_names_in_)].iloc[-59:], (0.1, 0.9))
+    expected = {(data.index[-59 + row], h + 1) for row, h in zip(*np.nonzero((lower > threshold) | (upper < -threshold)))}
+    assert {(alert['date'], alert['horizon']) for alert in alerts} == expected
+    assert len(alerts) > 0
+    assert all(alert['lower'] > threshold or alert['upper'] < -threshold for alert in alerts)
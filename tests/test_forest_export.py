@@ -0,0 +1,37 @@
+import os
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from conftest import DATA_DIR
+from data_preprocessor import preprocess_data
+from feature_store import list_columns, read_frame
+from forest_export import export_forest, load_forest
+from indicators import select_features
+
+
+def _training_data(tmp_path):
+    preprocess_data(os.path.join(DATA_DIR, "BAP_1d.csv"), str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=4)
+    input_file = str(tmp_path / "scaled" / "BAP_1d.csv")
+    features = select_features(list_columns(input_file))
+    data = read_frame(input_file)
+    return data[features], data["Close"]
+
+
+def test_flat_forest_matches_sklearn(tmp_path):
+    X, y = _training_data(tmp_path)
+    model = RandomForestRegressor(n_estimators=20, max_depth=12, random_state=0).fit(X, y)
+    export_forest(model, str(tmp_path / "model.forest"))
+    for mmap in (True, False):
+        forest = load_forest(str(tmp_path / "model.forest"), mmap=mmap)
+        np.testing.assert_array_equal(forest.predict(X), model.predict(X))
+        np.testing.assert_array_equal(forest.predict(X.iloc[[-1]]), model.predict(X.iloc[[-1]]))
+
+
+def test_flat_forest_multi_output_trees_match_sklearn(tmp_path):
+    X, y = _training_data(tmp_path)
+    Y = np.column_stack([y, y.shift(-1).ffill()])
+    model = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, Y)
+    export_forest(model, str(tmp_path / "multi.forest"))
+    forest = load_forest(str(tmp_path / "multi.forest"))
+    per_tree = np.stack([tree.predict(X.to_numpy(dtype=np.float32)) for tree in model.estimators_])
+    np.testing.assert_array_equal(forest.predict_trees(X), per_tree)
+    np.testing.assert_array_equal(forest.predict(X), model.predict(X))
@@ -0,0 +1,49 @@
+import os
+import numpy as np
+from joblib import load
+from sklearn.ensemble import RandomForestRegressor
+from conftest import DATA_DIR
+from data_preprocessor import preprocess_data
+from feature_store import list_columns, read_training_data
+from indicators import select_features
+from ramdomF1 import FIXED_PARAMS, train_and_save_model, update_model
+
+
+def _update_after_append(tmp_path, cut, appended):
+    lines = open(os.path.join(DATA_DIR, "BAP_1d.csv")).readlines()
+    raw = tmp_path / "BAP_1d.csv"
+    raw.write_text("".join(lines[:-cut]))
+    scaled = str(tmp_path / "scaled" / "BAP_1d.csv")
+    preprocess_data(str(raw), str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=4, incremental=True)
+    assert update_model(scaled, str(tmp_path / "rf"))['mode'] == 'full'
+    raw.write_text("".join(lines[:len(lines) - cut + appended]))
+    preprocess_data(str(raw), str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=4, incremental=True)
+    return update_model(scaled, str(tmp_path / "rf"))
+
+
+def test_update_without_rescale_is_incremental(tmp_path):
+    result = _update_after_append(tmp_path, cut=5, appended=3)
+    assert result['mode'] == 'incremental'
+    assert result['new_rows'] == 3
+
+
+def test_update_after_rescale_refits_from_scratch(tmp_path):
+    # Las últimas 5 velas de BAP_1d cambian el rango del escalador: se reescala todo el histórico
+    result = _update_after_append(tmp_path, cut=5, appended=5)
+    assert result['mode'] == 'full'
+
+    # Mismo modelo que un ajuste desde cero sobre los datos reescalados (sin árboles de la escala anterior)
+    scaled = str(tmp_path / "scaled" / "BAP_1d.csv")
+    X, y = read_training_data(scaled, select_features(list_columns(scaled)))
+    model = load(str(tmp_path / "rf" / "model_BAP_1d.joblib"))
+    assert len(model.estimators_) == FIXED_PARAMS['n_estimators']
+    np.testing.assert_array_equal(model.predict(X), RandomForestRegressor(**FIXED_PARAMS).fit(X, y).predict(X))
+
+
+def test_first_update_warns_before_replacing_a_trained_model(tmp_path, capsys):
+    preprocess_data(os.path.join(DATA_DIR, "BAP_1mo.csv"), str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=4)
+    scaled = str(tmp_path / "scaled" / "BAP_1mo.csv")
+    train_and_save_model(scaled, str(tmp_path / "rf"))
+    capsys.readouterr()
+    assert update_model(scaled, str(tmp_path / "rf"))['mode'] == 'full'
+    assert "no fue entrenado con update_model" in capsys.readouterr().out
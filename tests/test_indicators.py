@@ -0,0 +1,31 @@
+import os
+import numpy as np
+import pandas as pd
+from conftest import DATA_DIR
+from indicators import DEFAULT_INDICATORS, compute_indicators
+
+
+def _raw():
+    return pd.read_csv(os.path.join(DATA_DIR, "BAP_1d.csv"), header=0, skiprows=[1, 2], index_col=0, parse_dates=True)
+
+
+def test_indicators_match_pandas():
+    data = _raw()
+    result = compute_indicators(data, n=4, indicators=DEFAULT_INDICATORS)
+    close = data["Close"]
+
+    expected = {
+        "Close_lag_2": close.shift(2),
+        "SMA_4": close.rolling(4).mean(),
+        "SMA_20": close.rolling(20).mean(),
+        "EMA_12": close.ewm(span=12, adjust=False).mean(),
+        "MACD_12_26": close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean(),
+        "BB_upper_20": close.rolling(20).mean() + 2.0 * close.rolling(20).std(ddof=0),
+    }
+    delta = close.diff()
+    gain = delta.clip(lower=0).iloc[1:].ewm(alpha=1 / 14, adjust=False).mean()
+    loss = (-delta.clip(upper=0)).iloc[1:].ewm(alpha=1 / 14, adjust=False).mean()
+    expected["RSI_14"] = 100 - 100 / (1 + gain / loss)
+
+    for column, values in expected.items():
+        np.testing.assert_allclose(result[column], values.reindex(result.index), rtol=1e-10, atol=1e-10, err_msg=column)
@@ -0,0 +1,36 @@
+import os
+import json
+import pytest
+from conftest import DATA_DIR
+from data_preprocessor import preprocess_data
+from instrumentation import configure, read_metrics
+from ramdomF1 import train_and_save_model
+
+
+@pytest.fixture
+def metrics_file(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    configure(metrics_file=path, memory=True)
+    yield path
+    configure(metrics_file=None)
+
+
+def test_stages_write_one_jsonl_line_each(tmp_path, metrics_file):
+    preprocess_data(os.path.join(DATA_DIR, "BAP_1mo.csv"), str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=4)
+    train_and_save_model(str(tmp_path / "scaled" / "BAP_1mo.csv"), str(tmp_path / "rf"))
+    preprocess_data(str(tmp_path / "missing.csv"), str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=4)
+
+    with open(metrics_file) as f:
+        entries = [json.loads(line) for line in f]
+    assert [(e['stage'], e['series'], e['status']) for e in entries] == [
+        ("preprocess", "BAP_1mo", "ok"), ("train", "BAP_1mo", "ok"), ("preprocess", "missing", "error")]
+    assert all(e['seconds'] >= 0 and e['pid'] == os.getpid() and 'peak_mb' in e for e in entries)
+    assert entries[1]['features'] > 0 and entries[1]['retrained'] is True
+    assert entries[2]['error'].startswith("FileNotFoundError")
+    assert len(read_metrics(metrics_file)) == 3
+
+
+def test_disabled_instrumentation_writes_nothing(tmp_path):
+    configure(metrics_file=None)
+    preprocess_data(os.path.join(DATA_DIR, "BAP_1mo.csv"), str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=4)
+    assert sorted(os.listdir(tmp_path)) == ["descaled", "scaled"]
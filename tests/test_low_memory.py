@@ -0,0 +1,81 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import DATA_DIR
+from data_extractor import ReplaySource, extract_data
+from data_preprocessor import preprocess_data
+from feature_store import read_frame, read_meta, store_path
+
+
+def _raw_store(tmp_path, name="BAP_1d"):
+    """Serie cruda del almacén armada por el extractor desde el CSV versionado."""
+    ticker, interval = name.split("_")
+    store_dir = str(tmp_path / "store")
+    extract_data(ticker, interval=interval, output_dir=str(tmp_path / "csv"), source=ReplaySource(DATA_DIR),
+                 store_dir=store_dir)
+    return store_path(store_dir, "raw", name), store_dir
+
+
+def _preprocess_csv(raw, out_dir, **kwargs):
+    preprocess_data(raw, str(out_dir / "scaled"), str(out_dir / "descaled"), n=4, **kwargs)
+    name = os.path.basename(raw).replace(".csv", "")
+    return out_dir / "scaled" / f"{name}.csv", out_dir / "descaled" / f"descaled_{name}.csv"
+
+
+@pytest.mark.parametrize("name", ["BAP_1d", "BAP_1wk", "BAP_1mo"])
+def test_chunked_csv_is_independent_of_chunk_size(tmp_path, name):
+    raw = os.path.join(DATA_DIR, f"{name}.csv")
+    outputs = [_preprocess_csv(raw, tmp_path / str(rows), low_memory=True, chunk_rows=rows) for rows in (7, 100, 10**6)]
+    for scaled, descaled in outputs[1:]:
+        assert scaled.read_bytes() == outputs[0][0].read_bytes()
+        assert descaled.read_bytes() == outputs[0][1].read_bytes()
+
+
+def test_chunked_csv_matches_full_preprocessing(tmp_path):
+    raw = os.path.join(DATA_DIR, "BAP_1d.csv")
+    full, _ = _preprocess_csv(raw, tmp_path / "full")
+    chunked, _ = _preprocess_csv(raw, tmp_path / "chunked", low_memory=True, chunk_rows=100)
+    expected = pd.read_csv(full, index_col=0)
+    result = pd.read_csv(chunked, index_col=0)
+    assert list(result.columns) == list(expected.columns)
+    assert result.index.equals(expected.index)
+    # Precios en float32: diferencias del orden del redondeo de float32
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-5, atol=1e-6)
+
+
+def test_chunked_store_is_independent_of_chunk_size(tmp_path):
+    raw, store_dir = _raw_store(tmp_path)
+    frames = []
+    for rows in (7, 100, 10**6):
+        out_dir = str(tmp_path / f"features_{rows}")
+        preprocess_data(raw, None, None, n=4, store_dir=out_dir, low_memory=True, chunk_rows=rows)
+        output_path = store_path(out_dir, "features", "BAP_1d")
+        assert "preprocess" in read_meta(output_path)["extra"]
+        frames.append(read_frame(output_path))
+    assert len(frames[0]) == 1363 - 3 - 4
+    for frame in frames[1:]:
+        pd.testing.assert_frame_equal(frame, frames[0])
+
+
+def test_chunked_store_matches_chunked_csv(tmp_path):
+    raw, _ = _raw_store(tmp_path)
+    out_dir = str(tmp_path / "features")
+    preprocess_data(raw, None, None, n=4, store_dir=out_dir, low_memory=True, chunk_rows=100)
+    _, descaled = _preprocess_csv(os.path.join(DATA_DIR, "BAP_1d.csv"), tmp_path / "csv_out", low_memory=True, chunk_rows=100)
+    result = read_frame(store_path(out_dir, "features", "BAP_1d"), view="descaled")
+    expected = pd.read_csv(descaled, index_col=0, parse_dates=True)
+    assert result.index.equals(expected.index)
+    np.testing.assert_allclose(result[expected.columns].to_numpy(dtype=float), expected.to_numpy(), rtol=1e-5)
+
+
+def test_incremental_after_chunked_matches_chunked(tmp_path):
+    lines = open(os.path.join(DATA_DIR, "BAP_1d.csv")).readlines()
+    raw = tmp_path / "BAP_1d.csv"
+    raw.write_text("".join(lines[:-20]))
+    _preprocess_csv(str(raw), tmp_path / "inc", low_memory=True, chunk_rows=100)
+    raw.write_text("".join(lines))
+    scaled, descaled = _preprocess_csv(str(raw), tmp_path / "inc", low_memory=True, chunk_rows=100, incremental=True)
+    expected_scaled, expected_descaled = _preprocess_csv(str(raw), tmp_path / "full", low_memory=True, chunk_rows=100)
+    assert scaled.read_bytes() == expected_scaled.read_bytes()
+    assert descaled.read_bytes() == expected_descaled.read_bytes()
@@ -0,0 +1,39 @@
+import os
+import shutil
+import pytest
+from conftest import DATA_DIR
+from pipeline import build_pipeline, run_pipeline
+
+
+def test_failed_stage_with_stale_output_is_retried(tmp_path):
+    data_dir = str(tmp_path)
+    shutil.copy(os.path.join(DATA_DIR, "BAP_1mo.csv"), data_dir)
+    nodes = build_pipeline(["BAP"], ["1mo"], data_dir, str(tmp_path / "res"), str(tmp_path / "rf"), extract=False)
+    nodes = {"preprocess:BAP_1mo": nodes["preprocess:BAP_1mo"]}
+    state_file = str(tmp_path / "state.json")
+
+    assert [t["status"] for t in run_pipeline(nodes, state_file, max_workers=1)] == ["ok"]
+    assert [t["status"] for t in run_pipeline(nodes, state_file, max_workers=1)] == ["skipped"]
+
+    # preprocess_data atrapa el error y la salida de la corrida anterior sigue existiendo
+    with open(os.path.join(data_dir, "BAP_1mo.csv"), "a") as f:
+        f.write("2099-01-01,abc,1,1,1,1\n")
+    for _ in range(2):
+        timings = run_pipeline(nodes, state_file, max_workers=1)
+        assert timings[0]["status"] == "failed"
+        assert "error" in timings[0]
+
+
+def test_missing_dependency_raises(tmp_path):
+    nodes = build_pipeline(["BAP"], ["1mo"], str(tmp_path), str(tmp_path / "res"), str(tmp_path / "rf"), extract=False)
+    nodes = {"train:BAP_1mo": nodes["train:BAP_1mo"]}
+    with pytest.raises(ValueError, match="preprocess:BAP_1mo"):
+        run_pipeline(nodes, str(tmp_path / "state.json"), max_workers=1)
+
+
+def test_circular_dependencies_are_blocked(tmp_path):
+    nodes = build_pipeline(["BAP"], ["1mo"], str(tmp_path), str(tmp_path / "res"), str(tmp_path / "rf"), extract=False)
+    nodes = {"preprocess:BAP_1mo": dict(nodes["preprocess:BAP_1mo"], deps=["train:BAP_1mo"]),
+             "train:BAP_1mo": nodes["train:BAP_1mo"]}
+    timings = run_pipeline(nodes, str(tmp_path / "state.json"), max_workers=1)
+    assert sorted(t["status"] for t in timings) == ["blocked", "blocked"]
@@ -0,0 +1,74 @@
+import os
+import json
+import threading
+import urllib.request
+import numpy as np
+import pandas as pd
+from joblib import dump, load
+from sklearn.ensemble import RandomForestRegressor
+from conftest import DATA_DIR
+from data_preprocessor import preprocess_data
+from predictor import ModelCache, PredictionService, serve
+from ramdomF1 import train_and_save_model
+
+
+def _models(tmp_path):
+    files = []
+    for interval in ["1d", "1wk"]:
+        preprocess_data(os.path.join(DATA_DIR, f"BAP_{interval}.csv"), str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=4)
+        train_and_save_model(str(tmp_path / "scaled" / f"BAP_{interval}.csv"), str(tmp_path / "rf"))
+        files.append((str(tmp_path / "scaled" / f"BAP_{interval}.csv"), str(tmp_path / "rf" / f"model_BAP_{interval}.joblib")))
+    return files
+
+
+def test_batched_predictions_match_each_model(tmp_path):
+    files = _models(tmp_path)
+    service = PredictionService(ModelCache())
+    requests = []
+    for i in range(3):
+        for data_path, model_path in files:
+            data = pd.read_csv(data_path, index_col=0, parse_dates=True)
+            model = load(model_path)
+            features = list(model.feature_names_in_)
+            # Columnas de más y en otro orden: el servicio toma las del modelo
+            requests.append({'model': model_path, 'features': data[features[::-1] + ["Close"]].iloc[-1 - i].to_dict(),
+                             'ticker': 'BAP', 'expected': float(model.predict(data[features].iloc[[-1 - i]])[0])})
+
+    results = service.predict(requests)
+    assert [r['expected'] for r in results] == [r['prediction'] for r in results]
+    assert all(r['ticker'] == 'BAP' and 'features' not in r for r in results)
+
+    request = service.latest_request(*files[0])
+    result = service.predict([request], ajuste=0.5)[0]
+    assert result['prediction_ajustada'] == result['prediction'] + 0.5 * (request['last_close'] - request['prev_close'])
+
+
+def test_cache_reloads_rewritten_artifact(tmp_path):
+    X = pd.DataFrame({'a': np.arange(20.0)})
+    model_path = str(tmp_path / "model.joblib")
+    dump(RandomForestRegressor(n_estimators=2, random_state=0).fit(X, np.zeros(20)), model_path)
+    cache = ModelCache(max_models=1)
+    first = cache.get(model_path)
+    assert cache.get(model_path) is first
+
+    dump(RandomForestRegressor(n_estimators=2, random_state=0).fit(X, np.ones(20)), model_path)
+    os.utime(model_path, (os.path.getatime(model_path), os.path.getmtime(model_path) + 1))
+    assert PredictionService(cache).predict([{'model': model_path, 'features': {'a': 1.0}}])[0]['prediction'] == 1.0
+
+
+def test_http_endpoint(tmp_path):
+    files = _models(tmp_path)
+    service = PredictionService(ModelCache())
+    server = serve(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        request = service.latest_request(*files[1], ticker='BAP')
+        body = json.dumps({'requests': [request], 'ajuste': 0.5}).encode()
+        url = f"http://127.0.0.1:{server.server_address[1]}/predict"
+        with urllib.request.urlopen(urllib.request.Request(url, data=body, method='POST')) as response:
+            payload = json.loads(response.read())
+        assert payload['predictions'] == service.predict([request], ajuste=0.5)
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,48 @@
+import os
+import pandas as pd
+import pytest
+from conftest import DATA_DIR
+from data_extractor import ReplaySource, extract_data
+from data_preprocessor import preprocess_data
+from feature_store import read_frame, store_path
+
+
+def _write_head(lines, raw_file, rows):
+    raw_file.write_text("".join(lines[:3 + rows]))
+
+
+@pytest.mark.parametrize("name", ["BAP_1d", "BAP_1wk", "BAP_1mo"])
+def test_incremental_csv_matches_full(tmp_path, name):
+    lines = open(os.path.join(DATA_DIR, f"{name}.csv")).readlines()
+    rows = len(lines) - 3
+    raw_file = tmp_path / f"{name}.csv"
+    inc = (str(tmp_path / "inc" / "scaled"), str(tmp_path / "inc" / "descaled"))
+    # Varias corridas: filas nuevas, vela final reemplazada y sin cambios
+    for head in (rows - 30, rows - 10, rows - 10, rows):
+        _write_head(lines, raw_file, head)
+        preprocess_data(str(raw_file), *inc, n=4, incremental=True)
+    full = (str(tmp_path / "full" / "scaled"), str(tmp_path / "full" / "descaled"))
+    preprocess_data(str(raw_file), *full, n=4)
+
+    for inc_dir, full_dir, file_name in ((inc[0], full[0], f"{name}.csv"), (inc[1], full[1], f"descaled_{name}.csv")):
+        with open(os.path.join(inc_dir, file_name), "rb") as a, open(os.path.join(full_dir, file_name), "rb") as b:
+            assert a.read() == b.read()
+
+
+def test_incremental_store_matches_full(tmp_path):
+    # Serie cruda del almacén escrita por el extractor, primero hasta una fecha y después completa
+    raw = pd.read_csv(os.path.join(DATA_DIR, "BAP_1d.csv"), header=0, skiprows=[1, 2], index_col=0, parse_dates=True)
+    cut = str(raw.index[-25].date())
+    store_dir = str(tmp_path / "store")
+    source = ReplaySource(DATA_DIR)
+    extract_data("BAP", end_date=cut, interval="1d", output_dir=str(tmp_path / "csv"), source=source, store_dir=store_dir)
+    raw_path = store_path(store_dir, "raw", "BAP_1d")
+    preprocess_data(raw_path, None, None, n=4, incremental=True, store_dir=str(tmp_path / "inc"))
+    extract_data("BAP", interval="1d", output_dir=str(tmp_path / "csv"), source=source, incremental=True, store_dir=store_dir)
+    preprocess_data(raw_path, None, None, n=4, incremental=True, store_dir=str(tmp_path / "inc"))
+    preprocess_data(raw_path, None, None, n=4, store_dir=str(tmp_path / "full"))
+
+    result = read_frame(store_path(str(tmp_path / "inc"), "features", "BAP_1d"))
+    expected = read_frame(store_path(str(tmp_path / "full"), "features", "BAP_1d"))
+    assert len(expected) == len(raw) - 4
+    pd.testing.assert_frame_equal(result, expected)
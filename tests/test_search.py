@@ -0,0 +1,41 @@
+import os
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import GridSearchCV, TimeSeriesSplit
+from conftest import DATA_DIR
+from data_preprocessor import preprocess_data
+from feature_store import list_columns, read_training_data
+from indicators import select_features
+from ramdom_forestR import halving_search
+
+PARAM_GRID = {
+    'n_estimators': [5, 15],
+    'max_depth': [2, None],
+    'min_samples_leaf': [1, 10],
+    'max_features': ['sqrt'],
+}
+
+
+def _training_data(tmp_path):
+    preprocess_data(os.path.join(DATA_DIR, "BAP_1wk.csv"), str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=4)
+    input_file = str(tmp_path / "scaled" / "BAP_1wk.csv")
+    return read_training_data(input_file, select_features(list_columns(input_file)))
+
+
+def test_halving_matches_grid_search(tmp_path):
+    X, y = _training_data(tmp_path)
+    cv = TimeSeriesSplit(n_splits=3)
+    grid = GridSearchCV(RandomForestRegressor(random_state=42), PARAM_GRID, cv=cv, scoring='r2', n_jobs=1).fit(X, y)
+
+    # eta=1: búsqueda exhaustiva por celdas, mismos puntajes que GridSearchCV (los bosques crecidos son idénticos)
+    best_params, best_scores, results = halving_search(X, y, PARAM_GRID, cv, eta=1, n_jobs=1)
+    assert best_params == grid.best_params_
+    for result in results:
+        index = grid.cv_results_['params'].index(result['params'])
+        expected = [grid.cv_results_[f'split{i}_test_score'][index] for i in range(3)]
+        np.testing.assert_allclose(result['scores'], expected, rtol=1e-12)
+
+    # Con descarte, en una grilla chica el ganador es el mismo
+    halving_params, halving_scores, _ = halving_search(X, y, PARAM_GRID, cv, eta=3, n_jobs=1)
+    assert halving_params == grid.best_params_
+    np.testing.assert_allclose(halving_scores, best_scores, rtol=1e-12)
@@ -0,0 +1,108 @@
+import os
+import asyncio
+import numpy as np
+import pandas as pd
+import pytest
+from joblib import dump
+from sklearn.ensemble import RandomForestRegressor
+from conftest import DATA_DIR
+from data_preprocessor import preprocess_data
+from predictor import ModelCache
+from ramdomF1 import train_and_save_model
+from streaming import StreamingAlerts, replay_source
+
+N = 4
+
+
+def _raw(name="BAP_1d"):
+    return pd.read_csv(os.path.join(DATA_DIR, f"{name}.csv"), header=0, skiprows=[1, 2], index_col=0, parse_dates=True)
+
+
+def test_warm_start_from_normalized_csv_uses_real_closes(tmp_path):
+    lines = open(os.path.join(DATA_DIR, "BAP_1d.csv")).readlines()
+    raw_file = tmp_path / "BAP_1d.csv"
+    raw_file.write_text("".join(lines[:-1]))
+    scaled_dir = tmp_path / "scaled"
+    preprocess_data(str(raw_file), str(scaled_dir), str(tmp_path / "descaled"), n=N)
+    scaled_file = str(scaled_dir / "BAP_1d.csv")
+    train_and_save_model(scaled_file, str(tmp_path / "rf"))
+
+    alerts = []
+    engine = StreamingAlerts(threshold=0.03, on_alert=alerts.append)
+    state = engine.add_series("BAP", "1d", str(tmp_path / "rf" / "model_BAP_1d.joblib"), data_file=scaled_file,
+                              scaled=True)
+    raw = _raw()
+    np.testing.assert_allclose(list(state.closes), raw["Close"].iloc[-(N + 2):-1].to_numpy(), rtol=1e-12)
+
+    # La primera vela del flujo tiene los mismos features que el preprocesamiento por lotes
+    bar = {'ticker': 'BAP', 'interval': '1d', 'date': raw.index[-1], **raw.iloc[-1].to_dict()}
+    row, prev_close, _ = state.feature_row(bar)
+    preprocess_data(os.path.join(DATA_DIR, "BAP_1d.csv"), str(tmp_path / "full"), str(tmp_path / "full_d"), n=N)
+    expected = pd.read_csv(tmp_path / "full_d" / "descaled_BAP_1d.csv", index_col=0).iloc[-1]
+    lags = [f"Close_lag_{i}" for i in range(1, N + 1)] + [f"SMA_{N}"]
+    values = dict(zip(state.features, row))
+    np.testing.assert_allclose([values[c] for c in lags], expected[lags].to_numpy(dtype=float), rtol=1e-12)
+    assert prev_close == raw["Close"].iloc[-2]
+
+    engine.process([bar])
+    change = raw["Close"].iloc[-1] / raw["Close"].iloc[-2] - 1
+    assert all(alert['kind'] != 'real' for alert in alerts) or abs(change) > 0.03
+
+
+def _descaled_model(tmp_path):
+    preprocess_data(os.path.join(DATA_DIR, "BAP_1d.csv"), str(tmp_path / "scaled"), str(tmp_path / "descaled"), n=N)
+    data = pd.read_csv(tmp_path / "descaled" / "descaled_BAP_1d.csv", index_col=0, parse_dates=True)
+    features = ["Open", "High", "Low", "Volume"] + [f"Close_lag_{i}" for i in range(1, N + 1)] + [f"SMA_{N}"]
+    model_file = str(tmp_path / "model.joblib")
+    dump(RandomForestRegressor(n_estimators=10, max_depth=8, random_state=0).fit(data[features], data["Close"]), model_file)
+    return model_file
+
+
+def _bars(tickers, n=None):
+    bars = []
+    for ticker in tickers:
+        raw = _raw().iloc[:n]
+        bars += [{'ticker': ticker, 'interval': '1d', 'date': date, **row} for date, row in zip(raw.index, raw.to_dict('records'))]
+    return sorted(bars, key=lambda bar: bar['date'])
+
+
+def test_run_bounds_latency_and_matches_bar_by_bar(tmp_path):
+    model_file = _descaled_model(tmp_path)
+    engine = StreamingAlerts(on_alert=lambda alert: None)
+    engine.add_series("BAP", "1d", model_file, warm_start=False)
+    alerts = asyncio.run(engine.run(replay_source(DATA_DIR, ["BAP"], "1d")))
+
+    # La cola acotada evita que toda la reproducción espere en cola antes de procesarse
+    stats = engine.latency_stats()
+    assert stats['bars'] == len(_raw())
+    assert stats['p99_ms'] < 1000
+
+    reference = StreamingAlerts(on_alert=lambda alert: None)
+    reference.add_series("BAP", "1d", model_file, warm_start=False)
+
+    async def collect():
+        return [bar async for bar in replay_source(DATA_DIR, ["BAP"], "1d")]
+
+    expected = [alert for bar in asyncio.run(collect()) for alert in reference.process([bar])]
+    assert len(expected) > 0
+    assert alerts == expected
+
+
+def test_run_propagates_source_errors(tmp_path):
+    model_file = _descaled_model(tmp_path)
+
+    async def failing_source():
+        for bar in _bars(["BAP", "SEC"], n=3):
+            yield bar
+        raise ConnectionError("fuente caída")
+
+    cache = ModelCache(max_models=1)
+    engine = StreamingAlerts(cache=cache, on_alert=lambda alert: None)
+    engine.add_series("BAP", "1d", model_file, warm_start=False)
+    engine.add_series("SEC", "1d", model_file, warm_start=False)
+    # Una caché recibida no se agranda por detrás del que la creó
+    assert cache.max_models == 1
+
+    with pytest.raises(ConnectionError, match="fuente caída"):
+        asyncio.run(engine.run(failing_source()))
+    assert engine.bars_processed == 6